@@ -114,6 +114,14 @@ CREATE TABLE IF NOT EXISTS user_interest (
 	FOREIGN KEY (interest_id) REFERENCES interest(id)
 );
 
+CREATE TABLE IF NOT EXISTS precomputed_recs (
+	user_id bigint NOT NULL,
+	candidate_ids bigint[] NOT NULL,
+	computed_at timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+	PRIMARY KEY (user_id),
+	FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
 CREATE TABLE IF NOT EXISTS habitation (
 	id bigint NOT NULL UNIQUE DEFAULT nextval('habitation_id_seq'),
 	user_id bigint NOT NULL,
@@ -187,6 +195,11 @@ CREATE UNIQUE INDEX user_id_idx ON users(id);
 CREATE UNIQUE INDEX user_email_idx ON users(email);
 CREATE UNIQUE INDEX user_phone_idx ON users(phone);
 CREATE UNIQUE INDEX user_vk_id_idx ON users(vk_id);
+CREATE INDEX user_search_locality_idx ON users(locality_id) WHERE is_active AND is_search AND NOT deleted;
+
+CREATE INDEX user_bad_habits_user_idx ON user_bad_habits(user_id);
+
+CREATE INDEX user_interest_user_idx ON user_interest(user_id);
 
 CREATE UNIQUE INDEX locality_id_idx ON locality(id);
 
@@ -223,4 +236,15 @@ SELECT cron.schedule(
     WHERE last_log_moment < CURRENT_DATE - INTERVAL '180 days'
       AND is_active = TRUE;
     $$
+);
+
+-- Ленты пересчитывает python precompute_recs.py после деактивации;
+-- не пересчитанные за двое суток больше не читаются и удаляются
+SELECT cron.schedule(
+    'purge_precomputed_recs',
+    '30 4 * * *',
+    $$
+    DELETE FROM precomputed_recs
+    WHERE computed_at < CURRENT_TIMESTAMP - INTERVAL '2 days';
+    $$
 );
\ No newline at end of file
@@ -1,163 +1,482 @@
 """
 Сервер оркестрации запросов к моделям на Triton Inference Server
+или в процессе через TorchScript
 author: <danila.yashin23@gmial.com>
 """
 import asyncio
-import base64
-import io
 import json
+import logging
+import math
+import multiprocessing
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Callable, Optional, Union
 
 import numpy as np
-from fastapi import FastAPI, HTTPException
-from PIL import Image
-from schemas import (ModelReadiness, NSFWRequest, NSFWResponse,
-                     RankingPairRequest, RankingResponse, TextRequest,
-                     ToxicityResponse)
-from transformers import AutoTokenizer, ViTImageProcessor
-from tritonclient import http as tritonhttpclient
-
-app = FastAPI()
-
-# Инициализация синхронных компонентов
-tokenizer = AutoTokenizer.from_pretrained(
-    os.path.join(os.path.dirname(__file__), "rubert-tiny-toxicity/tokenizer"),
-    local_files_only=True
+from batching import MicroBatcher
+from cache import (PerceptualCache, ResultCache, SingleFlight, content_key,
+                   normalize_text)
+from config import settings
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from features import UserRowCache, ranking_inputs
+from health import MODEL_NAMES, HealthMonitor
+from limiter import AdaptiveLimiter, Overloaded
+from metrics import (BATCH_SIZE, CONTENT_TYPE, DEDUPLICATED, ERRORS,
+                     IN_FLIGHT, REGISTRY, REQUESTS, STAGE_SECONDS,
+                     CallbackMetric)
+from preprocessing import ImageConfig, preprocess_base64, preprocess_bytes
+from schemas import (CacheStats, HealthResponse, ModelReadiness, NSFWRequest,
+                     NSFWResponse, RankingBatchRequest, RankingBatchResponse,
+                     RankingPairRequest, RankingResponse, TextBatchRequest,
+                     TextRequest, ToxicityBatchResponse, ToxicityResponse)
+from shared_memory import SharedMemoryPool
+from starlette.datastructures import UploadFile
+from transformers import AutoTokenizer, PreTrainedTokenizerBase
+from transport import TritonTransport, create_transport
+
+
+logging.basicConfig(
+    level=settings.log_level,
+    format=settings.log_format,
+    datefmt=settings.date_format
 )
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = os.path.dirname(__file__)
+
+# Ассеты моделей и клиенты создаются в lifespan
+tokenizer: Optional[PreTrainedTokenizerBase] = None
+image_config: Optional[ImageConfig] = None
+min_max_values: Optional[dict[str, float]] = None
+
+transport: Optional[TritonTransport] = None
+image_pool: Optional[ProcessPoolExecutor] = None
+nsfw_shared_memory: Optional[SharedMemoryPool] = None
+health_monitor = HealthMonitor(MODEL_NAMES, settings.health_poll_interval_s)
+MODEL_ALIASES = {model_name: alias
+                 for alias, model_name in MODEL_NAMES.items()}
+# Запросы к моделям сверх адаптивного лимита ждут в ограниченной очереди,
+# кэш и дедупликация работают до ограничителя. Лимит меньше размера
+# батча только уменьшал бы батчи, поэтому он и есть нижняя граница
+MIN_LIMITS = {"toxicity": settings.toxicity_max_batch_size,
+              "nsfw": settings.nsfw_max_batch_size}
+limiters = {
+    alias: AdaptiveLimiter(
+        alias,
+        initial_limit=max(settings.limiter_initial_limit,
+                          MIN_LIMITS.get(alias, 0)),
+        min_limit=max(settings.limiter_min_limit, MIN_LIMITS.get(alias, 0)),
+        max_limit=settings.limiter_max_limit,
+        max_queue_size=settings.limiter_max_queue_size,
+        queue_timeout_s=settings.limiter_queue_timeout_s,
+        tolerance=settings.limiter_latency_tolerance,
+        long_window=settings.limiter_long_window,
+        queue_wait=STAGE_SECONDS.labels(alias, "limiter_wait")
+    )
+    for alias in MODEL_NAMES
+}
 
-image_preprocessor = ViTImageProcessor.from_pretrained(
-    os.path.join(os.path.dirname(__file__), "nsfw-detector/preprocessor"),
-    local_files_only=True
-)
 
-with open(os.path.join(os.path.dirname(__file__), "user-ranking/config.json"), 
-          "r", encoding="UTF-8") as file:
-    min_max_values = json.load(file)
+def _load_tokenizer() -> PreTrainedTokenizerBase:
+    return AutoTokenizer.from_pretrained(
+        os.path.join(ASSETS_DIR, "rubert-tiny-toxicity/tokenizer"),
+        local_files_only=True
+    )
+
 
-VEC_DIM = 50
-triton_client = tritonhttpclient.InferenceServerClient(url="triton-server:8000")
+def _load_min_max_values() -> dict[str, float]:
+    with open(os.path.join(ASSETS_DIR, "user-ranking/config.json"),
+              "r", encoding="UTF-8") as file:
+        return json.load(file)
 
 
-def _min_max_scale(value, min_, max_) -> float:
-    return (value - min_) / (max_ - min_)
+def create_backend() -> TritonTransport:
+    if settings.inference_backend == "torchscript":
+        # torch импортируется, только если модели выполняются в процессе
+        from torchscript_backend import TorchScriptTransport
+        return TorchScriptTransport(
+            settings.torchscript_model_repository,
+            models=list(MODEL_NAMES.values()),
+            workers=settings.torchscript_workers,
+            intra_op_threads=settings.torchscript_intra_op_threads,
+            inter_op_threads=settings.torchscript_inter_op_threads,
+            max_queue_size=settings.torchscript_max_queue_size
+        )
+    if settings.inference_backend == "triton":
+        return create_transport(
+            settings.triton_protocol,
+            http_url=settings.triton_http_url,
+            grpc_url=settings.triton_grpc_url,
+            timeout=settings.triton_timeout_s,
+            pool_size=settings.triton_pool_size,
+            keepalive_ms=settings.triton_keepalive_ms
+        )
+    raise ValueError(f"Unknown inference backend: "
+                     f"{settings.inference_backend}")
+
+
+async def load_assets():
+    global tokenizer, image_config, min_max_values
+    tokenizer, image_config, min_max_values = await asyncio.gather(
+        asyncio.to_thread(_load_tokenizer),
+        asyncio.to_thread(
+            ImageConfig.from_pretrained,
+            os.path.join(ASSETS_DIR,
+                         "nsfw-detector/preprocessor/preprocessor_config.json")
+        ),
+        asyncio.to_thread(_load_min_max_values)
+    )
 
 
-def decoder2vector(ids: list[int]) -> np.ndarray:
-    vec = np.zeros((1, VEC_DIM), dtype=np.int64)
-    for id_ in ids:
-        vec[0, id_ - 1] = 1
-    return vec
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    global transport, image_pool, nsfw_shared_memory
+    started_at = time.perf_counter()
+    await load_assets()
+    logger.info(f"Assets loaded in {time.perf_counter() - started_at:.2f}s")
+
+    # Клиенты aiohttp и grpc.aio создаются внутри работающего event loop
+    transport = create_backend()
+    if (settings.triton_shared_memory
+            and settings.inference_backend == "triton"):
+        width, height = image_config.size
+        nsfw_shared_memory = SharedMemoryPool(
+            "nsfw_detector",
+            input_byte_size=settings.nsfw_max_batch_size * 3 * height
+            * width * np.dtype(np.float32).itemsize,
+            outputs={"output": settings.nsfw_max_batch_size * 2
+                     * np.dtype(np.float32).itemsize},
+            size=settings.nsfw_shm_slots
+        )
+        await nsfw_shared_memory.register(transport)
+    await health_monitor.start(transport)
+    # spawn вместо fork: процесс уже держит потоки gRPC
+    image_pool = ProcessPoolExecutor(
+        max_workers=settings.image_workers,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+    warmup_tasks = [asyncio.create_task(warmup(alias, started_at))
+                    for alias in MODEL_NAMES]
+    logger.info(f"Orchestrator started in "
+                f"{time.perf_counter() - started_at:.2f}s")
+    yield
+    for task in warmup_tasks:
+        task.cancel()
+    await asyncio.gather(*warmup_tasks, return_exceptions=True)
+    await health_monitor.stop()
+    await toxicity_batcher.close()
+    await nsfw_batcher.close()
+    await toxicity_cache.close()
+    if nsfw_shared_memory is not None:
+        await nsfw_shared_memory.close(transport)
+    await transport.close()
+    image_pool.shutdown(cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+async def triton_infer(model_name: str, inputs: dict[str, np.ndarray],
+                       shared_memory: Optional[SharedMemoryPool] = None):
+    alias = MODEL_ALIASES[model_name]
+    BATCH_SIZE.labels(alias).observe(len(next(iter(inputs.values()))))
+    with STAGE_SECONDS.labels(alias, "infer").time():
+        try:
+            return await transport.infer(model_name, inputs, shared_memory)
+        except Exception:
+            ERRORS.labels(alias).inc()
+            raise
+
+
+async def infer_toxicity_batch(texts: list[str]) -> list[dict[str, float]]:
+    with STAGE_SECONDS.labels("toxicity", "preprocess").time():
+        inputs = tokenizer(
+            texts,
+            max_length=64,
+            padding="max_length",
+            truncation=True,
+            return_tensors="np"
+        )
+
+    response = await triton_infer("toxicity_classifier", {
+        "input_ids": inputs["input_ids"].astype(np.int64),
+        "attention_mask": inputs["attention_mask"].astype(np.int64)
+    })
+
+    with STAGE_SECONDS.labels("toxicity", "postprocess").time():
+        output = response.as_numpy("output")
+        return [
+            {k: float(v) for k, v in zip(
+                ["non_toxicity", "insult", "obscenity", "threat",
+                 "dangerous"],
+                row
+            )}
+            for row in output
+        ]
+
+
+toxicity_batcher = MicroBatcher(
+    infer_toxicity_batch,
+    max_batch_size=settings.toxicity_max_batch_size,
+    max_wait_ms=settings.toxicity_max_wait_ms,
+    max_queue_size=settings.toxicity_max_queue_size,
+    queue_wait=STAGE_SECONDS.labels("toxicity", "queue_wait")
+)
+
+
+toxicity_cache = ResultCache(
+    "toxicity",
+    settings.toxicity_model_version,
+    max_size=settings.toxicity_cache_size,
+    ttl_s=settings.toxicity_cache_ttl_s,
+    redis_url=settings.redis_url
+)
 
 
-async def triton_infer(model_name: str, inputs: list):
-    def sync_infer():
-        return triton_client.infer(model_name, inputs)
-    return await asyncio.to_thread(sync_infer)
+toxicity_flights = SingleFlight(DEDUPLICATED.labels("toxicity"))
+
+
+async def _predict_toxicity(text: str, key: str) -> dict[str, float]:
+    result = await toxicity_cache.get(key)
+    if result is None:
+        async with limiters["toxicity"].slot():
+            result = await toxicity_batcher.submit(text)
+        await toxicity_cache.set(key, result)
+    return result
 
 
 async def predict_toxicity(text: str) -> dict[str, float]:
-    inputs = tokenizer(
-        text,
-        max_length=64,
-        padding="max_length",
-        truncation=True,
-        return_tensors="np"
+    text = normalize_text(text)
+    key = toxicity_cache.key(text)
+    return await toxicity_flights.do(
+        key, lambda: _predict_toxicity(text, key)
     )
 
-    input_ids = tritonhttpclient.InferInput(
-        "input_ids", inputs["input_ids"].shape, "INT64"
-    )
-    attention_mask = tritonhttpclient.InferInput(
-        "attention_mask", inputs["attention_mask"].shape, "INT64"
-    )
 
-    input_ids.set_data_from_numpy(inputs["input_ids"].astype(np.int64))
-    attention_mask.set_data_from_numpy(
-        inputs["attention_mask"].astype(np.int64)
-    )
+def _split_pair(request: RankingPairRequest) -> tuple[dict, dict]:
+    request_data = request.model_dump()
+    main, candidate = {}, {}
+    for key, value in request_data.items():
+        feature, _, suffix = key.rpartition("_")
+        (main if suffix == "main" else candidate)[feature] = value
+    return main, candidate
+
+
+async def predict_coincidences(main: dict,
+                               candidates: list[dict]) -> list[float]:
+    if not candidates:
+        return []
+
+    async with limiters["ranking"].slot():
+        with STAGE_SECONDS.labels("ranking", "preprocess").time():
+            inputs = ranking_inputs(main, candidates, min_max_values,
+                                    ranking_rows)
+        response = await triton_infer("user_ranking", inputs)
+    with STAGE_SECONDS.labels("ranking", "postprocess").time():
+        return response.as_numpy("output").reshape(-1).astype(float).tolist()
+
+
+ranking_flights = SingleFlight(DEDUPLICATED.labels("ranking"))
+ranking_rows = UserRowCache(settings.ranking_row_cache_size)
+
+
+def _pair_key(main: dict, candidate: dict) -> str:
+    """Ключ пары, не зависящий от порядка и повторов id привычек и
+    интересов: в multi-hot векторе они всё равно неразличимы."""
+    canonical = [
+        {**user,
+         "habit_ids": sorted(set(user["habit_ids"])),
+         "interest_ids": sorted(set(user["interest_ids"]))}
+        for user in (main, candidate)
+    ]
+    return content_key("ranking_pair", settings.ranking_model_version,
+                       json.dumps(canonical, sort_keys=True))
 
-    response = await triton_infer(
-        "toxicity_classifier",
-        [input_ids, attention_mask]
+
+async def predict_coincidence(request: RankingPairRequest) -> dict[str, float]:
+    main, candidate = _split_pair(request)
+    coincidence, = await ranking_flights.do(
+        _pair_key(main, candidate),
+        lambda: predict_coincidences(main, [candidate])
     )
+    return {"coincidence": coincidence}
+
+
+async def infer_nsfw_batch(
+    images: list[np.ndarray]
+) -> list[dict[str, float]]:
+    inputs = np.stack(images).astype(np.float32, copy=False)
+    response = await triton_infer("nsfw_detector", {"image": inputs},
+                                  nsfw_shared_memory)
+    with STAGE_SECONDS.labels("nsfw", "postprocess").time():
+        output = response.as_numpy("output")
+        return [{"normal": float(row[0]), "nsfw": float(row[1])}
+                for row in output]
+
+
+nsfw_batcher = MicroBatcher(
+    infer_nsfw_batch,
+    max_batch_size=settings.nsfw_max_batch_size,
+    max_wait_ms=settings.nsfw_max_wait_ms,
+    max_queue_size=settings.nsfw_max_queue_size,
+    queue_wait=STAGE_SECONDS.labels("nsfw", "queue_wait")
+)
 
-    output = response.as_numpy("output")
-    return {k: float(v) for k, v in zip(
-        ["non_toxicity", "insult", "obscenity", "threat", "dangerous"],
-        output[0]
-    )}
 
+async def predict_nsfw(image: np.ndarray) -> dict[str, float]:
+    async with limiters["nsfw"].slot():
+        return await nsfw_batcher.submit(image)
 
-async def predict_coincidence(request: RankingPairRequest) -> dict[str, float]:
-    request_data = request.model_dump()
 
-    for feature in ("age", "year_created_at", "budget", "rating"):
-        for suffix in ("_main", "_candidate"):
-            key = feature + suffix
-            request_data[key] = _min_max_scale(
-                request_data[key],
-                min_max_values[f"{feature}_min"],
-                min_max_values[f"{feature}_max"]
-            )
-
-    numerical = np.array([request_data[col] for col in [
-        "age_main", "year_created_at_main", "budget_main", "rating_main",
-        "age_candidate", "year_created_at_candidate",
-        "budget_candidate", "rating_candidate",
-        "gender_main", "gender_candidate"
-    ]]).reshape(1, -1).astype(np.float32)
-
-    categorical = np.array([request_data[col] for col in [
-        "ei_id_main", "education_direction_main",
-        "ei_id_candidate", "education_direction_candidate"
-    ]]).reshape(1, -1).astype(np.int64)
-
-    habits = np.expand_dims(np.concatenate([
-        decoder2vector(request_data[col])
-        for col in ["habit_ids_main", "habit_ids_candidate"]
-    ]), axis=0).astype(np.int64)
-
-    interests = np.expand_dims(np.concatenate([
-        decoder2vector(request_data[col])
-        for col in ["interest_ids_main", "interest_ids_candidate"]
-    ]), axis=0).astype(np.int64)
-
-    inputs = [
-        tritonhttpclient.InferInput("num_input", numerical.shape, "FP32")
-        .set_data_from_numpy(numerical),
-        tritonhttpclient.InferInput("cat_input", categorical.shape, "INT64")
-        .set_data_from_numpy(categorical),
-        tritonhttpclient.InferInput("habits_input", habits.shape, "INT64")
-        .set_data_from_numpy(habits),
-        tritonhttpclient.InferInput("interest_input", interests.shape, "INT64")
-        .set_data_from_numpy(interests)
-    ]
+nsfw_cache = PerceptualCache(
+    max_size=settings.nsfw_cache_size,
+    max_distance=settings.nsfw_cache_max_distance
+)
 
-    response = await triton_infer("user_ranking", inputs)
-    return {"coincidence": float(response.as_numpy("output")[0])}
 
+async def predict_nsfw_encoded(preprocess: Callable,
+                              payload: Union[str, bytes]) -> dict[str, float]:
+    # Декодирование и хэш в пуле процессов, вместе с ожиданием воркера
+    with STAGE_SECONDS.labels("nsfw", "preprocess").time():
+        image = await asyncio.get_running_loop().run_in_executor(
+            image_pool, preprocess, payload, image_config
+        )
+    nsfw_cache.observe_hash_time(image.hash_time)
+    result = nsfw_cache.get(image.phash)
+    if result is None:
+        result = await predict_nsfw(image.pixels)
+        nsfw_cache.set(image.phash, result)
+    return result
+
+
+def _warmup_user() -> dict:
+    return {
+        "ei_id": 1,
+        "age": min_max_values["age_min"],
+        "education_direction": 1,
+        "year_created_at": min_max_values["year_created_at_min"],
+        "budget": min_max_values["budget_min"],
+        "rating": min_max_values["rating_max"],
+        "gender": 0,
+        "habit_ids": [1],
+        "interest_ids": [1]
+    }
+
+
+async def _warmup_batch(alias: str, batch_size: int):
+    if alias == "toxicity":
+        await infer_toxicity_batch(["Пример текста"] * batch_size)
+    elif alias == "nsfw":
+        width, height = image_config.size
+        await infer_nsfw_batch(
+            [np.zeros((3, height, width), dtype=np.float32)] * batch_size
+        )
+    else:
+        await predict_coincidences(_warmup_user(),
+                                   [_warmup_user()] * batch_size)
+
+
+async def warmup(alias: str, started_at: float):
+    """Ждёт готовности модели в Triton и прогоняет прогревочные батчи,
+    только после этого модель отмечается готовой в health_monitor."""
+    while True:
+        if not health_monitor.triton_readiness[alias]:
+            await asyncio.sleep(settings.health_poll_interval_s)
+            continue
+        try:
+            start_time = time.perf_counter()
+            for batch_size in settings.warmup_batch_sizes:
+                for _ in range(settings.warmup_iterations):
+                    await _warmup_batch(alias, batch_size)
+            break
+        except Exception as e:
+            logger.warning(f"Warmup of {alias} failed: {e}")
+            await asyncio.sleep(settings.health_poll_interval_s)
+
+    health_monitor.mark_warm(alias)
+    now = time.perf_counter()
+    logger.info(f"{alias} warmed up in {now - start_time:.2f}s, "
+                f"ready {now - started_at:.2f}s after startup")
+
+
+INFERENCE_PATHS = {"/ranking_pair": "ranking", "/ranking_batch": "ranking",
+                   "/predict_toxicity": "toxicity",
+                   "/predict_toxicity_batch": "toxicity",
+                   "/predict_nsfw": "nsfw", "/predict_nsfw_bytes": "nsfw"}
+_first_requests: set[str] = set()
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Считает запросы к моделям в работе и по кодам ответа, логирует
+    длительность первого запроса к каждому эндпоинту. Если очередь
+    модели полна или модель ещё не готова, отвечает 503 до чтения тела
+    запроса, так что клиентам не нужна отдельная проверка готовности."""
+    path = request.url.path
+    if path not in INFERENCE_PATHS:
+        return await call_next(request)
+    model = INFERENCE_PATHS[path]
+    if not health_monitor.readiness[model]:
+        REQUESTS.labels(path, "503").inc()
+        retry_after = math.ceil(settings.health_poll_interval_s)
+        return JSONResponse({"detail": f"Model {model} is not ready"},
+                            status_code=503,
+                            headers={"Retry-After": str(retry_after)})
+    try:
+        limiters[model].admit()
+    except Overloaded as e:
+        REQUESTS.labels(path, "503").inc()
+        return JSONResponse({"detail": str(e)}, status_code=503,
+                            headers={"Retry-After": str(e.retry_after)})
+
+    in_flight = IN_FLIGHT.labels(path)
+    in_flight.inc()
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        in_flight.dec()
+        REQUESTS.labels(path, str(status)).inc()
 
-async def predict_nsfw(image: Image.Image) -> dict[str, float]:
-    inputs = np.asarray(
-        image_preprocessor(image)["pixel_values"],
-        dtype=np.float32
-    )
+    if path not in _first_requests:
+        _first_requests.add(path)
+        logger.info(f"First request to {path} took "
+                    f"{1000 * (time.perf_counter() - start_time):.1f}ms")
+    return response
 
-    infer_input = tritonhttpclient.InferInput(
-        "image",
-        inputs.shape,
-        "FP32"
-    ).set_data_from_numpy(inputs.astype(np.float32))
 
-    response = await triton_infer("nsfw_detector", [infer_input])
-    output = response.as_numpy("output")
-    return {"normal": float(output[0, 0]), "nsfw": float(output[0, 1])}
+def _overloaded(error: asyncio.QueueFull, detail: str) -> HTTPException:
+    """503 с Retry-After, чтобы клиенты не повторяли запрос сразу."""
+    retry_after = error.retry_after if isinstance(error, Overloaded) else 1
+    return HTTPException(503, detail=detail,
+                         headers={"Retry-After": str(retry_after)})
 
 
 @app.post("/ranking_pair", response_model=RankingResponse)
 async def compare_pair(request: RankingPairRequest):
     try:
         return await predict_coincidence(request)
+    except asyncio.QueueFull as e:
+        raise _overloaded(e, "Ranking queue is full")
+    except Exception as e:
+        raise HTTPException(500, detail=str(e))
+
+
+@app.post("/ranking_batch", response_model=RankingBatchResponse)
+async def compare_batch(request: RankingBatchRequest):
+    try:
+        coincidences = await predict_coincidences(
+            request.main.model_dump(),
+            [candidate.model_dump() for candidate in request.candidates]
+        )
+        return {"coincidences": coincidences}
+    except asyncio.QueueFull as e:
+        raise _overloaded(e, "Ranking queue is full")
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
@@ -166,6 +485,23 @@ async def compare_pair(request: RankingPairRequest):
 async def toxicity_endpoint(request: TextRequest):
     try:
         return await predict_toxicity(request.text)
+    except asyncio.QueueFull as e:
+        raise _overloaded(e, "Toxicity queue is full")
+    except Exception as e:
+        raise HTTPException(500, detail=str(e))
+
+
+@app.post("/predict_toxicity_batch", response_model=ToxicityBatchResponse)
+async def toxicity_batch_endpoint(request: TextBatchRequest):
+    """Пакет текстов, например сообщений чата, одним запросом; каждый
+    текст проходит кэш и микро-батчирование как отдельный."""
+    try:
+        results = await asyncio.gather(
+            *(predict_toxicity(text) for text in request.texts)
+        )
+        return {"results": results}
+    except asyncio.QueueFull as e:
+        raise _overloaded(e, "Toxicity queue is full")
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
@@ -173,22 +509,170 @@ async def toxicity_endpoint(request: TextRequest):
 @app.post("/predict_nsfw", response_model=NSFWResponse)
 async def nsfw_endpoint(request: NSFWRequest):
     try:
-        image = (Image.open(io.BytesIO(base64.b64decode(request.image)))
-                 .convert("RGB"))
-        return await predict_nsfw(image)
+        return await predict_nsfw_encoded(preprocess_base64, request.image)
+    except asyncio.QueueFull as e:
+        raise _overloaded(e, "NSFW queue is full")
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
 
-@app.get("/check_model_{model_name}", response_model=ModelReadiness)
-async def check_model(model_name: str):
+@app.post(
+    "/predict_nsfw_bytes",
+    response_model=NSFWResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/octet-stream": {
+            "schema": {"type": "string", "format": "binary"}
+        },
+        "multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"image": {"type": "string", "format": "binary"}},
+            "required": ["image"]
+        }}
+    }}}
+)
+async def nsfw_bytes_endpoint(request: Request):
+    """Изображение передаётся сырыми байтами (application/octet-stream)
+    или файлом image в multipart/form-data, без base64 и JSON."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("image")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(422, detail="Field 'image' is required")
+        data = await upload.read()
+    else:
+        data = await request.body()
+    if not data:
+        raise HTTPException(422, detail="Empty image")
+
     try:
-        is_ready = await asyncio.to_thread(
-            triton_client.is_model_ready,
-            f"{model_name}_classifier" if model_name == "toxicity" else
-            "user_ranking" if model_name == "ranking" else
-            "nsfw_detector"
-        )
-        return {"ready": is_ready}
+        return await predict_nsfw_encoded(preprocess_bytes, data)
+    except asyncio.QueueFull as e:
+        raise _overloaded(e, "NSFW queue is full")
     except Exception as e:
-        return {"error": str(e)}
+        raise HTTPException(500, detail=str(e))
+
+
+def _cache_stats() -> dict[str, dict]:
+    return {
+        "toxicity": toxicity_cache.stats(),
+        "nsfw": nsfw_cache.stats(),
+        "ranking_rows": ranking_rows.stats()
+    }
+
+
+def _cache_lookups() -> dict[tuple[str, str], int]:
+    lookups = {}
+    for cache, stats in _cache_stats().items():
+        for field, result in (("memory_hits", "memory_hit"),
+                              ("redis_hits", "redis_hit"),
+                              ("misses", "miss")):
+            if field in stats:
+                lookups[cache, result] = stats[field]
+    return lookups
+
+
+def _cache_hit_ratios() -> dict[tuple[str], float]:
+    ratios = {}
+    for cache, stats in _cache_stats().items():
+        hits = stats["memory_hits"] + stats.get("redis_hits", 0)
+        total = hits + stats["misses"]
+        ratios[(cache,)] = hits / total if total else 0.0
+    return ratios
+
+
+REGISTRY.register(CallbackMetric(
+    "orchestrator_cache_lookups_total",
+    "Result cache lookups by outcome",
+    ("cache", "result"),
+    _cache_lookups,
+    type_name="counter"
+))
+REGISTRY.register(CallbackMetric(
+    "orchestrator_cache_hit_ratio",
+    "Share of result cache lookups served from cache",
+    ("cache",),
+    _cache_hit_ratios
+))
+
+
+def _limiter_values(field: str) -> Callable[[], dict[tuple[str], float]]:
+    return lambda: {(alias,): limiter.stats()[field]
+                    for alias, limiter in limiters.items()}
+
+
+def _limiter_rejections() -> dict[tuple[str, str], int]:
+    return {(alias, reason): count
+            for alias, limiter in limiters.items()
+            for reason, count in limiter.rejected.items()}
+
+
+for field, name, description in (
+    ("limit", "orchestrator_concurrency_limit",
+     "Current adaptive concurrency limit"),
+    ("in_flight", "orchestrator_limiter_in_flight",
+     "Model calls currently holding a limiter slot"),
+    ("queued", "orchestrator_limiter_queued",
+     "Model calls waiting for a limiter slot"),
+    ("latency_s", "orchestrator_limiter_latency_seconds",
+     "Long-term average model latency the limit is adapted against")
+):
+    REGISTRY.register(CallbackMetric(name, description, ("model",),
+                                     _limiter_values(field)))
+REGISTRY.register(CallbackMetric(
+    "orchestrator_rejected_requests_total",
+    "Requests rejected by the concurrency limiter",
+    ("model", "reason"),
+    _limiter_rejections,
+    type_name="counter"
+))
+
+
+@app.get("/cache_stats", response_model=dict[str, CacheStats])
+async def cache_stats():
+    return _cache_stats()
+
+
+@app.delete("/ranking_features/{user_id}", status_code=204)
+async def invalidate_ranking_features(user_id: int):
+    """Удаляет закэшированные признаки пользователя, например после
+    удаления профиля; при изменении профиля достаточно новой версии."""
+    ranking_rows.invalidate(user_id)
+    return Response(status_code=204)
+
+
+@app.delete("/ranking_features", status_code=204)
+async def clear_ranking_features():
+    ranking_rows.clear()
+    return Response(status_code=204)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики в текстовом формате Prometheus."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/health", response_model=HealthResponse,
+         responses={304: {"description": "Состояние не изменилось"}})
+async def health(request: Request, response: Response, wait: float = 0):
+    """Готовность всех моделей одним ответом.
+
+    С заголовком If-None-Match и совпадающим ETag возвращает 304;
+    если задан wait, сначала ждёт изменения состояния до wait секунд
+    (long polling), так что клиенту не нужно опрашивать эндпоинт часто.
+    """
+    etag = request.headers.get("if-none-match")
+    if await health_monitor.unchanged(etag, min(wait, settings.health_max_wait_s)):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = health_monitor.etag
+    response.headers["Cache-Control"] = "no-cache"
+    return health_monitor.snapshot()
+
+
+@app.get("/check_model_{model_name}", response_model=ModelReadiness)
+async def check_model(model_name: str):
+    if model_name not in health_monitor.readiness:
+        raise HTTPException(404, detail=f"Unknown model: {model_name}")
+    return {"ready": health_monitor.readiness[model_name]}
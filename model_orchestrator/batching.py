@@ -0,0 +1,107 @@
+"""
+Динамическое микро-батчирование запросов к моделям на стороне оркестратора
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+BatchFunction = Callable[[list], Awaitable[list]]
+
+
+class MicroBatcher:
+    """Собирает конкурентные запросы в один батч.
+
+    Батч отправляется, когда набрано max_batch_size элементов или прошло
+    max_wait_ms с момента прихода первого элемента. Результаты батча
+    раздаются ожидающим корутинам в порядке поступления.
+
+    Args:
+        infer_batch: BatchFunction - корутина, принимающая список входов и
+        возвращающая список выходов той же длины.
+        max_batch_size: int - максимальный размер батча.
+        max_wait_ms: float - максимальное ожидание добора батча, мс.
+        max_queue_size: int - максимальная глубина очереди, при
+        переполнении submit выбрасывает asyncio.QueueFull.
+        queue_wait: Optional[Any] - гистограмма с методом observe, куда
+        пишется время ожидания каждого элемента в очереди, с.
+    """
+
+    def __init__(self, infer_batch: BatchFunction, max_batch_size: int,
+                 max_wait_ms: float, max_queue_size: int,
+                 queue_wait: Optional[Any] = None):
+        self.infer_batch = infer_batch
+        self.queue_wait = queue_wait
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+
+        # Очередь и воркер создаются лениво внутри работающего event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._pending: set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._worker = asyncio.create_task(self._collect())
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put_nowait((item, future, loop.time()))
+        return await future
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        for task in self._pending:
+            task.cancel()
+        await asyncio.gather(
+            *filter(None, [self._worker]), *self._pending,
+            return_exceptions=True
+        )
+        self._queue, self._worker = None, None
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _dispatch(self,
+                        batch: list[tuple[Any, asyncio.Future, float]]):
+        items, futures, enqueued_at = zip(*batch)
+        if self.queue_wait is not None:
+            now = asyncio.get_running_loop().time()
+            for timestamp in enqueued_at:
+                self.queue_wait.observe(now - timestamp)
+        try:
+            outputs = await self.infer_batch(list(items))
+            # Иначе ожидающие без выхода зависли бы навсегда
+            if len(outputs) != len(items):
+                raise RuntimeError(
+                    f"Batch of {len(items)} inputs returned "
+                    f"{len(outputs)} outputs"
+                )
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, output in zip(futures, outputs):
+            if not future.done():
+                future.set_result(output)
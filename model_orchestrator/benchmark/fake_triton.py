@@ -0,0 +1,256 @@
+"""
+Заглушка Triton Inference Server для локальных нагрузочных тестов оркестратора.
+
+Реализует нужную оркестратору часть протокола KServe v2 по HTTP (включая
+бинарное расширение тензоров) и gRPC: готовность сервера и моделей,
+инференс и регистрацию системной разделяемой памяти. Модели не
+вычисляются: ответ - случайные вероятности правильной формы после
+настраиваемой задержки.
+
+Запуск:
+    python benchmark/fake_triton.py --http-port 8000 --grpc-port 8001 \
+        --latency-ms 3 --per-item-ms 0.5 --instances 4
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import mmap
+import os
+from typing import Optional
+
+import grpc
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from tritonclient.grpc import service_pb2, service_pb2_grpc
+
+# Имя модели -> (имя выхода, ширина выхода)
+MODELS = {
+    "toxicity_classifier": ("output", 5),
+    "nsfw_detector": ("output", 2),
+    "user_ranking": ("output", 1)
+}
+
+
+class FakeTriton:
+    """Общее для HTTP и gRPC состояние: задержка инференса и
+    зарегистрированные регионы разделяемой памяти.
+
+    Args:
+        latency_ms: float - постоянная задержка одного запроса, мс.
+        per_item_ms: float - добавка к задержке за элемент батча, мс.
+        instances: int - число одновременно выполняемых запросов, как
+        instance_group в Triton; 0 - без ограничения.
+    """
+
+    def __init__(self, latency_ms: float, per_item_ms: float,
+                 instances: int = 0):
+        self.latency_ms = latency_ms
+        self.per_item_ms = per_item_ms
+        self.instances = instances
+        self._instances: Optional[asyncio.Semaphore] = None
+        self.rng = np.random.default_rng()
+        self.regions: dict[str, tuple[mmap.mmap, int, int]] = {}
+
+    async def infer(self, model_name: str, batch_size: int) -> np.ndarray:
+        if self.instances and self._instances is None:
+            self._instances = asyncio.Semaphore(self.instances)
+        async with self._instances or contextlib.nullcontext():
+            await asyncio.sleep(
+                (self.latency_ms + self.per_item_ms * batch_size) / 1000
+            )
+        _, width = MODELS[model_name]
+        return self.rng.random((batch_size, width), dtype=np.float32)
+
+    def register(self, name: str, key: str, offset: int, byte_size: int):
+        fd = os.open(f"/dev/shm/{key.lstrip('/')}", os.O_RDWR)
+        try:
+            region = mmap.mmap(fd, offset + byte_size)
+        finally:
+            os.close(fd)
+        self.regions[name] = (region, offset, byte_size)
+
+    def unregister(self, name: str = ""):
+        names = [name] if name else list(self.regions)
+        for region_name in names:
+            region = self.regions.pop(region_name, None)
+            if region is not None:
+                region[0].close()
+
+    def write(self, name: str, offset: int, data: bytes):
+        region, base, byte_size = self.regions[name]
+        if offset + len(data) > byte_size:
+            raise ValueError(f"Output does not fit region {name}")
+        region[base + offset:base + offset + len(data)] = data
+
+
+def create_http_app(fake: FakeTriton) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/v2/health/live")
+    @app.get("/v2/health/ready")
+    async def server_ready():
+        return Response(status_code=200)
+
+    @app.get("/v2/models/{model_name}/ready")
+    async def model_ready(model_name: str):
+        return Response(status_code=200 if model_name in MODELS else 400)
+
+    @app.post("/v2/models/{model_name}/infer")
+    async def infer(model_name: str, request: Request):
+        if model_name not in MODELS:
+            return Response(status_code=400)
+        body = await request.body()
+        header_length = request.headers.get("Inference-Header-Content-Length")
+        header = json.loads(body[:int(header_length)] if header_length
+                            else body)
+
+        output = await fake.infer(model_name, header["inputs"][0]["shape"][0])
+        output_name, _ = MODELS[model_name]
+        requested = header.get("outputs") or [{"name": output_name}]
+
+        outputs, binary = [], b""
+        for requested_output in requested:
+            parameters = requested_output.get("parameters", {})
+            data = output.tobytes()
+            description = {"name": output_name, "datatype": "FP32",
+                           "shape": list(output.shape)}
+            if "shared_memory_region" in parameters:
+                fake.write(parameters["shared_memory_region"],
+                           parameters.get("shared_memory_offset", 0), data)
+                description["parameters"] = {
+                    "shared_memory_region":
+                        parameters["shared_memory_region"],
+                    "shared_memory_byte_size": len(data)
+                }
+            else:
+                description["parameters"] = {"binary_data_size": len(data)}
+                binary += data
+            outputs.append(description)
+
+        response_header = json.dumps(
+            {"model_name": model_name, "outputs": outputs}
+        ).encode()
+        return Response(
+            response_header + binary,
+            media_type="application/octet-stream",
+            headers={"Inference-Header-Content-Length":
+                     str(len(response_header))}
+        )
+
+    @app.post("/v2/systemsharedmemory/region/{name}/register")
+    async def register(name: str, request: Request):
+        region = await request.json()
+        fake.register(name, region["key"], region.get("offset", 0),
+                      region["byte_size"])
+        return Response(status_code=200)
+
+    @app.post("/v2/systemsharedmemory/region/{name}/unregister")
+    async def unregister(name: str):
+        fake.unregister(name)
+        return Response(status_code=200)
+
+    @app.post("/v2/systemsharedmemory/unregister")
+    async def unregister_all():
+        fake.unregister()
+        return Response(status_code=200)
+
+    return app
+
+
+class FakeGRPCService(service_pb2_grpc.GRPCInferenceServiceServicer):
+    def __init__(self, fake: FakeTriton):
+        self.fake = fake
+
+    async def ServerLive(self, request, context):
+        return service_pb2.ServerLiveResponse(live=True)
+
+    async def ServerReady(self, request, context):
+        return service_pb2.ServerReadyResponse(ready=True)
+
+    async def ModelReady(self, request, context):
+        return service_pb2.ModelReadyResponse(ready=request.name in MODELS)
+
+    async def ModelInfer(self, request, context):
+        if request.model_name not in MODELS:
+            await context.abort(grpc.StatusCode.NOT_FOUND,
+                                f"Unknown model {request.model_name}")
+        output = await self.fake.infer(request.model_name,
+                                       request.inputs[0].shape[0])
+        output_name, _ = MODELS[request.model_name]
+
+        response = service_pb2.ModelInferResponse(
+            model_name=request.model_name
+        )
+        for requested_output in (request.outputs or [None]):
+            tensor = response.outputs.add()
+            tensor.name = output_name
+            tensor.datatype = "FP32"
+            tensor.shape.extend(output.shape)
+
+            parameters = (requested_output.parameters
+                          if requested_output is not None else {})
+            if "shared_memory_region" in parameters:
+                offset = (parameters["shared_memory_offset"].int64_param
+                          if "shared_memory_offset" in parameters else 0)
+                self.fake.write(
+                    parameters["shared_memory_region"].string_param,
+                    offset, output.tobytes()
+                )
+            else:
+                response.raw_output_contents.append(output.tobytes())
+        return response
+
+    async def SystemSharedMemoryRegister(self, request, context):
+        self.fake.register(request.name, request.key, request.offset,
+                           request.byte_size)
+        return service_pb2.SystemSharedMemoryRegisterResponse()
+
+    async def SystemSharedMemoryUnregister(self, request, context):
+        self.fake.unregister(request.name)
+        return service_pb2.SystemSharedMemoryUnregisterResponse()
+
+
+async def serve(host: str, http_port: int, grpc_port: int,
+                fake: FakeTriton):
+    # Как и Triton, не ограничиваем размер сообщения 4 МБ по умолчанию
+    grpc_server = grpc.aio.server(options=[
+        ("grpc.max_receive_message_length", -1),
+        ("grpc.max_send_message_length", -1)
+    ])
+    service_pb2_grpc.add_GRPCInferenceServiceServicer_to_server(
+        FakeGRPCService(fake), grpc_server
+    )
+    grpc_server.add_insecure_port(f"{host}:{grpc_port}")
+    await grpc_server.start()
+
+    http_server = uvicorn.Server(uvicorn.Config(
+        create_http_app(fake), host=host, port=http_port, log_level="warning"
+    ))
+    try:
+        await http_server.serve()
+    finally:
+        await grpc_server.stop(grace=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--http-port", type=int, default=8000)
+    parser.add_argument("--grpc-port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=3.0)
+    parser.add_argument("--per-item-ms", type=float, default=0.5)
+    parser.add_argument("--instances", type=int, default=0,
+                        help="Одновременных запросов на сервер, 0 - без "
+                             "ограничения")
+    args = parser.parse_args()
+
+    asyncio.run(serve(
+        args.host, args.http_port, args.grpc_port,
+        FakeTriton(args.latency_ms, args.per_item_ms, args.instances)
+    ))
+
+
+if __name__ == "__main__":
+    main()
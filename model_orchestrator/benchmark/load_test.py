@@ -0,0 +1,266 @@
+"""
+Нагрузочный бенчмарк эндпоинтов оркестратора.
+
+Для каждого эндпоинта и уровня конкурентности отправляет заданное число
+запросов и выводит пропускную способность, p50/p95/p99 задержки и
+процессорное время оркестратора (вместе с дочерними процессами) на запрос.
+
+Против уже запущенного оркестратора:
+    python benchmark/load_test.py --url http://localhost:7654 --pid <pid>
+
+Полностью локально, с заглушкой Triton из fake_triton.py:
+    python benchmark/load_test.py --spawn --concurrency 1 8 32 64
+"""
+import argparse
+import asyncio
+import base64
+import io
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import aiohttp
+import numpy as np
+from PIL import Image
+
+ORCHESTRATOR_DIR = Path(__file__).resolve().parents[1]
+ENDPOINTS = ("predict_toxicity", "predict_nsfw", "ranking_pair")
+
+WORDS = ("привет", "учусь", "на", "втором", "курсе", "ищу", "соседа",
+         "люблю", "готовить", "спорт", "музыка", "тихий", "чистоплотный")
+
+
+def toxicity_payload(unique: bool) -> Callable[[int], dict]:
+    def make(i: int) -> dict:
+        text = " ".join(random.choices(WORDS, k=12))
+        return {"text": f"{text} {i}" if unique else text}
+    return make
+
+
+def nsfw_payload(images: int, size: tuple[int, int]) -> Callable[[int], dict]:
+    rng = np.random.default_rng(0)
+    encoded = []
+    for _ in range(images):
+        noise = rng.integers(0, 256, (size[1] // 32, size[0] // 32, 3),
+                             dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(noise).resize(size, Image.BICUBIC).save(
+            buffer, format="JPEG", quality=90
+        )
+        encoded.append(base64.b64encode(buffer.getvalue()).decode())
+    return lambda i: {"image": encoded[i % len(encoded)]}
+
+
+def ranking_payload(i: int) -> dict:
+    payload = {}
+    for suffix in ("main", "candidate"):
+        payload.update({
+            f"ei_id_{suffix}": random.randint(1, 100),
+            f"age_{suffix}": random.randint(18, 35),
+            f"education_direction_{suffix}": random.randint(1, 100),
+            f"year_created_at_{suffix}": random.randint(2021, 2025),
+            f"budget_{suffix}": random.randint(1000, 100000),
+            f"rating_{suffix}": round(random.uniform(0, 5), 2),
+            f"gender_{suffix}": random.randint(0, 1),
+            f"habit_ids_{suffix}": random.sample(range(1, 51), 3),
+            f"interest_ids_{suffix}": random.sample(range(1, 51), 5)
+        })
+    return payload
+
+
+def process_tree_cpu_seconds(pid: Optional[int]) -> Optional[float]:
+    """user + system время процесса и его прямых потомков (пул
+    предобработки изображений) по /proc, только Linux."""
+    if pid is None:
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0.0
+    for stat_path in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            stat = stat_path.read_text()
+        except OSError:
+            continue
+        fields = stat[stat.rindex(")") + 2:].split()
+        process_id, parent_id = int(stat_path.parent.name), int(fields[1])
+        if pid in (process_id, parent_id):
+            total += (int(fields[11]) + int(fields[12])) / ticks
+    return total
+
+
+async def run_level(session: aiohttp.ClientSession, url: str,
+                    make_payload: Callable[[int], dict], concurrency: int,
+                    requests: int, pid: Optional[int]) -> dict:
+    latencies, errors, rejected = [], 0, 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors, rejected
+        while (i := next(counter)) < requests:
+            payload = make_payload(i)
+            start_time = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as response:
+                    await response.read()
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+            except aiohttp.ClientError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - start_time)
+            elif status == 503:
+                # Отказ при перегрузке - не ошибка; как нормальный клиент,
+                # выжидаем Retry-After, а не повторяем сразу
+                rejected += 1
+                await asyncio.sleep(float(retry_after or 1))
+            else:
+                errors += 1
+
+    cpu_before = process_tree_cpu_seconds(pid)
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    cpu_after = process_tree_cpu_seconds(pid)
+
+    p50, p95, p99 = (np.percentile(latencies, [50, 95, 99]) * 1000
+                     if latencies else (float("nan"),) * 3)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "rejected": rejected,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "cpu_ms_per_request": (1000 * (cpu_after - cpu_before) / requests
+                               if cpu_before is not None else None)
+    }
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str,
+                     timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{url}/health") as response:
+                if response.status == 200 and (await response.json())["ready"]:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"Orchestrator at {url} is not ready in {timeout}s")
+
+
+def spawn_stack(args) -> list[subprocess.Popen]:
+    """Поднимает заглушку Triton и оркестратор на localhost."""
+    fake_triton = subprocess.Popen([
+        sys.executable, str(Path(__file__).with_name("fake_triton.py")),
+        "--http-port", str(args.triton_http_port),
+        "--grpc-port", str(args.triton_grpc_port),
+        "--latency-ms", str(args.triton_latency_ms),
+        "--per-item-ms", str(args.triton_per_item_ms),
+        "--instances", str(args.triton_instances)
+    ])
+    port = args.url.rsplit(":", 1)[-1]
+    orchestrator = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", port,
+         "--log-level", "warning"],
+        cwd=ORCHESTRATOR_DIR,
+        env={
+            **os.environ,
+            "TRITON_HTTP_URL": f"127.0.0.1:{args.triton_http_port}",
+            "TRITON_GRPC_URL": f"127.0.0.1:{args.triton_grpc_port}",
+            "HEALTH_POLL_INTERVAL_S": "0.5"
+        }
+    )
+    return [fake_triton, orchestrator]
+
+
+def print_report(results: list[dict]):
+    columns = ("endpoint", "concurrency", "requests", "errors", "rejected",
+               "rps", "p50_ms", "p95_ms", "p99_ms", "cpu_ms_per_request")
+    print(" ".join(f"{column:>18}" for column in columns))
+    for result in results:
+        print(" ".join(
+            f"{value:>18.2f}" if isinstance(value, float)
+            else f"{str(value):>18}"
+            for value in (result[column] for column in columns)
+        ))
+
+
+async def benchmark(args, pid: Optional[int]) -> list[dict]:
+    payloads = {
+        "predict_toxicity": toxicity_payload(args.unique),
+        "predict_nsfw": nsfw_payload(args.images, tuple(args.image_size)),
+        "ranking_pair": ranking_payload
+    }
+    results = []
+    connector = aiohttp.TCPConnector(limit=max(args.concurrency))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session, args.url, args.startup_timeout)
+        for endpoint in args.endpoints:
+            url = f"{args.url}/{endpoint}"
+            # Прогрев соединений и кэшей процесса перед замером
+            await run_level(session, url, payloads[endpoint],
+                            max(args.concurrency), max(args.concurrency),
+                            None)
+            for concurrency in args.concurrency:
+                result = await run_level(session, url, payloads[endpoint],
+                                         concurrency, args.requests, pid)
+                results.append({"endpoint": endpoint, **result})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:7654")
+    parser.add_argument("--pid", type=int, default=None,
+                        help="PID оркестратора для замера CPU")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS),
+                        choices=ENDPOINTS)
+    parser.add_argument("--concurrency", nargs="+", type=int,
+                        default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=500,
+                        help="Число запросов на уровень конкурентности")
+    parser.add_argument("--unique", action="store_true",
+                        help="Уникальные тексты, чтобы не попадать в кэш")
+    parser.add_argument("--images", type=int, default=16,
+                        help="Число различных изображений для NSFW")
+    parser.add_argument("--image-size", nargs=2, type=int,
+                        default=[1920, 1080])
+    parser.add_argument("--json", type=Path, default=None,
+                        help="Сохранить результаты в JSON")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--spawn", action="store_true",
+                        help="Запустить заглушку Triton и оркестратор")
+    parser.add_argument("--triton-http-port", type=int, default=18000)
+    parser.add_argument("--triton-grpc-port", type=int, default=18001)
+    parser.add_argument("--triton-latency-ms", type=float, default=3.0)
+    parser.add_argument("--triton-per-item-ms", type=float, default=0.5)
+    parser.add_argument("--triton-instances", type=int, default=0)
+    args = parser.parse_args()
+
+    processes = spawn_stack(args) if args.spawn else []
+    pid = processes[-1].pid if processes else args.pid
+    try:
+        results = asyncio.run(benchmark(args, pid))
+    finally:
+        # Оркестратор останавливаем первым, чтобы он успел снять
+        # регистрацию разделяемой памяти в заглушке Triton
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+    print_report(results)
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
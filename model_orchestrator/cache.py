@@ -0,0 +1,256 @@
+"""
+Кэши результатов инференса: LRU в памяти процесса, Redis и
+перцептивные хэши изображений
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация, не меняющая токенизацию BERT: NFC и схлопывание
+    пробельных символов."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def content_key(namespace: str, model_version: str, payload: str) -> str:
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=16)
+    return f"{namespace}:{model_version}:{digest.hexdigest()}"
+
+
+class SingleFlight:
+    """Объединение одинаковых запросов, выполняющихся одновременно.
+
+    Первый вызов с ключом запускает вычисление отдельной задачей, вызовы
+    с тем же ключом до его завершения ждут ту же задачу. Отмена одного
+    из ожидающих (клиент отключился) не отменяет вычисление для
+    остальных.
+
+    Args:
+        deduplicated: Optional[Any] - счётчик с методом inc, считает
+        вызовы, получившие результат чужого вычисления.
+    """
+
+    def __init__(self, deduplicated: Optional[Any] = None):
+        self.deduplicated = deduplicated
+        self._calls: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(compute())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            # Исключение задачи, которую никто не дождался, не логируется
+            # asyncio как необработанное
+            task.add_done_callback(
+                lambda done: done.cancelled() or done.exception()
+            )
+        elif self.deduplicated is not None:
+            self.deduplicated.inc()
+        return await asyncio.shield(task)
+
+
+class LRUCache:
+    """LRU кэш с ограничением размера и временем жизни записей.
+
+    Args:
+        max_size: int - максимальное число записей.
+        ttl_s: float - время жизни записи, с.
+    """
+
+    def __init__(self, max_size: int, ttl_s: float):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl_s, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class PerceptualCache:
+    """Кэш вердиктов по перцептивному хэшу с поиском по расстоянию Хэмминга.
+
+    64-битный хэш делится на max_distance + 1 фрагментов: по принципу
+    Дирихле у хэшей на расстоянии не больше max_distance хотя бы один
+    фрагмент совпадает, поэтому кандидаты ищутся по индексу фрагментов,
+    а не перебором всего кэша. Вытеснение - LRU.
+
+    Args:
+        max_size: int - максимальное число записей.
+        max_distance: int - допустимое расстояние Хэмминга, от 0 до 7.
+        hash_bits: int - разрядность хэша.
+    """
+
+    def __init__(self, max_size: int, max_distance: int,
+                 hash_bits: int = 64):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        bounds = [hash_bits * i // chunks for i in range(chunks + 1)]
+        self._slices = [(start, (1 << (end - start)) - 1)
+                        for start, end in zip(bounds, bounds[1:])]
+        self._data: OrderedDict[int, Any] = OrderedDict()
+        self._index: list[dict[int, set[int]]] = [{} for _ in self._slices]
+
+        self.hits = 0
+        self.misses = 0
+        self.hash_time = 0.0
+        self.hashes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _chunks(self, phash: int):
+        return ((phash >> shift) & mask for shift, mask in self._slices)
+
+    def _find(self, phash: int) -> Optional[int]:
+        if phash in self._data:
+            return phash
+        for index, chunk in zip(self._index, self._chunks(phash)):
+            for candidate in index.get(chunk, ()):
+                if bin(candidate ^ phash).count("1") <= self.max_distance:
+                    return candidate
+        return None
+
+    def observe_hash_time(self, seconds: float):
+        self.hash_time += seconds
+        self.hashes += 1
+
+    def get(self, phash: int) -> Optional[Any]:
+        found = self._find(phash)
+        if found is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(found)
+        return self._data[found]
+
+    def set(self, phash: int, value: Any):
+        if phash not in self._data:
+            for index, chunk in zip(self._index, self._chunks(phash)):
+                index.setdefault(chunk, set()).add(phash)
+        self._data[phash] = value
+        self._data.move_to_end(phash)
+        while len(self._data) > self.max_size:
+            self._evict()
+
+    def _evict(self):
+        phash, _ = self._data.popitem(last=False)
+        for index, chunk in zip(self._index, self._chunks(phash)):
+            bucket = index[chunk]
+            bucket.discard(phash)
+            if not bucket:
+                del index[chunk]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "memory_hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "hash_time_ms": (1000 * self.hash_time / self.hashes
+                             if self.hashes else 0.0)
+        }
+
+
+class ResultCache:
+    """Кэш результатов модели: LRU в процессе и опционально Redis.
+
+    Ошибки Redis не прерывают запрос: запись считается промахом.
+
+    Args:
+        namespace: str - префикс ключей.
+        model_version: str - версия модели, входит в ключ.
+        max_size: int - размер LRU в памяти.
+        ttl_s: float - время жизни записей в обоих уровнях, с.
+        redis_url: str - адрес Redis, пустая строка отключает второй уровень.
+    """
+
+    def __init__(self, namespace: str, model_version: str, max_size: int,
+                 ttl_s: float, redis_url: str = ""):
+        self.namespace = namespace
+        self.model_version = model_version
+        self.ttl_s = ttl_s
+        self.memory = LRUCache(max_size, ttl_s)
+        self.redis = redis.Redis.from_url(redis_url) if redis_url else None
+
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def key(self, payload: str) -> str:
+        return content_key(self.namespace, self.model_version, payload)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(key)
+            except redis.RedisError as e:
+                logger.warning(f"{self.namespace} cache: redis get failed: {e}")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self.memory.set(key, value)
+                self.redis_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, json.dumps(value),
+                                     ex=int(self.ttl_s))
+            except redis.RedisError as e:
+                logger.warning(f"{self.namespace} cache: redis set failed: {e}")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "size": len(self.memory)
+        }
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
@@ -0,0 +1,78 @@
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    # Logging
+    log_level: str = "INFO"
+    log_format: str = "%(levelname)s: %(asctime)s %(message)s"
+    date_format: str = "%H:%M:%S %d.%m.%Y"
+
+    # Inference backend: triton или torchscript (модели в процессе на CPU)
+    inference_backend: str = "triton"
+
+    # Triton
+    triton_protocol: str = "grpc"   # grpc или http
+    triton_http_url: str = "triton-server:8000"
+    triton_grpc_url: str = "triton-server:8001"
+    triton_timeout_s: float = 10.0
+    triton_pool_size: int = 4
+    # Triton по умолчанию отвечает GOAWAY too_many_pings на пинги чаще
+    # раза в 5 минут, поэтому период не меньше 300 с
+    triton_keepalive_ms: int = 300000
+    # Системная разделяемая память для nsfw_detector, только если
+    # оркестратор и Triton на одном хосте с общим /dev/shm
+    triton_shared_memory: bool = False
+    nsfw_shm_slots: int = 4
+
+    # TorchScript backend
+    torchscript_model_repository: str = "/models"
+    torchscript_workers: int = 2
+    torchscript_intra_op_threads: int = 0   # 0 - ядра поровну между потоками
+    torchscript_inter_op_threads: int = 1
+    torchscript_max_queue_size: int = 64
+
+    # Health
+    health_poll_interval_s: float = 5.0
+    health_max_wait_s: float = 60.0
+
+    # Warmup
+    warmup_batch_sizes: list[int] = [1, 8]
+    warmup_iterations: int = 2
+
+    # Micro-batching
+    toxicity_max_batch_size: int = 32
+    toxicity_max_wait_ms: float = 5.0
+    toxicity_max_queue_size: int = 1024
+
+    nsfw_max_batch_size: int = 8
+    nsfw_max_wait_ms: float = 10.0
+    nsfw_max_queue_size: int = 256
+
+    # Adaptive concurrency limits per model
+    limiter_initial_limit: int = 16
+    # Для моделей с микро-батчированием не меньше max_batch_size
+    limiter_min_limit: int = 8
+    limiter_max_limit: int = 512
+    limiter_max_queue_size: int = 256
+    limiter_queue_timeout_s: float = 1.0
+    # Во сколько раз задержка может превышать долгосрочную среднюю,
+    # прежде чем лимит начнёт уменьшаться
+    limiter_latency_tolerance: float = 1.5
+    limiter_long_window: int = 600
+
+    # Image preprocessing
+    image_workers: int = 2
+
+    # Result caches
+    redis_url: str = ""     # пусто - только кэш в памяти процесса
+    toxicity_model_version: str = "1"
+    ranking_model_version: str = "1"
+    toxicity_cache_size: int = 10000
+    toxicity_cache_ttl_s: float = 24 * 3600
+    nsfw_cache_size: int = 50000
+    nsfw_cache_max_distance: int = 3
+    # Строки признаков ранжирования, около 140 байт на пользователя
+    ranking_row_cache_size: int = 100000
+
+
+settings = Settings()
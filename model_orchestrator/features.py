@@ -0,0 +1,234 @@
+"""
+Построение входных тензоров модели ранжирования пользователей
+"""
+import itertools
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import numpy as np
+
+VEC_DIM = 50
+SCALED_FEATURES = ("age", "year_created_at", "budget", "rating")
+
+# Форма строки и тип каждого признака в выходе user_rows; multi-hot
+# векторы в кэше строк хранятся в int8, чтобы не занимать в 8 раз больше
+ROW_LAYOUT = {
+    "numerical": ((len(SCALED_FEATURES),), np.float32, np.float32),
+    "gender": ((), np.float32, np.float32),
+    "categorical": ((2,), np.int64, np.int64),
+    "habits": ((VEC_DIM,), np.int64, np.int8),
+    "interests": ((VEC_DIM,), np.int64, np.int8)
+}
+
+
+def _min_max_scale(value, min_, max_):
+    return (value - min_) / (max_ - min_)
+
+
+def multi_hot(ids_batch: list[list[int]]) -> np.ndarray:
+    """Кодирует списки id в матрицу multi-hot векторов (N, VEC_DIM)."""
+    vec = np.zeros((len(ids_batch), VEC_DIM), dtype=np.int64)
+    lengths = [len(ids) for ids in ids_batch]
+    total = sum(lengths)
+    if total:
+        rows = np.repeat(np.arange(len(ids_batch)), lengths)
+        cols = np.fromiter(
+            itertools.chain.from_iterable(ids_batch),
+            dtype=np.int64,
+            count=total
+        ) - 1
+        vec[rows, cols] = 1
+    return vec
+
+
+def decoder2vector(ids: list[int]) -> np.ndarray:
+    return multi_hot([ids])
+
+
+def user_rows(users: list[dict],
+              min_max_values: dict[str, float]) -> dict[str, np.ndarray]:
+    """Признаки пользователей построчно, независимо от пары.
+
+    Args:
+        users: list[dict] - словари с полями ei_id, age, education_direction,
+        year_created_at, budget, rating, gender, habit_ids, interest_ids.
+        min_max_values: dict[str, float] - границы min-max нормализации.
+    """
+    mins = np.array([min_max_values[f"{feature}_min"]
+                     for feature in SCALED_FEATURES], dtype=np.float64)
+    maxs = np.array([min_max_values[f"{feature}_max"]
+                     for feature in SCALED_FEATURES], dtype=np.float64)
+    numerical = np.array(
+        [[user[feature] for feature in SCALED_FEATURES] for user in users],
+        dtype=np.float64
+    ).reshape(len(users), len(SCALED_FEATURES))
+
+    return {
+        "numerical": _min_max_scale(numerical, mins, maxs).astype(np.float32),
+        "gender": np.array([user["gender"] for user in users],
+                           dtype=np.float32),
+        "categorical": np.array(
+            [[user["ei_id"], user["education_direction"]] for user in users],
+            dtype=np.int64
+        ).reshape(len(users), 2),
+        "habits": multi_hot([user["habit_ids"] for user in users]),
+        "interests": multi_hot([user["interest_ids"] for user in users])
+    }
+
+
+class UserRowCache:
+    """Кэш строк признаков пользователей для ранжирования.
+
+    Строки лежат в заранее выделенных массивах на max_size
+    пользователей, так что занимаемая память ограничена и известна
+    заранее, а строки всей ленты собираются одной выборкой по индексам.
+    Ключ - user_id, запись действительна, пока не изменилась версия
+    профиля (updated_at). Пользователи без user_id или updated_at не
+    кэшируются. При переполнении вытесняется давно не использованная
+    строка.
+
+    Args:
+        max_size: int - максимальное число пользователей в кэше.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._store = {
+            key: np.zeros((max_size, *shape), dtype=stored)
+            for key, (shape, _, stored) in ROW_LAYOUT.items()
+        }
+        # user_id -> (версия, индекс строки), порядок - давность использования
+        self._index: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._free = list(range(max_size - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _lookup(self, user: dict) -> Optional[int]:
+        entry = self._index.get(user.get("user_id"))
+        if entry is None or entry[0] != user.get("updated_at"):
+            return None
+        self._index.move_to_end(user["user_id"])
+        return entry[1]
+
+    def _slot(self, user_id: Hashable) -> int:
+        entry = self._index.pop(user_id, None)
+        if entry is not None:
+            return entry[1]
+        if not self._free:
+            _, (_, slot) = self._index.popitem(last=False)
+            return slot
+        return self._free.pop()
+
+    def _gather(self, slots: np.ndarray) -> dict[str, np.ndarray]:
+        return {
+            key: self._store[key].take(slots, axis=0).astype(dtype)
+            for key, (_, dtype, _) in ROW_LAYOUT.items()
+        }
+
+    def rows(self, users: list[dict],
+             min_max_values: dict[str, float]) -> dict[str, np.ndarray]:
+        """То же, что user_rows, но признаки закэшированных пользователей
+        не пересчитываются."""
+        slots = [self._lookup(user) for user in users]
+        cached = [i for i, slot in enumerate(slots) if slot is not None]
+        missing = [i for i, slot in enumerate(slots) if slot is None]
+        self.hits += len(cached)
+        self.misses += len(missing)
+
+        if not missing:
+            # Частый случай для ленты: все строки уже в кэше
+            return self._gather(np.array(slots, dtype=np.intp))
+
+        rows = {
+            key: np.empty((len(users), *shape), dtype=dtype)
+            for key, (shape, dtype, _) in ROW_LAYOUT.items()
+        }
+        if cached:
+            gathered = self._gather(
+                np.array([slots[i] for i in cached], dtype=np.intp)
+            )
+            positions = np.array(cached, dtype=np.intp)
+            for key, array in rows.items():
+                array[positions] = gathered[key]
+
+        computed = user_rows([users[i] for i in missing], min_max_values)
+        positions = np.array(missing, dtype=np.intp)
+        for key, array in rows.items():
+            array[positions] = computed[key]
+
+        # Строки кэша уже скопированы, вытеснение их не затронет
+        for j, i in enumerate(missing):
+            user = users[i]
+            if user.get("user_id") is None or user.get("updated_at") is None \
+                    or self.max_size == 0:
+                continue
+            slot = self._slot(user["user_id"])
+            for key, store in self._store.items():
+                store[slot] = computed[key][j]
+            self._index[user["user_id"]] = (user["updated_at"], slot)
+        return rows
+
+    def invalidate(self, user_id: Hashable) -> bool:
+        entry = self._index.pop(user_id, None)
+        if entry is None:
+            return False
+        self._free.append(entry[1])
+        return True
+
+    def clear(self):
+        self._index.clear()
+        self._free = list(range(self.max_size - 1, -1, -1))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "memory_hits": self.hits,
+            "misses": self.misses,
+            "size": len(self)
+        }
+
+
+def pair_inputs(main: dict[str, np.ndarray],
+                candidates: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Собирает входы user_ranking из строк основного пользователя (1 строка)
+    и строк кандидатов (N строк)."""
+    n = len(candidates["gender"])
+
+    def repeat(key: str) -> np.ndarray:
+        return np.repeat(main[key], n, axis=0)
+
+    numerical = np.concatenate([
+        repeat("numerical"),
+        candidates["numerical"],
+        repeat("gender")[:, None],
+        candidates["gender"][:, None]
+    ], axis=1).astype(np.float32)
+
+    categorical = np.concatenate(
+        [repeat("categorical"), candidates["categorical"]], axis=1
+    ).astype(np.int64)
+
+    habits = np.stack([repeat("habits"), candidates["habits"]], axis=1)
+    interests = np.stack([repeat("interests"), candidates["interests"]],
+                         axis=1)
+
+    return {
+        "num_input": numerical,
+        "cat_input": categorical,
+        "habits_input": habits,
+        "interest_input": interests
+    }
+
+
+def ranking_inputs(main: dict, candidates: list[dict],
+                   min_max_values: dict[str, float],
+                   row_cache: Optional[UserRowCache] = None
+                   ) -> dict[str, np.ndarray]:
+    """Входные тензоры user_ranking для пар (main, candidate_i)."""
+    rows = row_cache.rows if row_cache is not None else user_rows
+    return pair_inputs(
+        rows([main], min_max_values),
+        rows(candidates, min_max_values)
+    )
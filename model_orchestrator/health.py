@@ -0,0 +1,129 @@
+"""
+Фоновый опрос готовности моделей Triton
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAMES = {
+    "toxicity": "toxicity_classifier",
+    "ranking": "user_ranking",
+    "nsfw": "nsfw_detector"
+}
+
+
+class HealthMonitor:
+    """Кэшированная карта готовности моделей.
+
+    Фоновая задача раз в interval_s опрашивает Triton, эндпоинты отдают
+    состояние из памяти. Модель считается готовой, когда Triton сообщает
+    о готовности и оркестратор завершил её прогрев. ETag - хэш карты
+    готовности, по нему клиенты могут не перезапрашивать неизменившееся
+    состояние или ждать изменения.
+
+    Args:
+        models: dict[str, str] - псевдоним модели -> имя модели в Triton.
+        interval_s: float - период опроса, с.
+    """
+
+    def __init__(self, models: dict[str, str], interval_s: float):
+        self.models = models
+        self.interval_s = interval_s
+        self.readiness: dict[str, bool] = {alias: False for alias in models}
+        self.triton_readiness: dict[str, bool] = dict(self.readiness)
+        self.warm: set[str] = set()
+        self.updated_at = 0.0
+        self.etag = self._etag()
+
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _etag(self) -> str:
+        state = json.dumps(self.readiness, sort_keys=True).encode()
+        return f'"{hashlib.sha1(state).hexdigest()[:16]}"'
+
+    @property
+    def ready(self) -> bool:
+        return all(self.readiness.values())
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "models": dict(self.readiness),
+            "updated_at": self.updated_at
+        }
+
+    async def _is_ready(self, transport, model_name: str) -> bool:
+        try:
+            return bool(await transport.is_model_ready(model_name))
+        except Exception as e:
+            logger.warning(f"Readiness check of {model_name} failed: {e}")
+            return False
+
+    async def refresh(self, transport):
+        states = await asyncio.gather(*(
+            self._is_ready(transport, model_name)
+            for model_name in self.models.values()
+        ))
+        self.triton_readiness = dict(zip(self.models, states))
+        self.updated_at = time.time()
+        self._update()
+
+    def mark_warm(self, alias: str):
+        self.warm.add(alias)
+        self._update()
+
+    def _update(self):
+        readiness = {alias: ready and alias in self.warm
+                     for alias, ready in self.triton_readiness.items()}
+        if readiness != self.readiness:
+            logger.info(f"Model readiness changed: {readiness}")
+            self.readiness = readiness
+            self.etag = self._etag()
+            if self._changed is not None:
+                self._changed.set()
+                self._changed = None
+
+    async def wait_for_change(self, etag: str, timeout: float):
+        """Ждёт, пока ETag перестанет совпадать с переданным, не дольше
+        timeout секунд."""
+        if etag != self.etag:
+            return
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def unchanged(self, etag: Optional[str], wait: float) -> bool:
+        """Совпадает ли ETag клиента с текущим. При wait > 0 сначала ждёт
+        изменения состояния до wait секунд (long polling).
+
+        Args:
+            etag: Optional[str] - ETag из If-None-Match клиента.
+            wait: float - сколько ждать изменения, с.
+        """
+        if etag == self.etag and wait > 0:
+            await self.wait_for_change(etag, wait)
+        return etag == self.etag
+
+    async def _poll(self, transport):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            await self.refresh(transport)
+
+    async def start(self, transport):
+        await self.refresh(transport)
+        self._task = asyncio.create_task(self._poll(transport))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,175 @@
+"""
+Адаптивное ограничение числа одновременных запросов к моделям
+"""
+import asyncio
+import math
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+
+class Overloaded(asyncio.QueueFull):
+    """Запрос отклонён ограничителем: очередь полна или ожидание в ней
+    превысило таймаут.
+
+    Args:
+        model: str - модель, к которой не удалось получить доступ.
+        retry_after: int - через сколько секунд имеет смысл повторить.
+    """
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"{model} is overloaded")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """Ограничитель конкурентности по градиенту задержки.
+
+    Каждый завершённый запрос сравнивает свою задержку с долгосрочной
+    средней: пока она не выше tolerance средних, лимит растёт примерно
+    на корень из лимита, а при росте задержки или ошибке уменьшается
+    пропорционально, но не больше чем вдвое за раз. Постоянная
+    задержка, например от загруженного event loop, со временем входит
+    в среднюю и лимит не душит; резкое замедление модели - нет.
+    Запросы сверх лимита ждут в очереди не больше queue_timeout_s,
+    при полной очереди сразу отклоняются с Overloaded, так что при
+    замедлении модели запросы не копятся.
+
+    Args:
+        name: str - имя модели для ошибок.
+        initial_limit: int - начальный лимит одновременных запросов.
+        min_limit: int - нижняя граница лимита.
+        max_limit: int - верхняя граница лимита.
+        max_queue_size: int - максимальное число ожидающих запросов.
+        queue_timeout_s: float - максимальное ожидание в очереди, с.
+        tolerance: float - во сколько раз задержка может превышать
+        долгосрочную среднюю без уменьшения лимита.
+        smoothing: float - доля нового значения при обновлении лимита.
+        long_window: int - число запросов в долгосрочной средней.
+        queue_wait: Optional[Any] - гистограмма с методом observe, куда
+        пишется время ожидания в очереди, с.
+    """
+
+    def __init__(self, name: str, initial_limit: int, min_limit: int,
+                 max_limit: int, max_queue_size: int, queue_timeout_s: float,
+                 tolerance: float = 1.5, smoothing: float = 0.2,
+                 long_window: int = 600, queue_wait: Optional[Any] = None):
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout_s
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.long_window = long_window
+        self.queue_wait = queue_wait
+
+        self.in_flight = 0
+        self.samples = 0
+        self.latency: Optional[float] = None
+        self._waiters: deque[asyncio.Future] = deque()
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+
+    def retry_after(self) -> int:
+        """Оценка времени, за которое разойдётся текущая очередь, с."""
+        if self.latency is None:
+            return 1
+        drain = self.latency * (len(self._waiters) + 1) / self.limit
+        return max(1, math.ceil(drain))
+
+    def admit(self):
+        """Отклоняет запрос сразу, если очередь уже полна, до того как
+        на него потрачено время разбора и предобработки."""
+        if len(self._waiters) >= self.max_queue_size:
+            self.rejected["queue_full"] += 1
+            raise Overloaded(self.name, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        await self._acquire(loop)
+        start_time = loop.time()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # Клиент ушёл: задержка ничего не говорит о нагрузке
+            self._release(None, False)
+            raise
+        except Exception:
+            self._release(loop.time() - start_time, True)
+            raise
+        self._release(loop.time() - start_time, False)
+
+    async def _acquire(self, loop: asyncio.AbstractEventLoop):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            if self.queue_wait is not None:
+                self.queue_wait.observe(0.0)
+            return
+        self.admit()
+
+        # Освобождающий запрос сам занимает слот за ожидающего
+        future = loop.create_future()
+        self._waiters.append(future)
+        enqueued_at = loop.time()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Слот уже передан, но ожидающий ушёл - возвращаем слот
+                self._release(None, False)
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected["queue_timeout"] += 1
+                raise Overloaded(self.name, self.retry_after()) from None
+            raise
+        finally:
+            if self.queue_wait is not None:
+                self.queue_wait.observe(loop.time() - enqueued_at)
+
+    def _release(self, latency: Optional[float], dropped: bool):
+        if latency is not None:
+            self._update(latency, dropped)
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def _update(self, latency: float, dropped: bool):
+        # Первые запросы - простое среднее, дальше экспоненциальное
+        self.samples += 1
+        weight = 1 / min(self.samples, self.long_window)
+        if self.latency is None:
+            self.latency = latency
+        self.latency += weight * (latency - self.latency)
+        if self.latency > 2 * latency:
+            # После всплеска средняя возвращается быстрее, чем набиралась
+            self.latency -= 0.05 * self.latency
+
+        if dropped:
+            gradient = 0.5
+        elif self.in_flight < self.limit / 2:
+            # Лимит не используется, задержка о нём ничего не говорит
+            return
+        else:
+            gradient = max(0.5, min(1.0,
+                                    self.tolerance * self.latency / latency))
+        # Корень из лимита - запас на очередь, при градиенте 1 лимит растёт
+        limit = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit + self.smoothing * (limit - self.limit)
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "latency_s": self.latency or 0.0,
+            **{f"rejected_{reason}": count
+               for reason, count in self.rejected.items()}
+        }
@@ -0,0 +1,245 @@
+"""
+Метрики оркестратора в текстовом формате Prometheus
+"""
+import abc
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(str(value))}"'
+                     for name, value in zip(names, values))
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    """Общая часть метрик: имя, описание и дочерние серии по значениям
+    меток. Серии создаются при первом обращении к labels и дальше
+    переиспользуются, так что на горячем пути метка не ищется заново,
+    если ссылка на серию сохранена.
+
+    Все метрики изменяются только из потока event loop, поэтому
+    блокировки не нужны.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, description: str,
+                 labelnames: Labels = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._series: dict[Labels, object] = {}
+
+    @abc.abstractmethod
+    def _new_series(self):
+        """Новая серия для ещё не встречавшихся значений меток."""
+
+    def labels(self, *values: str):
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels "
+                                 f"{self.labelnames}, got {values}")
+            series = self._series[values] = self._new_series()
+        return series
+
+    @abc.abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """Строки значений всех серий без завершающего перевода строки."""
+
+    def render(self) -> str:
+        header = (f"# HELP {self.name} {self.description}\n"
+                  f"# TYPE {self.name} {self.type_name}\n")
+        return header + "".join(f"{line}\n" for line in self._samples())
+
+
+class _CounterSeries:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+    _new_series = _CounterSeries
+
+    def _samples(self) -> Iterable[str]:
+        for values, series in self._series.items():
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_total{labels} {_format_value(series.value)}"
+
+
+class _GaugeSeries(_CounterSeries):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+    _new_series = _GaugeSeries
+
+    def _samples(self) -> Iterable[str]:
+        for values, series in self._series.items():
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(series.value)}"
+
+
+class CallbackMetric(_Metric):
+    """Метрика, значения которой считаются только при выдаче метрик,
+    например из уже существующих счётчиков кэшей.
+
+    Args:
+        callback: Callable[[], dict[Labels, float]] - значения меток ->
+        значение метрики.
+        type_name: str - тип метрики, counter или gauge; имя счётчика
+        должно оканчиваться на _total.
+    """
+
+    def __init__(self, name: str, description: str, labelnames: Labels,
+                 callback: Callable[[], dict[Labels, float]],
+                 type_name: str = "gauge"):
+        super().__init__(name, description, labelnames)
+        self.callback = callback
+        self.type_name = type_name
+
+    def _new_series(self):
+        raise TypeError(f"{self.name} values come from its callback")
+
+    def _samples(self) -> Iterable[str]:
+        for values, value in self.callback().items():
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class _Timer:
+    __slots__ = ("series", "start")
+
+    def __init__(self, series: "_HistogramSeries"):
+        self.series = series
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.series.observe(time.perf_counter() - self.start)
+
+
+class _HistogramSeries:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        # Последний счётчик - значения больше верхней границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Labels = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self) -> _HistogramSeries:
+        return _HistogramSeries(self.buckets)
+
+    def _samples(self) -> Iterable[str]:
+        labelnames = (*self.labelnames, "le")
+        for values, series in self._series.items():
+            # В формате Prometheus бакеты кумулятивные
+            total = 0
+            for bound, count in zip((*self.buckets, float("inf")),
+                                    series.counts):
+                total += count
+                labels = _format_labels(labelnames,
+                                        (*values, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {total}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(series.sum)}"
+            yield f"{self.name}_count{labels} {total}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics)
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "orchestrator_stage_seconds",
+    "Time spent in a request processing stage",
+    ("model", "stage")
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "orchestrator_batch_size",
+    "Number of items in a batch sent to the model",
+    ("model",),
+    buckets=BATCH_SIZE_BUCKETS
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "orchestrator_requests_in_flight",
+    "Requests currently being processed",
+    ("path",)
+))
+REQUESTS = REGISTRY.register(Counter(
+    "orchestrator_requests",
+    "Finished requests by status code",
+    ("path", "status")
+))
+ERRORS = REGISTRY.register(Counter(
+    "orchestrator_errors",
+    "Failed model calls",
+    ("model",)
+))
+DEDUPLICATED = REGISTRY.register(Counter(
+    "orchestrator_deduplicated_requests",
+    "Requests served by an identical request already in flight",
+    ("model",)
+))
@@ -0,0 +1,102 @@
+"""
+Предобработка изображений для nsfw_detector без ViTImageProcessor.
+
+Функции модуля выполняются в пуле процессов, поэтому не зависят от
+состояния app.py и принимают все параметры явно.
+"""
+import base64
+import io
+import json
+import time
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+
+class ImageConfig(NamedTuple):
+    """Параметры предобработки из preprocessor_config.json.
+    Fields:
+        - size: tuple[int, int] - (ширина, высота) входа модели.
+        - resample: int - фильтр PIL для ресайза.
+        - rescale_factor: float - множитель перевода пикселей в [0, 1].
+        - mean: tuple[float, float, float] - среднее для нормализации.
+        - std: tuple[float, float, float] - стандартное отклонение.
+    """
+    size: tuple[int, int]
+    resample: int
+    rescale_factor: float
+    mean: tuple[float, float, float]
+    std: tuple[float, float, float]
+
+    @classmethod
+    def from_pretrained(cls, path: str) -> "ImageConfig":
+        with open(path, "r", encoding="UTF-8") as file:
+            config = json.load(file)
+        return cls(
+            size=(config["size"]["width"], config["size"]["height"]),
+            resample=config["resample"],
+            rescale_factor=config["rescale_factor"],
+            mean=tuple(config["image_mean"]),
+            std=tuple(config["image_std"])
+        )
+
+
+class PreprocessedImage(NamedTuple):
+    """Результат предобработки изображения.
+    Fields:
+        - pixels: np.ndarray - тензор (3, H, W) для nsfw_detector.
+        - phash: int - 64-битный разностный перцептивный хэш (dHash).
+        - hash_time: float - время вычисления хэша, с.
+    """
+    pixels: np.ndarray
+    phash: int
+    hash_time: float
+
+
+def load_image(data: bytes, size: tuple[int, int]) -> Image.Image:
+    """Декодирует изображение, по возможности в уменьшенном разрешении.
+
+    Для JPEG Image.draft масштабирует DCT при декодировании (1/2, 1/4, 1/8),
+    оставляя обе стороны не меньше size, так что 12 МП фото не
+    раскодируется целиком ради ресайза до 224x224.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", size)
+    return image.convert("RGB")
+
+
+def preprocess_image(image: Image.Image, config: ImageConfig) -> np.ndarray:
+    """Повторяет ViTImageProcessor: resize, rescale, normalize, CHW."""
+    pixels = np.asarray(
+        image.resize(config.size, resample=config.resample),
+        dtype=np.float32
+    )
+    mean = np.asarray(config.mean, dtype=np.float32)
+    std = np.asarray(config.std, dtype=np.float32)
+    pixels = (pixels * np.float32(config.rescale_factor) - mean) / std
+    return np.ascontiguousarray(pixels.transpose(2, 0, 1))
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Разностный хэш: знаки горизонтальных градиентов уменьшенной
+    серой копии изображения."""
+    pixels = np.asarray(
+        image.convert("L").resize((hash_size + 1, hash_size),
+                                  resample=Image.BILINEAR),
+        dtype=np.int16
+    )
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def preprocess_bytes(data: bytes, config: ImageConfig) -> PreprocessedImage:
+    image = load_image(data, config.size)
+    start_time = time.perf_counter()
+    phash = dhash(image)
+    hash_time = time.perf_counter() - start_time
+    return PreprocessedImage(preprocess_image(image, config), phash, hash_time)
+
+
+def preprocess_base64(image: str, config: ImageConfig) -> PreprocessedImage:
+    return preprocess_bytes(base64.b64decode(image), config)
@@ -1,3 +1,5 @@
+from typing import Annotated, Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -9,6 +11,19 @@ class ModelReadiness(BaseModel):
     ready: bool
 
 
+class HealthResponse(BaseModel):
+    """Сводная готовность моделей.
+    Fields:
+        - ready: bool - Готовы ли все модели.
+        - models: dict[str, bool] - Готовность каждой модели по псевдониму
+        (toxicity, ranking, nsfw).
+        - updated_at: float - Время последнего опроса Triton, unix time.
+    """
+    ready: bool
+    models: dict[str, bool]
+    updated_at: float
+
+
 class TextRequest(BaseModel):
     """Запрос к модели классификации токсичности текста.
     Fields:
@@ -34,6 +49,26 @@ class ToxicityResponse(BaseModel):
     dangerous: float = Field(ge=0, le=1)
 
 
+class TextBatchRequest(BaseModel):
+    """Запрос к модели классификации токсичности для пакета текстов.
+    Fields:
+        - texts: list[str] - Тексты для классификации, не больше 256,
+        максимальная длина каждого 1000.
+    """
+    texts: list[Annotated[str, Field(max_length=1000)]] = Field(
+        example=["Пример текста"], max_length=256
+    )
+
+
+class ToxicityBatchResponse(BaseModel):
+    """Ответ модели классификации токсичности для пакета текстов.
+    Fields:
+        - results: list[ToxicityResponse] - Вероятности для каждого текста
+        в порядке запроса.
+    """
+    results: list[ToxicityResponse]
+
+
 class RankingPairRequest(BaseModel):
     """Запрос к моделе ранжирования пар пользователей.
     Fields:
@@ -51,6 +86,10 @@ class RankingPairRequest(BaseModel):
         осуществляющего поиск.
         - interest_ids_main: list[int] - список id интересов пользователя,
         осуществляющего поиск.
+        - user_id_main: Optional[int] - id пользователя, осуществляющего
+        поиск, вместе с updated_at_main включает кэш его признаков.
+        - updated_at_main: Optional[str] - версия профиля пользователя,
+        осуществляющего поиск, например его updated_at.
 
         - ei_id_candidate: int - университет кандидата.
         - age_candidate: int - возраст кандидата.
@@ -64,6 +103,8 @@ class RankingPairRequest(BaseModel):
         - habit_ids_candidate: list[int] - список id вредных привычек
         кандидата.
         - interest_ids_candidate: list[int] - список id интересов кандидата.
+        - user_id_candidate: Optional[int] - id кандидата.
+        - updated_at_candidate: Optional[str] - версия профиля кандидата.
     """
     ei_id_main: int
     age_main: int
@@ -74,6 +115,8 @@ class RankingPairRequest(BaseModel):
     gender_main: int = Field(ge=0, le=1)
     habit_ids_main: list[int]
     interest_ids_main: list[int]
+    user_id_main: Optional[int] = None
+    updated_at_main: Optional[str] = None
 
     ei_id_candidate: int
     age_candidate: int
@@ -84,6 +127,8 @@ class RankingPairRequest(BaseModel):
     gender_candidate: int = Field(ge=0, le=1)
     habit_ids_candidate: list[int]
     interest_ids_candidate: list[int]
+    user_id_candidate: Optional[int] = None
+    updated_at_candidate: Optional[str] = None
 
 
 class RankingResponse(BaseModel):
@@ -94,6 +139,55 @@ class RankingResponse(BaseModel):
     coincidence: float = Field(default=0.0, ge=0, le=1)
 
 
+class UserRankingFeatures(BaseModel):
+    """Признаки одного пользователя для модели ранжирования.
+    Fields:
+        - ei_id: int - университет пользователя.
+        - age: int - возраст пользователя.
+        - education_direction: int - направление образования пользователя.
+        - year_created_at: int - год создания аккаунта пользователя.
+        - budget: int - бюджет пользователя.
+        - rating: float - рейтинг пользователя.
+        - gender: int - пол пользователя, 0 - девушка, 1 - мужчина.
+        - habit_ids: list[int] - список id вредных привычек пользователя.
+        - interest_ids: list[int] - список id интересов пользователя.
+        - user_id: Optional[int] - id пользователя, вместе с updated_at
+        включает кэш его признаков.
+        - updated_at: Optional[str] - версия профиля пользователя,
+        например его updated_at; при изменении признаки пересчитываются.
+    """
+    ei_id: int
+    age: int
+    education_direction: int
+    year_created_at: int
+    budget: int
+    rating: float
+    gender: int = Field(ge=0, le=1)
+    habit_ids: list[int]
+    interest_ids: list[int]
+    user_id: Optional[int] = None
+    updated_at: Optional[str] = None
+
+
+class RankingBatchRequest(BaseModel):
+    """Запрос к модели ранжирования одного пользователя против многих.
+    Fields:
+        - main: UserRankingFeatures - пользователь, осуществляющий поиск.
+        - candidates: list[UserRankingFeatures] - кандидаты для оценки.
+    """
+    main: UserRankingFeatures
+    candidates: list[UserRankingFeatures]
+
+
+class RankingBatchResponse(BaseModel):
+    """Ответ модели ранжирования для пакета кандидатов.
+    Fields:
+        - coincidences: list[float] - Вероятности совпадения с каждым
+        кандидатом в порядке запроса, от 0 до 1.
+    """
+    coincidences: list[float]
+
+
 class NSFWRequest(BaseModel):
     """Запрос к модели определения NSFW контента на изображение.
 
@@ -112,3 +206,21 @@ class NSFWResponse(BaseModel):
     """
     normal: float = Field(ge=0, le=1)
     nsfw: float = Field(ge=0, le=1)
+
+
+class CacheStats(BaseModel):
+    """Счётчики кэша результатов модели.
+
+    Fields:
+        memory_hits: int - попадания в кэш в памяти процесса.
+        redis_hits: int - попадания в кэш Redis.
+        misses: int - промахи, потребовавшие инференса.
+        size: int - число записей в кэше в памяти процесса.
+        hash_time_ms: Optional[float] - среднее время вычисления
+        перцептивного хэша, мс (только для кэша изображений).
+    """
+    memory_hits: int
+    redis_hits: int = 0
+    misses: int
+    size: int
+    hash_time_ms: Optional[float] = None
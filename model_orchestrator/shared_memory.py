@@ -0,0 +1,176 @@
+"""
+Передача тензоров в Triton через системную разделяемую память
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import numpy as np
+import tritonclient.utils.shared_memory as shm
+from tritonclient.utils import np_to_triton_dtype, triton_to_np_dtype
+
+logger = logging.getLogger(__name__)
+
+
+class SharedMemoryRegion:
+    """Регион системной разделяемой памяти, зарегистрированный в Triton.
+
+    Args:
+        name: str - имя региона в Triton.
+        byte_size: int - размер региона в байтах.
+    """
+
+    def __init__(self, name: str, byte_size: int):
+        self.name = name
+        self.key = f"/{name}"
+        self.byte_size = byte_size
+        self.handle = shm.create_shared_memory_region(
+            name, self.key, byte_size
+        )
+
+    def destroy(self):
+        shm.destroy_shared_memory_region(self.handle)
+
+
+class SharedMemorySlot:
+    """Пара регионов (входы и выходы) для одного запроса к модели.
+
+    Args:
+        name: str - префикс имён регионов.
+        input_byte_size: int - размер региона входов.
+        outputs: dict[str, int] - имена выходов и их максимальный размер
+        в байтах, выходы лежат в одном регионе друг за другом.
+    """
+
+    def __init__(self, name: str, input_byte_size: int,
+                 outputs: dict[str, int]):
+        self.input = SharedMemoryRegion(f"{name}_input", input_byte_size)
+        self.output = SharedMemoryRegion(f"{name}_output",
+                                         sum(outputs.values()))
+        self.outputs = outputs
+
+    @property
+    def regions(self) -> tuple[SharedMemoryRegion, SharedMemoryRegion]:
+        return self.input, self.output
+
+    def fits(self, inputs: dict[str, np.ndarray]) -> bool:
+        return sum(array.nbytes for array in inputs.values()) \
+            <= self.input.byte_size
+
+    def prepare(self, module, inputs: dict[str, np.ndarray]
+                ) -> tuple[list, list]:
+        """Записывает входы в регион и описывает входы и выходы запроса
+        ссылками на разделяемую память вместо тел тензоров."""
+        arrays = [np.ascontiguousarray(array) for array in inputs.values()]
+        shm.set_shared_memory_region(self.input.handle, arrays)
+
+        infer_inputs, offset = [], 0
+        for name, array in zip(inputs, arrays):
+            infer_input = module.InferInput(
+                name, array.shape, np_to_triton_dtype(array.dtype)
+            )
+            infer_input.set_shared_memory(self.input.name, array.nbytes,
+                                          offset)
+            infer_inputs.append(infer_input)
+            offset += array.nbytes
+
+        requested_outputs, offset = [], 0
+        for name, byte_size in self.outputs.items():
+            requested_output = module.InferRequestedOutput(name)
+            requested_output.set_shared_memory(self.output.name, byte_size,
+                                               offset)
+            requested_outputs.append(requested_output)
+            offset += byte_size
+        return infer_inputs, requested_outputs
+
+    def read(self, response) -> "SharedMemoryResult":
+        """Копирует выходы из региона, чтобы слот можно было вернуть
+        в пул до обработки результата."""
+        outputs, offset = {}, 0
+        for name, byte_size in self.outputs.items():
+            output = response.get_output(name)
+            if isinstance(output, dict):
+                shape, datatype = output["shape"], output["datatype"]
+            else:
+                shape, datatype = list(output.shape), output.datatype
+            outputs[name] = shm.get_contents_as_numpy(
+                self.output.handle, triton_to_np_dtype(datatype), shape,
+                offset
+            ).copy()
+            offset += byte_size
+        return SharedMemoryResult(outputs)
+
+    def destroy(self):
+        for region in self.regions:
+            region.destroy()
+
+
+class SharedMemoryResult:
+    """Результат инференса с тем же интерфейсом as_numpy, что у InferResult."""
+
+    def __init__(self, outputs: dict[str, np.ndarray]):
+        self._outputs = outputs
+
+    def as_numpy(self, name: str) -> np.ndarray:
+        return self._outputs.get(name)
+
+
+class SharedMemoryPool:
+    """Пул переиспользуемых слотов разделяемой памяти для одной модели.
+
+    Слоты создаются под максимальный батч и регистрируются в Triton один
+    раз; запрос занимает свободный слот на время инференса.
+
+    Args:
+        model_name: str - имя модели, входит в имена регионов.
+        input_byte_size: int - размер региона входов максимального батча.
+        outputs: dict[str, int] - размеры выходов максимального батча.
+        size: int - число слотов.
+    """
+
+    def __init__(self, model_name: str, input_byte_size: int,
+                 outputs: dict[str, int], size: int):
+        prefix = f"{model_name}_{os.getpid()}"
+        self.slots = [
+            SharedMemorySlot(f"{prefix}_{i}", input_byte_size, outputs)
+            for i in range(size)
+        ]
+        self._free: asyncio.Queue = asyncio.Queue()
+        for slot in self.slots:
+            self._free.put_nowait(slot)
+
+    def fits(self, inputs: dict[str, np.ndarray]) -> bool:
+        return self.slots[0].fits(inputs)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[SharedMemorySlot]:
+        slot = await self._free.get()
+        try:
+            yield slot
+        finally:
+            self._free.put_nowait(slot)
+
+    async def register(self, transport):
+        for slot in self.slots:
+            for region in slot.regions:
+                await transport.register_system_shared_memory(
+                    region.name, region.key, region.byte_size
+                )
+
+    async def close(self, transport):
+        """Снимает регистрацию регионов в Triton и удаляет их. Регионы
+        удаляются, даже если Triton уже недоступен, иначе они остаются
+        в /dev/shm."""
+        for slot in self.slots:
+            for region in slot.regions:
+                try:
+                    await transport.unregister_system_shared_memory(
+                        region.name
+                    )
+                except Exception as e:
+                    logger.warning(
+                        f"Unregistering {region.name} failed: {e}"
+                    )
+            slot.destroy()
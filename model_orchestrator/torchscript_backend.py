@@ -0,0 +1,158 @@
+"""
+Инференс TorchScript моделей внутри процесса оркестратора на CPU
+"""
+import asyncio
+import logging
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def _tensor_names(config: str, section: str) -> list[str]:
+    """Имена тензоров секции input или output из config.pbtxt в порядке
+    объявления, в этом же порядке их принимает forward модели."""
+    block = re.search(rf"^{section}\s*\[(.*?)^\]", config, re.M | re.S)
+    if block is None:
+        raise ValueError(f"No {section} section in model config")
+    return re.findall(r'name:\s*"([^"]+)"', block.group(1))
+
+
+class TorchScriptModel:
+    """TorchScript модель из model repository Triton.
+
+    Берётся последняя версия model.pt, порядок входов и имена выходов -
+    из config.pbtxt модели.
+
+    Args:
+        model_dir: str - каталог модели в model repository.
+    """
+
+    def __init__(self, model_dir: str):
+        with open(os.path.join(model_dir, "config.pbtxt"), "r",
+                  encoding="UTF-8") as file:
+            config = file.read()
+        self.inputs = _tensor_names(config, "input")
+        self.outputs = _tensor_names(config, "output")
+
+        versions = [int(name) for name in os.listdir(model_dir)
+                    if name.isdigit()]
+        if not versions:
+            raise FileNotFoundError(f"No model versions in {model_dir}")
+        path = os.path.join(model_dir, str(max(versions)), "model.pt")
+
+        module = torch.jit.load(path, map_location="cpu").eval()
+        try:
+            self.module = torch.jit.optimize_for_inference(
+                torch.jit.freeze(module)
+            )
+        except Exception as e:
+            logger.warning(f"Freezing {path} failed, using as is: {e}")
+            self.module = module
+
+    def __call__(self, inputs: dict[str, np.ndarray]
+                 ) -> dict[str, np.ndarray]:
+        args = [torch.from_numpy(np.ascontiguousarray(inputs[name]))
+                for name in self.inputs]
+        with torch.inference_mode():
+            output = self.module(*args)
+        if isinstance(output, torch.Tensor):
+            output = (output,)
+        return {name: tensor.numpy()
+                for name, tensor in zip(self.outputs, output)}
+
+
+class LocalInferResult:
+    """Результат инференса с тем же интерфейсом as_numpy, что у InferResult."""
+
+    def __init__(self, outputs: dict[str, np.ndarray]):
+        self._outputs = outputs
+
+    def as_numpy(self, name: str) -> Optional[np.ndarray]:
+        return self._outputs.get(name)
+
+
+class TorchScriptTransport:
+    """Бэкенд с интерфейсом TritonTransport, выполняющий модели в процессе.
+
+    Модели загружаются в фоне и считаются готовыми после загрузки, так
+    что опрос готовности и прогрев работают так же, как с Triton.
+    Инференс идёт в пуле из workers потоков (torch отпускает GIL),
+    число ожидающих запросов ограничено max_queue_size, сверх него
+    запрос сразу отклоняется с asyncio.QueueFull.
+
+    Args:
+        model_repository: str - каталог model repository в формате Triton.
+        models: list[str] - имена загружаемых моделей.
+        workers: int - число потоков инференса.
+        intra_op_threads: int - потоки внутри одного оператора,
+        0 - ядра процессора поровну между потоками инференса.
+        inter_op_threads: int - потоки для параллельных операторов графа.
+        max_queue_size: int - максимальное число ожидающих запросов.
+    """
+
+    def __init__(self, model_repository: str, models: list[str],
+                 workers: int, intra_op_threads: int, inter_op_threads: int,
+                 max_queue_size: int):
+        # Потоков на оператор столько, чтобы параллельные запросы вместе
+        # не занимали больше ядер, чем есть: переподписка на CPU
+        # увеличивает задержку сильнее, чем даёт параллелизм
+        torch.set_num_threads(
+            intra_op_threads or max(1, (os.cpu_count() or 1) // workers)
+        )
+        # Можно задать только до первого параллельного вычисления
+        torch.set_num_interop_threads(inter_op_threads)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="torchscript"
+        )
+        self._slots = asyncio.BoundedSemaphore(workers + max_queue_size)
+        self.models: dict[str, Future] = {
+            name: self.executor.submit(
+                TorchScriptModel, os.path.join(model_repository, name)
+            )
+            for name in models
+        }
+
+    def _model(self, model_name: str) -> TorchScriptModel:
+        future = self.models.get(model_name)
+        if future is None:
+            raise ValueError(f"Unknown model: {model_name}")
+        if not future.done():
+            raise RuntimeError(f"Model {model_name} is not loaded yet")
+        return future.result()
+
+    async def infer(self, model_name: str, inputs: dict[str, np.ndarray],
+                    shared_memory: Any = None) -> LocalInferResult:
+        # Разделяемая память не нужна: тензоры уже в памяти процесса
+        model = self._model(model_name)
+        if self._slots.locked():
+            raise asyncio.QueueFull
+        async with self._slots:
+            outputs = await asyncio.get_running_loop().run_in_executor(
+                self.executor, model, inputs
+            )
+        return LocalInferResult(outputs)
+
+    async def is_model_ready(self, model_name: str) -> bool:
+        future = self.models.get(model_name)
+        if future is None or not future.done():
+            return False
+        if future.exception() is not None:
+            raise future.exception()
+        return True
+
+    async def register_system_shared_memory(self, name: str, key: str,
+                                            byte_size: int):
+        pass
+
+    async def unregister_system_shared_memory(self, name: str):
+        pass
+
+    async def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,176 @@
+"""
+Асинхронные транспорты запросов к Triton Inference Server
+"""
+import abc
+import asyncio
+import itertools
+from typing import Any, Optional, Protocol
+
+import numpy as np
+from shared_memory import SharedMemoryPool
+from tritonclient import grpc as tritongrpcclient
+from tritonclient import http as tritonhttpclient
+from tritonclient.grpc import aio as tritongrpcaioclient
+from tritonclient.http import aio as tritonhttpaioclient
+from tritonclient.utils import np_to_triton_dtype
+
+
+class TritonTransport(Protocol):
+    async def infer(self, model_name: str, inputs: dict[str, np.ndarray],
+                    shared_memory: Optional[SharedMemoryPool] = None
+                    ) -> Any: ...
+
+    async def is_model_ready(self, model_name: str) -> bool: ...
+
+    async def register_system_shared_memory(self, name: str, key: str,
+                                            byte_size: int) -> None: ...
+
+    async def unregister_system_shared_memory(self, name: str) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+def _infer_inputs(module, inputs: dict[str, np.ndarray]) -> list:
+    infer_inputs = []
+    for name, array in inputs.items():
+        infer_input = module.InferInput(
+            name, array.shape, np_to_triton_dtype(array.dtype)
+        )
+        infer_input.set_data_from_numpy(array)
+        infer_inputs.append(infer_input)
+    return infer_inputs
+
+
+class _BaseTransport(abc.ABC):
+    """Общая часть транспортов: сборка запроса из numpy массивов напрямую
+    или через слот разделяемой памяти."""
+    module = None
+
+    @abc.abstractmethod
+    async def _infer(self, model_name: str, inputs: list,
+                     outputs: Optional[list] = None):
+        """Отправляет собранный запрос в Triton и возвращает ответ клиента."""
+
+    async def infer(self, model_name: str, inputs: dict[str, np.ndarray],
+                    shared_memory: Optional[SharedMemoryPool] = None):
+        if shared_memory is None or not shared_memory.fits(inputs):
+            return await self._infer(
+                model_name, _infer_inputs(self.module, inputs)
+            )
+
+        async with shared_memory.acquire() as slot:
+            infer_inputs, outputs = slot.prepare(self.module, inputs)
+            response = await self._infer(model_name, infer_inputs, outputs)
+            return slot.read(response)
+
+
+class HTTPTransport(_BaseTransport):
+    """HTTP/REST транспорт на aiohttp с пулом keep-alive соединений.
+
+    Args:
+        url: str - адрес HTTP эндпоинта Triton.
+        timeout: float - таймаут одного запроса, с.
+        pool_size: int - максимальное число соединений в пуле.
+    """
+
+    module = tritonhttpclient
+
+    def __init__(self, url: str, timeout: float, pool_size: int):
+        self.timeout = timeout
+        self.client = tritonhttpaioclient.InferenceServerClient(
+            url=url,
+            conn_limit=pool_size,
+            conn_timeout=timeout
+        )
+
+    async def _infer(self, model_name: str, inputs: list,
+                     outputs: Optional[list] = None):
+        return await asyncio.wait_for(
+            self.client.infer(model_name, inputs, outputs=outputs),
+            self.timeout
+        )
+
+    async def is_model_ready(self, model_name: str) -> bool:
+        return await asyncio.wait_for(
+            self.client.is_model_ready(model_name), self.timeout
+        )
+
+    async def register_system_shared_memory(self, name: str, key: str,
+                                            byte_size: int):
+        await self.client.register_system_shared_memory(name, key, byte_size)
+
+    async def unregister_system_shared_memory(self, name: str):
+        await self.client.unregister_system_shared_memory(name)
+
+    async def close(self):
+        await self.client.close()
+
+
+class GRPCTransport(_BaseTransport):
+    """gRPC транспорт на grpc.aio с пулом keep-alive каналов.
+
+    Запросы распределяются по каналам по кругу, чтобы не упираться
+    в лимит одновременных стримов одного HTTP/2 соединения.
+
+    Args:
+        url: str - адрес gRPC эндпоинта Triton.
+        timeout: float - таймаут одного запроса, с.
+        pool_size: int - число каналов в пуле.
+        keepalive_ms: int - период keep-alive пингов, мс. Пинги идут
+        только при активных вызовах: Triton с настройками по умолчанию
+        разрывает соединения, пингуемые без вызовов.
+    """
+
+    module = tritongrpcclient
+
+    def __init__(self, url: str, timeout: float, pool_size: int,
+                 keepalive_ms: int):
+        self.timeout = timeout
+        keepalive_options = tritongrpcclient.KeepAliveOptions(
+            keepalive_time_ms=keepalive_ms,
+            keepalive_timeout_ms=int(timeout * 1000),
+            keepalive_permit_without_calls=False
+        )
+        self.clients = [
+            tritongrpcaioclient.InferenceServerClient(
+                url=url, keepalive_options=keepalive_options
+            )
+            for _ in range(pool_size)
+        ]
+        self._next_client = itertools.cycle(self.clients)
+
+    async def _infer(self, model_name: str, inputs: list,
+                     outputs: Optional[list] = None):
+        return await next(self._next_client).infer(
+            model_name, inputs, outputs=outputs, client_timeout=self.timeout
+        )
+
+    async def is_model_ready(self, model_name: str) -> bool:
+        return await next(self._next_client).is_model_ready(
+            model_name, client_timeout=self.timeout
+        )
+
+    async def register_system_shared_memory(self, name: str, key: str,
+                                            byte_size: int):
+        # Регистрация хранится на сервере и общая для всех каналов
+        await self.clients[0].register_system_shared_memory(
+            name, key, byte_size, client_timeout=self.timeout
+        )
+
+    async def unregister_system_shared_memory(self, name: str):
+        await self.clients[0].unregister_system_shared_memory(
+            name, client_timeout=self.timeout
+        )
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self.clients))
+
+
+def create_transport(protocol: str, http_url: str, grpc_url: str,
+                     timeout: float, pool_size: int,
+                     keepalive_ms: int) -> TritonTransport:
+    if protocol == "grpc":
+        return GRPCTransport(grpc_url, timeout, pool_size, keepalive_ms)
+    if protocol == "http":
+        return HTTPTransport(http_url, timeout, pool_size)
+    raise ValueError(f"Unknown Triton protocol: {protocol}")
@@ -109,13 +109,18 @@ async def register_user(user_data: UserAuth):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
+    if len(user_data.photos) > settings.profile_max_photos:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.profile_max_photos} profile photos are allowed."
+        )
     
     user_data.hashed_password = get_password_hash(user_data.hashed_password)
     new_user = await create_user(user_data)
     if new_user is None:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=f"Users profile bio too toxic."
+            detail=f"Users profile bio too toxic or photos are NSFW."
         )
     
     access_token = create_access_token(data={"sub": new_user.email})
@@ -0,0 +1,136 @@
+"""
+Пропускная способность фоновой модерации чата.
+
+Поднимает заглушку /predict_toxicity_batch с задержкой, как у
+оркестратора под нагрузкой, отправляет сообщения в ChatModerator с
+заданной частотой и замеряет, сколько сообщений в секунду проверяется
+и через сколько после доставки приходит вердикт. Заглушка считает
+токсичным каждое сообщение, так что вердикт - это вызов on_flagged.
+
+    python benchmark/chat_moderation_benchmark.py --rate 5000 --batch-sizes 1 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from aiohttp import web
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def create_fake_orchestrator(latency_ms: float, per_item_ms: float,
+                             concurrency: int) -> web.Application:
+    # Как у модели: ограниченное число одновременных пакетов
+    slots = asyncio.Semaphore(concurrency)
+
+    async def predict_toxicity_batch(request: web.Request) -> web.Response:
+        texts = (await request.json())['texts']
+        async with slots:
+            await asyncio.sleep((latency_ms + per_item_ms * len(texts)) / 1000)
+        return web.json_response({'results': [
+            {'non_toxicity': 0.0, 'insult': 1.0, 'obscenity': 0.0,
+             'threat': 0.0, 'dangerous': 0.0}
+            for _ in texts
+        ]})
+
+    app = web.Application()
+    app.router.add_post('/predict_toxicity_batch', predict_toxicity_batch)
+    return app
+
+
+async def run(batch_size: int, args) -> dict:
+    from ml_client import MLClient
+    from moderation import ChatMessage, ChatModerator
+
+    delivered_at, verdict_delays = {}, []
+
+    async def on_flagged(message: ChatMessage):
+        verdict_delays.append(time.perf_counter()
+                              - delivered_at[message.message_id])
+
+    client = MLClient(f'http://127.0.0.1:{args.port}', connect_timeout_s=1.0,
+                      read_timeout_s=10.0, retries=0, backoff_s=0.1,
+                      max_backoff_s=1.0, pool_size=100)
+    await client.start()
+    moderator = ChatModerator(
+        client,
+        on_flagged,
+        max_batch_size=batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue_size=args.queue_size,
+        concurrency=args.concurrency,
+        threshold=0.6
+    )
+    await moderator.start()
+
+    # Сообщения приходят пачками раз в миллисекунду
+    per_tick = max(1, args.rate // 1000)
+    start_time = time.perf_counter()
+    for message_id in range(args.messages):
+        if message_id % per_tick == 0:
+            delay = start_time + message_id / args.rate - time.perf_counter()
+            await asyncio.sleep(max(delay, 0))
+        delivered_at[message_id] = time.perf_counter()
+        moderator.submit(ChatMessage(message_id, 1, 2, 'Пример сообщения'))
+
+    while (len(verdict_delays) + moderator.stats['skipped']
+           < args.messages):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start_time
+    await moderator.close()
+    await client.close()
+
+    delays = 1000 * np.array(verdict_delays or [float('nan')])
+    return {
+        'batch_size': batch_size,
+        'checked_per_s': len(verdict_delays) / elapsed,
+        'skipped': moderator.stats['skipped'],
+        'p50_ms': np.percentile(delays, 50),
+        'p99_ms': np.percentile(delays, 99)
+    }
+
+
+async def main(args):
+    runner = web.AppRunner(create_fake_orchestrator(
+        args.latency_ms, args.per_item_ms, args.model_concurrency
+    ))
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+    try:
+        results = [await run(batch_size, args)
+                   for batch_size in args.batch_sizes]
+    finally:
+        await runner.cleanup()
+
+    print(f'rate={args.rate}/s messages={args.messages}')
+    print(f'{"batch_size":>10} {"checked/s":>10} {"skipped":>8} '
+          f'{"p50_ms":>8} {"p99_ms":>8}')
+    for result in results:
+        print(f'{result["batch_size"]:>10} {result["checked_per_s"]:>10.0f} '
+              f'{result["skipped"]:>8} {result["p50_ms"]:>8.1f} '
+              f'{result["p99_ms"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rate', type=int, default=5000,
+                        help='Сообщений в секунду')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--batch-sizes', nargs='+', type=int,
+                        default=[1, 16, 64])
+    parser.add_argument('--max-wait-ms', type=float, default=50.0)
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Одновременных запросов модерации')
+    parser.add_argument('--latency-ms', type=float, default=10.0)
+    parser.add_argument('--per-item-ms', type=float, default=0.05)
+    parser.add_argument('--model-concurrency', type=int, default=4)
+    parser.add_argument('--port', type=int, default=17654)
+    args = parser.parse_args()
+
+    os.environ['ML_API'] = f'http://127.0.0.1:{args.port}'
+    asyncio.run(main(args))
@@ -0,0 +1,261 @@
+"""
+Регистраций в секунду: последовательная регистрация против пакетной.
+
+Поднимает заглушку оркестратора с задержкой моделей и регистрирует
+пользователей с фото, привычками и интересами в базе из настроек
+(POSTGRES_*) двумя способами:
+    before - проверки моделями по очереди, фото декодируются и пишутся
+             по одному внутри транзакции, связи вставляются по строке;
+    after  - db.create_user: проверки одновременно, фото готовятся до
+             транзакции, связи - одним INSERT на таблицу.
+Созданные пользователи и их файлы удаляются после замера.
+
+    python benchmark/registration_benchmark.py --registrations 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import base64
+import os
+import shutil
+import sys
+import time
+import uuid
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from aiohttp import web
+from PIL import Image
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def create_fake_orchestrator(latency_ms: float, concurrency: int) -> web.Application:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def check_model(request: web.Request) -> web.Response:
+        return web.json_response({'ready': True})
+
+    async def predict_toxicity(request: web.Request) -> web.Response:
+        await request.read()
+        async with slots:
+            await asyncio.sleep(latency_ms / 1000)
+        return web.json_response({'non_toxicity': 1.0, 'insult': 0.0,
+                                  'obscenity': 0.0, 'threat': 0.0,
+                                  'dangerous': 0.0})
+
+    async def predict_nsfw(request: web.Request) -> web.Response:
+        await request.read()
+        async with slots:
+            await asyncio.sleep(latency_ms / 1000)
+        return web.json_response({'normal': 1.0, 'nsfw': 0.0})
+
+    app = web.Application(client_max_size=64 * 1024 ** 2)
+    app.router.add_get('/check_model_{name}', check_model)
+    app.router.add_post('/predict_toxicity', predict_toxicity)
+    app.router.add_post('/predict_nsfw', predict_nsfw)
+    return app
+
+
+def make_photo(seed: int, size) -> str:
+    # Плавный градиент со слабым шумом сжимается как обычное фото
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, size[0])[None, :, None]
+    y = np.linspace(0, 255, size[1])[:, None, None]
+    pixels = (x * rng.random(3) + y * rng.random(3)) / 2
+    pixels += rng.normal(0, 8, (size[1], size[0], 3))
+    buffer = BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(
+        buffer, format='JPEG', quality=90
+    )
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+async def legacy_create_user(user):
+    """Регистрация в прежнем порядке: всё последовательно, фото и связи
+    по одному внутри открытой транзакции."""
+    from sqlalchemy import insert
+
+    from db import (User, UserPhoto, get_session, reference_ids,
+                    t_user_bad_habits, t_user_interest)
+    from db.queries import candidate_index, CandidateProfile
+    from ml_client import ml_client
+    from utils import image_path
+    from utils.image_save import _process_and_save_image
+
+    if user.about != '' and await ml_client.model_ready('toxicity'):
+        if (await ml_client.predict_toxicity(user.about)).non_toxicity < 0.6:
+            return
+    for photo in user.photos:
+        if await ml_client.model_ready('nsfw'):
+            if (await ml_client.predict_nsfw(photo)).nsfw >= 0.5:
+                return
+
+    locality_id = await reference_ids.locality_id(user.region_name, user.locality_name)
+    habit_ids = await reference_ids.bad_habit_ids(user.habits)
+    interest_ids = await reference_ids.interest_ids(user.interests)
+    async with get_session() as session:
+        user_entity = User(
+            name=user.name, age=user.age, email=user.email, phone=user.phone,
+            vk_id=user.vk_id, about=user.about, locality_id=locality_id,
+            password_hash=user.hashed_password,
+            education_direction=await reference_ids.education_direction_id(
+                user.education_direction),
+            ei_id=await reference_ids.educational_institution_id(
+                user.educational_institution),
+            budget=user.budget, gender=user.gender
+        )
+        session.add(user_entity)
+        await session.flush()
+
+        for number, photo in enumerate(user.photos, 1):
+            path = image_path(user_entity.id, 'profile', number)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            await _process_and_save_image(path, photo)
+            session.add(UserPhoto(user_id=user_entity.id, file_name=str(path)))
+        for habit_id in habit_ids:
+            await session.execute(insert(t_user_bad_habits).values(
+                user_id=user_entity.id, bad_habits_id=habit_id))
+        for interest_id in interest_ids:
+            await session.execute(insert(t_user_interest).values(
+                user_id=user_entity.id, interest_id=interest_id))
+        await session.commit()
+        await session.refresh(user_entity)
+
+    candidate_index.add(CandidateProfile(
+        user_id=user_entity.id, locality_id=locality_id, age=user_entity.age,
+        budget=user_entity.budget, gender=user_entity.gender,
+        habit_ids=habit_ids, interest_ids=interest_ids
+    ))
+    return user_entity
+
+
+async def reference_names():
+    from sqlmodel import select
+
+    from db import (BadHabit, EducationalInstitution, EducationDirection,
+                    Interest, Locality, Region, get_session)
+
+    async with get_session() as session:
+        region, locality = (await session.exec(
+            select(Region.title, Locality.name)
+            .join(Region, Region.id == Locality.region_id)
+        )).first()
+        institution = (await session.exec(
+            select(EducationalInstitution.short_name))).first()
+        direction = (await session.exec(
+            select(EducationDirection.title))).first()
+        habits = (await session.exec(select(BadHabit.title).limit(5))).all()
+        interests = (await session.exec(select(Interest.title).limit(5))).all()
+    return dict(region_name=region, locality_name=locality,
+                educational_institution=institution,
+                education_direction=direction,
+                habits=list(habits), interests=list(interests))
+
+
+async def run(mode: str, names: dict, photos: list, args, run_id: str) -> dict:
+    from db import create_user
+    from utils import UserAuth
+
+    register = create_user if mode == 'after' else legacy_create_user
+    offset = {'before': 0, 'after': 1}[mode] * args.registrations
+    queue = asyncio.Queue()
+    for number in range(args.registrations):
+        queue.put_nowait(offset + number)
+    latencies = []
+
+    async def worker():
+        while not queue.empty():
+            number = queue.get_nowait()
+            user = UserAuth(
+                name=f'Bench {number}',
+                photos=photos,
+                gender=number % 2,
+                age=18 + number % 10,
+                email=f'bench-{run_id}-{number}@example.com',
+                phone=f'+7{args.phone_base + number:010d}',
+                vk_id=f'bench-{run_id}-{number}',
+                budget=10000 + number,
+                about='Ищу соседа по квартире',
+                hashed_password='x',
+                **names
+            )
+            start_time = time.perf_counter()
+            assert await register(user) is not None
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start_time
+    latencies = 1000 * np.array(latencies)
+    return {
+        'mode': mode,
+        'rps': args.registrations / elapsed,
+        'p50_ms': np.percentile(latencies, 50),
+        'p99_ms': np.percentile(latencies, 99)
+    }
+
+
+async def cleanup(run_id: str):
+    from sqlalchemy import text
+
+    from db.connections import engine
+
+    async with engine.begin() as conn:
+        users = f"SELECT id FROM users WHERE email LIKE 'bench-{run_id}-%'"
+        for table in ('user_photo', 'user_bad_habits', 'user_interest'):
+            await conn.execute(text(f'DELETE FROM {table} WHERE user_id IN ({users})'))
+        await conn.execute(text(f"DELETE FROM users WHERE email LIKE 'bench-{run_id}-%'"))
+    await engine.dispose()
+
+
+async def main(args):
+    from db import reference_ids
+    from ml_client import ml_client
+
+    runner = web.AppRunner(create_fake_orchestrator(args.latency_ms,
+                                                    args.model_concurrency))
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+    await ml_client.start()
+    await reference_ids.load()
+
+    names = await reference_names()
+    photos = [make_photo(seed, args.image_size) for seed in range(args.photos)]
+    run_id = uuid.uuid4().hex[:8]
+    try:
+        results = [await run(mode, names, photos, args, run_id)
+                   for mode in ('before', 'after')]
+    finally:
+        await cleanup(run_id)
+        await ml_client.close()
+        await runner.cleanup()
+
+    print(f'registrations={args.registrations} concurrency={args.concurrency} '
+          f'photos={args.photos} model_latency={args.latency_ms}ms')
+    print(f'{"mode":>8} {"reg/s":>8} {"p50_ms":>8} {"p99_ms":>8}')
+    for result in results:
+        print(f'{result["mode"]:>8} {result["rps"]:>8.1f} '
+              f'{result["p50_ms"]:>8.1f} {result["p99_ms"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--registrations', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--photos', type=int, default=3)
+    parser.add_argument('--image-size', nargs=2, type=int, default=[640, 480])
+    parser.add_argument('--latency-ms', type=float, default=20.0,
+                        help='Задержка одного запроса к модели')
+    parser.add_argument('--model-concurrency', type=int, default=8)
+    parser.add_argument('--phone-base', type=int, default=9990000000,
+                        help='Начало диапазона телефонов тестовых пользователей')
+    parser.add_argument('--port', type=int, default=17655)
+    args = parser.parse_args()
+
+    os.environ['ML_API'] = f'http://127.0.0.1:{args.port}'
+    os.environ.setdefault('DATA_PATH', str(Path(__file__).parent / '__bench_data__'))
+    try:
+        asyncio.run(main(args))
+    finally:
+        shutil.rmtree(os.environ['DATA_PATH'], ignore_errors=True)
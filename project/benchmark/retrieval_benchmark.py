@@ -0,0 +1,184 @@
+"""
+Полнота и задержка отбора кандидатов против полного перебора.
+
+На синтетических пользователях одного населённого пункта сравнивает:
+- полный перебор: оценка совместимости каждого пользователя по одному,
+  как при попарной обработке;
+- CandidateIndex: тот же перебор векторно по битовым множествам;
+- MinHash/LSH по интересам: оценка только кандидатов из совпавших корзин
+  при разном числе просматриваемых полос.
+
+Полнота - доля выданных кандидатов, чья оценка не ниже k-й оценки
+полного перебора (с учётом равных оценок).
+
+    python benchmark/retrieval_benchmark.py --users 10000 50000 --k 100
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from retrieval import CandidateIndex, CandidateProfile  # noqa: E402
+from retrieval.index import (AGE_WINDOW, BUDGET_WINDOW,  # noqa: E402
+                             WEIGHTS, _log_budget)
+
+
+def make_profiles(n: int, rng: np.random.Generator):
+    # Популярность интересов и привычек неравномерна, как в реальных анкетах
+    interest_weights = 1 / np.arange(1, 51) ** 0.8
+    interest_weights /= interest_weights.sum()
+    habit_weights = 1 / np.arange(1, 21)
+    habit_weights /= habit_weights.sum()
+
+    for user_id in range(1, n + 1):
+        interests = rng.choice(50, rng.integers(2, 9), replace=False,
+                               p=interest_weights) + 1
+        habits = rng.choice(20, rng.integers(0, 4), replace=False,
+                            p=habit_weights) + 1
+        yield CandidateProfile(
+            user_id=user_id,
+            locality_id=1,
+            age=int(np.clip(rng.normal(21, 2.5), 18, 35)),
+            budget=int(rng.lognormal(np.log(15000), 0.6)),
+            gender=int(rng.integers(0, 2)),
+            habit_ids=habits.tolist(),
+            interest_ids=interests.tolist()
+        )
+
+
+def pair_score(a: CandidateProfile, b: CandidateProfile) -> float:
+    """Та же оценка, что в CandidateIndex, для одной пары."""
+    def jaccard(x, y, empty):
+        x, y = set(x), set(y)
+        union = len(x | y)
+        return len(x & y) / union if union else empty
+
+    return (WEIGHTS['interests'] * jaccard(a.interest_ids, b.interest_ids, 0.0)
+            + WEIGHTS['habits'] * jaccard(a.habit_ids, b.habit_ids, 1.0)
+            + WEIGHTS['age'] * (1 - min(abs(a.age - b.age) / AGE_WINDOW, 1))
+            + WEIGHTS['budget'] * (1 - min(
+                abs(_log_budget(a.budget) - _log_budget(b.budget))
+                / BUDGET_WINDOW, 1))
+            + WEIGHTS['gender'] * (a.gender == b.gender))
+
+
+def brute_force(profiles: list, query: CandidateProfile, k: int) -> list:
+    scored = [(pair_score(query, profile), profile.user_id)
+              for profile in profiles if profile.user_id != query.user_id]
+    scored.sort(reverse=True)
+    return [(user_id, score) for score, user_id in scored[:k]]
+
+
+class MinHashLSH:
+    """MinHash по интересам, полосы по rows значений подписи."""
+
+    def __init__(self, index: CandidateIndex, bands: int, rows: int,
+                 rng: np.random.Generator):
+        self.index = index
+        self.bands, self.rows = bands, rows
+        self.ranks = np.array([rng.permutation(index.vocabulary_size)
+                               for _ in range(bands * rows)])
+        self.tables = [{} for _ in range(bands)]
+
+    def _signature(self, ids: list) -> np.ndarray:
+        return self.ranks[:, np.asarray(ids) - 1].min(axis=1) \
+            .reshape(self.bands, self.rows)
+
+    def build(self, profiles: list):
+        shard_rows = self.index._rows
+        for profile in profiles:
+            if not profile.interest_ids:
+                continue
+            row = shard_rows[profile.user_id][1]
+            for table, key in zip(self.tables,
+                                  map(bytes, self._signature(
+                                      profile.interest_ids))):
+                table.setdefault(key, []).append(row)
+        self.tables = [{key: np.array(rows, dtype=np.intp)
+                        for key, rows in table.items()}
+                       for table in self.tables]
+
+    def query(self, profile: CandidateProfile, k: int, probe: int) -> list:
+        shard = self.index._shards[profile.locality_id]
+        signature = self._signature(profile.interest_ids)
+        parts = [table[key] for table, key in zip(
+                     self.tables[:probe], map(bytes, signature[:probe]))
+                 if key in table]
+        if not parts:
+            return []
+        rows = np.unique(np.concatenate(parts))
+        scores = self.index._scores(shard, profile, rows)
+        scores[shard.user_ids[rows] == profile.user_id] = -np.inf
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        return [(int(shard.user_ids[rows[i]]), float(scores[i]))
+                for i in top]
+
+
+def measure(method, queries: list, thresholds: list) -> tuple:
+    recalls, times = [], []
+    for query, threshold in zip(queries, thresholds):
+        start_time = time.perf_counter()
+        result = method(query)
+        times.append(time.perf_counter() - start_time)
+        good = sum(score >= threshold - 1e-6 for _, score in result)
+        recalls.append(good / len(result) if result else 0.0)
+    return float(np.mean(recalls)), 1000 * np.array(times)
+
+
+def run(n: int, k: int, queries: int, brute_force_queries: int,
+        probes: list, rng: np.random.Generator):
+    profiles = list(make_profiles(n, rng))
+    index = CandidateIndex()
+    start_time = time.perf_counter()
+    index.build(profiles)
+    build_time = time.perf_counter() - start_time
+    lsh = MinHashLSH(index, bands=max(probes), rows=2, rng=rng)
+    lsh.build(profiles)
+    print(f'\nusers={n} k={k}: index built in {build_time:.2f}s')
+
+    sample = [profiles[i] for i in rng.choice(n, queries, replace=False)]
+    # Порог полноты - k-я оценка точного поиска
+    thresholds = [index.query(query, k)[-1][1] for query in sample]
+
+    rows = [('brute force', *measure(
+        lambda query: brute_force(profiles, query, k),
+        sample[:brute_force_queries], thresholds
+    ))]
+    rows.append(('bitset index', *measure(
+        lambda query: index.query(query, k), sample, thresholds
+    )))
+    for probe in probes:
+        rows.append((f'lsh {probe} bands', *measure(
+            lambda query: lsh.query(query, k, probe), sample, thresholds
+        )))
+
+    print(f'{"method":>14} {"recall@k":>9} {"mean_ms":>8} {"p95_ms":>8}')
+    for name, recall, times in rows:
+        print(f'{name:>14} {recall:>9.3f} {times.mean():>8.2f} '
+              f'{np.percentile(times, 95):>8.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', nargs='+', type=int, default=[10000, 50000])
+    parser.add_argument('--k', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--brute-force-queries', type=int, default=20,
+                        help='Полный перебор медленный, замеряем меньше')
+    parser.add_argument('--lsh-probes', nargs='+', type=int,
+                        default=[8, 16, 32, 64])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for n in args.users:
+        run(n, args.k, args.queries, args.brute_force_queries,
+            args.lsh_probes, rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,10 @@
+import itertools
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import Dict, Tuple
+from config import settings
+from ml_client import ml_client
 from db import get_matches
+from moderation import ChatMessage, ChatModerator
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -11,14 +15,25 @@ async def chat(websocket: WebSocket, user_id: int, target_id: int):
     try:
         while True:
             data = await websocket.receive_text()
-            await manager.send_personal_message(user_id, target_id, data)
+            message_id = await manager.send_personal_message(user_id, target_id, data)
+            # Проверка идёт после доставки и не задерживает следующее сообщение
+            moderator.submit(ChatMessage(message_id, user_id, target_id, data))
     except WebSocketDisconnect:
         manager.disconnect(user_id, target_id)
 
 
 class ConnectionManager:
+    """Активные WebSocket соединения чатов.
+
+    Кадры - JSON объекты с полем type:
+        message: {"type": "message", "id": int, "sender_id": int, "text": str}
+        retract: {"type": "retract", "id": int, "reason": str} - клиент
+            скрывает ранее доставленное сообщение с этим id.
+    """
+
     def __init__(self):
         self.active_connections: Dict[Tuple[int, int], Dict[int, WebSocket]] = {}
+        self._message_ids = itertools.count(1)
 
     def _get_chat_key(self, user1: int, user2: int):
         return tuple(sorted([user1, user2]))
@@ -42,16 +57,33 @@ class ConnectionManager:
             if not self.active_connections[key]:
                 del self.active_connections[key]
 
-    async def send_personal_message(self, sender_id: int, receiver_id: int, message: str):
-        key = self._get_chat_key(sender_id, receiver_id)
+    async def _broadcast(self, user1: int, user2: int, frame: dict):
+        key = self._get_chat_key(user1, user2)
         connections = self.active_connections.get(key, {})
-        for uid, conn in connections.items():
-            await conn.send_text(f"{sender_id}: {message}")
+        for uid, conn in list(connections.items()):
+            await conn.send_json(frame)
+
+    async def send_personal_message(self, sender_id: int, receiver_id: int, message: str) -> int:
+        message_id = next(self._message_ids)
+        await self._broadcast(sender_id, receiver_id, {
+            "type": "message",
+            "id": message_id,
+            "sender_id": sender_id,
+            "text": message
+        })
+        return message_id
+
+    async def retract_message(self, message: ChatMessage, reason: str = "toxicity"):
+        await self._broadcast(message.sender_id, message.receiver_id, {
+            "type": "retract",
+            "id": message.message_id,
+            "reason": reason
+        })
 
     async def get_user_active_connections(self, user_id: int):
         matches = await get_matches(user_id)
         active_chats = []
-        
+
         for match_id in matches:
             key = self._get_chat_key(user_id, match_id)
             if key in self.active_connections and user_id in self.active_connections[key]:
@@ -59,8 +91,17 @@ class ConnectionManager:
                     "target_id": match_id,
                     "connection": self.active_connections[key][user_id]
                 })
-        
+
         return active_chats
 
 
 manager = ConnectionManager()
+moderator = ChatModerator(
+    ml_client,
+    manager.retract_message,
+    max_batch_size=settings.chat_moderation_batch_size,
+    max_wait_ms=settings.chat_moderation_max_wait_ms,
+    max_queue_size=settings.chat_moderation_queue_size,
+    concurrency=settings.chat_moderation_concurrency,
+    threshold=settings.chat_toxicity_threshold
+)
@@ -37,13 +37,51 @@ class Settings(BaseSettings):
     redis: str = ''
     allowed_origins: list[str] = ['']
 
+    # ML orchestrator client
+    ml_connect_timeout_s: float = 1.0
+    ml_read_timeout_s: float = 5.0
+    ml_retries: int = 2
+    ml_backoff_s: float = 0.1
+    ml_max_backoff_s: float = 1.0
+    ml_pool_size: int = 100
+
     # Encryption
     secret_key: str = ''
     encryption_algorithm: str = ''
     access_token_expire_seconds: str = ''
 
+    # Dictionaries
+    dictionaries_max_age_s: int = 86400
+    reference_refresh_interval_s: float = 60.0
+    admin_token: str = ''
+
     # Path
     data_path: str = '__data__'
 
+    # Registration
+    profile_max_photos: int = 3
+    profile_toxicity_threshold: float = 0.6
+    profile_nsfw_threshold: float = 0.5
+
+    # Chat moderation
+    chat_moderation_batch_size: int = 64
+    chat_moderation_max_wait_ms: float = 50.0
+    chat_moderation_queue_size: int = 10000
+    chat_moderation_concurrency: int = 4
+    chat_toxicity_threshold: float = 0.6
+
+    # Retrieval
+    retrieval_vocabulary_size: int = 64
+    retrieval_top_k: int = 200
+    retrieval_refresh_interval_s: float = 3600.0
+
+    # Recommendations feed
+    recs_feed_ttl_s: int = 3600
+    recs_page_size: int = 10
+    precompute_top_n: int = 100
+    precompute_parallelism: int = 8
+    precompute_write_batch: int = 200
+    precompute_max_age_hours: float = 20.0
+
 
 settings = Settings()
@@ -16,6 +16,7 @@ try:
         Locality,
         User,
         Habitation,
+        PrecomputedRecs,
         t_user_bad_habits,
         t_user_interest,
         UserPhoto,
@@ -40,6 +41,7 @@ except (ModuleNotFoundError, ImportError) as e:
         Locality,
         User,
         Habitation,
+        PrecomputedRecs,
         t_user_bad_habits,
         t_user_interest,
         UserPhoto,
@@ -50,15 +52,30 @@ except (ModuleNotFoundError, ImportError) as e:
         Message
     )
 
+from .reference import ReferenceIds, reference_ids
+
 from .queries import (
     get_user_by_email,
+    get_user,
     create_user,
     get_regions,
     get_cities_by_region_name,
+    get_localities_by_region,
     get_bad_habits,
     get_interests,
     get_educ_dir,
-    get_recommendations,
+    get_recs_for_user,
+    get_recs_feed_version,
+    store_recs_feed,
+    get_recs_page,
+    get_search_localities,
+    get_locality_ranking_features,
+    get_locality_responses,
+    get_fresh_precomputed_ids,
+    store_precomputed_recs,
+    get_precomputed_recs,
+    get_candidate_profiles,
+    get_retrieval_query,
     get_habitation,
     create_habitation,
     update_habitation,
@@ -84,6 +101,7 @@ __all__ = [
     'Locality',
     'User',
     'Habitation',
+    'PrecomputedRecs',
     't_user_bad_habits',
     't_user_interest',
     'UserPhoto',
@@ -92,15 +110,31 @@ __all__ = [
     'HabitationPhoto',
     'Match',
     'Message',
+    # reference
+    'ReferenceIds',
+    'reference_ids',
     # queries
     'get_user_by_email',
+    'get_user',
     'create_user',
     'get_regions',
     'get_cities_by_region_name',
+    'get_localities_by_region',
     'get_bad_habits',
     'get_interests',
     'get_educ_dir',
-    'get_recommendations',
+    'get_recs_for_user',
+    'get_recs_feed_version',
+    'store_recs_feed',
+    'get_recs_page',
+    'get_search_localities',
+    'get_locality_ranking_features',
+    'get_locality_responses',
+    'get_fresh_precomputed_ids',
+    'store_precomputed_recs',
+    'get_precomputed_recs',
+    'get_candidate_profiles',
+    'get_retrieval_query',
     'get_habitation',
     'create_habitation',
     'update_habitation',
@@ -1,7 +1,7 @@
 from typing import List, Optional
 
 from sqlalchemy import BigInteger, Boolean, CheckConstraint, Column, DateTime, Double, ForeignKeyConstraint, Index, PrimaryKeyConstraint, Sequence, SmallInteger, String, Table, UniqueConstraint, text
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 import datetime
 
@@ -143,6 +143,7 @@ class User(Base):
         Index('user_email_idx', 'email', unique=True),
         Index('user_id_idx', 'id', unique=True),
         Index('user_phone_idx', 'phone', unique=True),
+        Index('user_search_locality_idx', 'locality_id', postgresql_where=text('(is_active AND is_search AND (NOT deleted))')),
         Index('user_vk_id_idx', 'vk_id', unique=True)
     )
 
@@ -173,6 +174,7 @@ class User(Base):
     ei: Mapped[Optional['EducationalInstitution']] = relationship('EducationalInstitution', back_populates='userss')
     locality: Mapped['Locality'] = relationship('Locality', back_populates='userss')
     habitations: Mapped[List['Habitation']] = relationship('Habitation', back_populates='user')
+    precomputed_recs: Mapped[Optional['PrecomputedRecs']] = relationship('PrecomputedRecs', uselist=False, back_populates='user')
     user_photos: Mapped[List['UserPhoto']] = relationship('UserPhoto', back_populates='user')
     user_responses: Mapped[List['UserResponse']] = relationship('UserResponse', foreign_keys='[UserResponse.request_user_id]', back_populates='request_user')
     user_responses_: Mapped[List['UserResponse']] = relationship('UserResponse', foreign_keys='[UserResponse.response_user_id]', back_populates='response_user')
@@ -207,7 +209,8 @@ t_user_bad_habits = Table(
     Column('user_id', BigInteger, nullable=False),
     Column('bad_habits_id', BigInteger, nullable=False),
     ForeignKeyConstraint(['bad_habits_id'], ['bad_habits.id'], name='user_bad_habits_bad_habits_id_fkey'),
-    ForeignKeyConstraint(['user_id'], ['users.id'], name='user_bad_habits_user_id_fkey')
+    ForeignKeyConstraint(['user_id'], ['users.id'], name='user_bad_habits_user_id_fkey'),
+    Index('user_bad_habits_user_idx', 'user_id')
 )
 
 
@@ -216,10 +219,25 @@ t_user_interest = Table(
     Column('user_id', BigInteger, nullable=False),
     Column('interest_id', BigInteger, nullable=False),
     ForeignKeyConstraint(['interest_id'], ['interest.id'], name='user_interest_interest_id_fkey'),
-    ForeignKeyConstraint(['user_id'], ['users.id'], name='user_interest_user_id_fkey')
+    ForeignKeyConstraint(['user_id'], ['users.id'], name='user_interest_user_id_fkey'),
+    Index('user_interest_user_idx', 'user_id')
 )
 
 
+class PrecomputedRecs(Base):
+    __tablename__ = 'precomputed_recs'
+    __table_args__ = (
+        ForeignKeyConstraint(['user_id'], ['users.id'], name='precomputed_recs_user_id_fkey'),
+        PrimaryKeyConstraint('user_id', name='precomputed_recs_pkey')
+    )
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    candidate_ids: Mapped[list] = mapped_column(ARRAY(BigInteger()))
+    computed_at: Mapped[datetime.datetime] = mapped_column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+
+    user: Mapped['User'] = relationship('User', back_populates='precomputed_recs')
+
+
 class UserPhoto(Base):
     __tablename__ = 'user_photo'
     __table_args__ = (
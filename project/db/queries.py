@@ -1,10 +1,17 @@
 import redis.asyncio as redis
+import asyncio
+import datetime
 import json
-import requests
-from sqlmodel import select, and_, or_, alias, func
-from typing import Optional, List, Dict, Any
+import logging
+from pathlib import Path
+from sqlmodel import select, and_, or_, alias, func, true
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from typing import Optional, List, Dict, Any, Set, Tuple
 import random
 from config import settings
+from ml_client import MLUnavailable, ml_client
+from retrieval import CandidateProfile, candidate_index
 
 from db import (
     create_models,
@@ -20,6 +27,7 @@ from db import (
     Locality,
     User,
     Habitation,
+    PrecomputedRecs,
     t_user_bad_habits,
     t_user_interest,
     UserPhoto,
@@ -27,12 +35,17 @@ from db import (
     UserScore,
     HabitationPhoto,
     Match,
-    Message
+    Message,
+    reference_ids
 )
 
 from utils import (
     logs,
     save_image,
+    image_path,
+    stage_image,
+    publish_images,
+    discard_images,
     ModelReadiness,
     TextRequest,
     ToxicityResponse,
@@ -54,6 +67,8 @@ from utils import (
 host, port = settings.redis.split(':')
 r = redis.Redis(host=host, port=port, db=0, decode_responses=True)
 
+logger = logging.getLogger(__name__)
+
 
 async def get_user_by_email(email: str) -> Optional[User]:
     async with get_session() as session:
@@ -73,101 +88,145 @@ async def get_user(id: int) -> Optional[User]:
         return result.first()
 
 
-async def create_user(user: UserAuth) -> Optional[User]:
-    data = user.about
-    ml_api_toxicity_state = requests.get(f'{settings.ml_api}/check_model_toxicity')
-    if data != '' and json.loads(ml_api_toxicity_state.text)['ready']:
-        payload = dict(text=data)
-        response = requests.post(f'{settings.ml_api}/predict_toxicity', data=payload)
-        if response.status_code == 200:
-            if response.json()['non_toxicity'] < 0.6:
-                return
-
-    async with get_session() as session:
-        locality_id = (await session.exec(
-            select(Locality.id)
-            .join(Region)
-            .where(
-                and_(
-                    Locality.name == user.locality_name,
-                    Region.title == user.region_name
-                )
+async def _profile_allowed(about: str, photos: List[str]) -> bool:
+    """Проверка описания на токсичность и всех фото на NSFW, все запросы
+    к моделям одновременно. Если модель недоступна или не готова
+    (оркестратор отвечает 503), её проверка пропускается."""
+    async def about_allowed() -> bool:
+        if about == '':
+            return True
+        try:
+            toxicity = await ml_client.predict_toxicity(about)
+            return toxicity.non_toxicity >= settings.profile_toxicity_threshold
+        except MLUnavailable as e:
+            logger.warning(f'Toxicity check skipped: {e}')
+            return True
+
+    async def photo_allowed(photo: str) -> bool:
+        try:
+            nsfw = await ml_client.predict_nsfw(photo)
+            return nsfw.nsfw < settings.profile_nsfw_threshold
+        except MLUnavailable as e:
+            logger.warning(f'NSFW check skipped: {e}')
+            return True
+
+    checks = [about_allowed(), *map(photo_allowed, photos)]
+    return all(await asyncio.gather(*checks))
+
+
+async def _drop_missing_photos(user_id: int, photo_paths: List[Path]):
+    missing = [str(path) for path in photo_paths if not path.exists()]
+    if not missing:
+        return
+    try:
+        async with get_session() as session:
+            await session.execute(
+                delete(UserPhoto)
+                .where(UserPhoto.user_id == user_id,
+                       UserPhoto.file_name.in_(missing))
             )
-        )).first()
+            await session.commit()
+    except Exception as e:
+        logger.error(f'Photo rows of user {user_id} point at missing files: {e}')
 
-        ei_id = (await session.exec(
-            select(EducationalInstitution.id)
-            .where(EducationalInstitution.short_name == user.educational_institution)
-        )).first()
-        
-        ed_dir_id = (await session.exec(
-            select(EducationDirection.id)
-            .where(EducationDirection.title == user.education_direction)
-        )).first()
-        
-        user_entity = User(
-            name=user.name,
-            age=user.age,
-            email=user.email,
-            phone=user.phone,
-            vk_id=user.vk_id,
-            about=user.about,
-            locality_id=locality_id,
-            password_hash=user.hashed_password,
-            education_direction=ed_dir_id,
-            ei_id=ei_id,
-            budget=user.budget,
-            gender=user.gender
-        )
 
-        session.add(user_entity)
-        await session.flush()
-        
-        for photo in enumerate(user.photos):
-            photo_filename = await save_image(
-                user_entity.id,
-                photo,
-                category='profile'
-            )
-            
-            photo = UserPhoto(
-                user_id=user_entity.id,
-                file_name=photo_filename,
-            )
-            session.add(photo)
-        
-        if user.habits:
-            habits = await session.exec(select(BadHabit.id)
-                                        .where(
-                                            BadHabit.title.in_(user.habits)
-                                        )
-            )
-
-            habit_ids = habits.all()
-            for habit_id in habit_ids:
-                user_habit = t_user_bad_habits(
-                    user_id=user_entity.id,
-                    bad_habits_id=habit_id
-                )
-                session.add(user_habit)
-        
-        if user.interests:
-            interests = await session.exec(select(Interest.id)
-                                           .where(
-                                               Interest.title.in_(user.interests)
-                                           )
-            )
-
-            interest_ids = interests.all()
-            for interest_id in interest_ids:
-                user_interest = t_user_interest(
-                    user_id=user_entity.id,
-                    interest_id=interest_id
-                )
-                session.add(user_interest)
-        
-        await session.commit()
-        return user_entity
+async def create_user(user: UserAuth) -> Optional[User]:
+    """Регистрация пользователя.
+
+    Проверки моделями и подготовка фото идут одновременно и до
+    транзакции, названия справочников разрешаются в памяти, так что
+    транзакция - только вставка пользователя и его связей пачками.
+    Фото переносятся на постоянные места после фиксации.
+
+    Returns:
+        Optional[User]: Созданный пользователь; None, если описание
+                        токсично или на фото NSFW.
+    """
+    allowed, *staged = await asyncio.gather(
+        _profile_allowed(user.about, user.photos),
+        *map(stage_image, user.photos),
+        return_exceptions=True
+    )
+    errors = [result for result in [allowed, *staged]
+              if isinstance(result, BaseException)]
+    if errors or not allowed:
+        discard_images([path for path in staged if isinstance(path, Path)])
+        if errors:
+            raise errors[0]
+        return
+
+    # Названия справочников разрешаются в памяти, без запросов к базе
+    locality_id = await reference_ids.locality_id(user.region_name, user.locality_name)
+    ei_id = await reference_ids.educational_institution_id(user.educational_institution)
+    ed_dir_id = await reference_ids.education_direction_id(user.education_direction)
+    habit_ids = await reference_ids.bad_habit_ids(user.habits) if user.habits else []
+    interest_ids = await reference_ids.interest_ids(user.interests) if user.interests else []
+
+    user_entity = User(
+        name=user.name,
+        age=user.age,
+        email=user.email,
+        phone=user.phone,
+        vk_id=user.vk_id,
+        about=user.about,
+        locality_id=locality_id,
+        password_hash=user.hashed_password,
+        education_direction=ed_dir_id,
+        ei_id=ei_id,
+        budget=user.budget,
+        gender=user.gender
+    )
+    try:
+        async with get_session() as session:
+            session.add(user_entity)
+            await session.flush()
+
+            photo_paths = [image_path(user_entity.id, 'profile', number)
+                           for number in range(1, len(staged) + 1)]
+            if photo_paths:
+                await session.execute(insert(UserPhoto).values([
+                    {'user_id': user_entity.id, 'file_name': str(path)}
+                    for path in photo_paths
+                ]))
+            if habit_ids:
+                await session.execute(insert(t_user_bad_habits).values([
+                    {'user_id': user_entity.id, 'bad_habits_id': habit_id}
+                    for habit_id in habit_ids
+                ]))
+            if interest_ids:
+                await session.execute(insert(t_user_interest).values([
+                    {'user_id': user_entity.id, 'interest_id': interest_id}
+                    for interest_id in interest_ids
+                ]))
+            await session.commit()
+            await session.refresh(user_entity)
+    except BaseException:
+        discard_images(staged)
+        raise
+
+    try:
+        publish_images(staged, photo_paths)
+    except OSError as e:
+        # Пользователь уже сохранён: регистрация не падает, а строки фото
+        # без файлов удаляются
+        logger.warning(f'Photos of user {user_entity.id} not published: {e}')
+        discard_images(staged)
+        await _drop_missing_photos(user_entity.id, photo_paths)
+    try:
+        candidate_index.add(CandidateProfile(
+            user_id=user_entity.id,
+            locality_id=locality_id,
+            age=user_entity.age,
+            budget=user_entity.budget,
+            gender=user_entity.gender,
+            habit_ids=habit_ids,
+            interest_ids=interest_ids
+        ))
+    except Exception as e:
+        # Пользователь уже сохранён; в индекс его добавит периодическая
+        # сверка с базой
+        logger.warning(f'User {user_entity.id} not indexed for retrieval: {e}')
+    return user_entity
 
 
 async def get_regions():
@@ -185,6 +244,19 @@ async def get_cities_by_region_name(region_title: str) -> List[str]:
         )
         return list(cities_result.all())
 
+async def get_localities_by_region() -> Dict[str, List[str]]:
+    """Населённые пункты всех регионов одним запросом: название региона
+    -> названия населённых пунктов."""
+    async with get_session() as session:
+        result = await session.exec(
+            select(Region.title, Locality.name)
+            .join(Region, Region.id == Locality.region_id)
+        )
+        cities: Dict[str, List[str]] = {}
+        for region_title, locality_name in result.all():
+            cities.setdefault(region_title, []).append(locality_name)
+        return cities
+
 async def get_bad_habits() -> List[str]:
     async with get_session() as session:
         result = await session.exec(select(BadHabit.title))
@@ -202,15 +274,352 @@ async def get_educ_dir() -> List[tuple[str, str]]:
         return list(result.all())
 
 
-async def get_recs_for_user(email: str) -> List[User]:
+def _candidate_profiles_query():
+    habits = (
+        select(t_user_bad_habits.c.user_id,
+               func.array_agg(t_user_bad_habits.c.bad_habits_id)
+               .label('habit_ids'))
+        .group_by(t_user_bad_habits.c.user_id)
+        .subquery()
+    )
+    interests = (
+        select(t_user_interest.c.user_id,
+               func.array_agg(t_user_interest.c.interest_id)
+               .label('interest_ids'))
+        .group_by(t_user_interest.c.user_id)
+        .subquery()
+    )
+    return (
+        select(User.id, User.locality_id, User.age, User.budget,
+               User.gender, habits.c.habit_ids, interests.c.interest_ids)
+        .outerjoin(habits, habits.c.user_id == User.id)
+        .outerjoin(interests, interests.c.user_id == User.id)
+    )
+
+
+def _candidate_profile(row: Any) -> CandidateProfile:
+    user_id, locality_id, age, budget, gender, habit_ids, interest_ids = row
+    return CandidateProfile(
+        user_id=user_id,
+        locality_id=locality_id,
+        age=age,
+        budget=budget,
+        gender=gender,
+        habit_ids=habit_ids or [],
+        interest_ids=interest_ids or []
+    )
+
+
+async def get_candidate_profiles() -> List[CandidateProfile]:
+    """Признаки всех пользователей в поиске для индекса кандидатов."""
     async with get_session() as session:
-        current_user = await get_user_by_email(email)
+        result = await session.exec(
+            _candidate_profiles_query()
+            .where(
+                and_(
+                    User.is_active,
+                    User.is_search,
+                    User.deleted.is_(False)
+                )
+            )
+        )
+        return [_candidate_profile(row) for row in result.all()]
 
-        viewed = await session.exec(
-            select(User)
-            .join(UserResponse, UserResponse.request_user_id == User.id)
+
+async def get_retrieval_query(user_id: int) -> Tuple[Optional[CandidateProfile], Set[int]]:
+    """Признаки пользователя для поиска кандидатов в индексе и ID тех,
+    кому он уже отвечал.
+
+    Returns:
+        Tuple[Optional[CandidateProfile], Set[int]]: Профиль (None, если
+            пользователя нет) и ID, которые нужно исключить из выдачи.
+    """
+    async with get_session() as session:
+        row = (await session.exec(
+            _candidate_profiles_query().where(User.id == user_id)
+        )).first()
+        responded = await session.exec(
+            select(UserResponse.response_user_id)
+            .where(UserResponse.request_user_id == user_id)
+        )
+        return (_candidate_profile(row) if row is not None else None,
+                set(responded.all()))
+
+
+def _with_ids(table, column: str, label: str):
+    """Коррелированный подзапрос с массивом ID из таблицы связей
+    пользователя: читает по индексу только его строки."""
+    return (
+        select(func.array_agg(table.c[column]))
+        .where(table.c.user_id == User.id)
+        .scalar_subquery()
+        .label(label)
+    )
+
+
+def _ranking_columns() -> list:
+    return [
+        User.id,
+        User.updated_at,
+        User.ei_id,
+        User.age,
+        User.education_direction,
+        User.created_at,
+        User.budget,
+        User.rating,
+        User.gender,
+        _with_ids(t_user_bad_habits, 'bad_habits_id', 'habit_ids'),
+        _with_ids(t_user_interest, 'interest_id', 'interest_ids')
+    ]
+
+
+async def get_recs_for_user(user_id: int,
+                            candidate_ids: Optional[List[int]] = None
+                            ) -> Tuple[Optional[Any], List[Any]]:
+    """Признаки пользователя и всех кандидатов его ленты одним запросом.
+
+    Кандидаты - активные анкеты в поиске из того же населённого пункта,
+    которым пользователь ещё не отвечал (анти-join по user_response).
+    Вредные привычки и интересы приходят массивами в той же строке, так
+    что вход модели ранжирования для всей ленты - один поход в базу.
+
+    Args:
+        user_id (int): ID пользователя, листающего ленту.
+        candidate_ids (Optional[List[int]]): Только эти кандидаты, например
+                                             отобранные индексом; по
+                                             умолчанию - все.
+
+    Returns:
+        Tuple[Optional[Any], List[Any]]: Строка пользователя (None, если
+            его нет) и строки кандидатов с полями id, updated_at, ei_id,
+            age, education_direction, created_at, budget, rating, gender,
+            habit_ids, interest_ids.
+    """
+    current_locality = (
+        select(User.locality_id)
+        .where(User.id == user_id)
+        .scalar_subquery()
+    )
+    seen = (
+        select(UserResponse.id)
+        .where(
+            and_(
+                UserResponse.request_user_id == user_id,
+                UserResponse.response_user_id == User.id
+            )
+        )
+        .exists()
+    )
+    current = select(*_ranking_columns()).where(User.id == user_id)
+    conditions = [
+        User.locality_id == current_locality,
+        User.is_active,
+        User.is_search,
+        User.deleted.is_(False),
+        User.id != user_id,
+        ~seen
+    ]
+    if candidate_ids is not None:
+        conditions.append(User.id.in_(candidate_ids))
+    candidates = select(*_ranking_columns()).where(and_(*conditions))
+    async with get_session() as session:
+        rows = (await session.exec(current.union_all(candidates))).all()
+
+    current_user, recs = None, []
+    for row in rows:
+        if row.id == user_id:
+            current_user = row
+        else:
+            recs.append(row)
+    return current_user, recs
+
+
+async def get_search_localities() -> List[int]:
+    """Населённые пункты, в которых есть анкеты в поиске."""
+    async with get_session() as session:
+        result = await session.exec(
+            select(User.locality_id)
+            .where(
+                and_(
+                    User.is_active,
+                    User.is_search,
+                    User.deleted.is_(False)
+                )
+            )
+            .distinct()
+        )
+        return list(result.all())
+
+
+async def get_locality_ranking_features(locality_id: int) -> List[Any]:
+    """Признаки ранжирования всех анкет в поиске населённого пункта одним
+    запросом, с теми же полями, что и в get_recs_for_user."""
+    async with get_session() as session:
+        result = await session.exec(
+            select(*_ranking_columns())
+            .where(
+                and_(
+                    User.locality_id == locality_id,
+                    User.is_active,
+                    User.is_search,
+                    User.deleted.is_(False)
+                )
+            )
+        )
+        return list(result.all())
+
+
+async def get_locality_responses(locality_id: int) -> Dict[int, Set[int]]:
+    """Кому уже ответили пользователи населённого пункта: request_user_id
+    -> множество response_user_id."""
+    async with get_session() as session:
+        result = await session.exec(
+            select(UserResponse.request_user_id, UserResponse.response_user_id)
+            .join(User, User.id == UserResponse.request_user_id)
+            .where(User.locality_id == locality_id)
+        )
+        responses: Dict[int, Set[int]] = {}
+        for request_user_id, response_user_id in result.all():
+            responses.setdefault(request_user_id, set()).add(response_user_id)
+        return responses
+
+
+async def get_fresh_precomputed_ids(locality_id: int, max_age: datetime.timedelta) -> Set[int]:
+    """Пользователи населённого пункта, чьи ленты посчитаны не раньше
+    max_age назад и после последнего изменения профиля - их
+    пересчитывать не нужно."""
+    async with get_session() as session:
+        result = await session.exec(
+            select(PrecomputedRecs.user_id)
+            .join(User, User.id == PrecomputedRecs.user_id)
+            .where(
+                and_(
+                    User.locality_id == locality_id,
+                    PrecomputedRecs.computed_at >= func.now() - max_age,
+                    PrecomputedRecs.computed_at >= User.updated_at
+                )
+            )
+        )
+        return set(result.all())
+
+
+async def store_precomputed_recs(feeds: Dict[int, List[int]]) -> None:
+    """Сохраняет ленты нескольких пользователей одним INSERT ... ON
+    CONFLICT, заменяя прежние.
+
+    Args:
+        feeds (Dict[int, List[int]]): ID пользователя -> ID кандидатов в
+                                      порядке ранжирования.
+    """
+    if not feeds:
+        return
+    statement = insert(PrecomputedRecs).values([
+        {'user_id': user_id, 'candidate_ids': candidate_ids}
+        for user_id, candidate_ids in feeds.items()
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[PrecomputedRecs.user_id],
+        set_={
+            'candidate_ids': statement.excluded.candidate_ids,
+            'computed_at': func.now()
+        }
+    )
+    async with get_session() as session:
+        await session.execute(statement)
+        await session.commit()
+
+
+async def get_precomputed_recs(user_id: int, not_before: datetime.datetime) -> List[int]:
+    """Заранее посчитанная лента пользователя без анкет, которым он уже
+    ответил или которые ушли из поиска.
+
+    Args:
+        user_id (int): ID пользователя.
+        not_before (datetime.datetime): Ленты, посчитанные раньше, например
+                                        до изменения профиля, не читаются.
+
+    Returns:
+        List[int]: ID кандидатов в порядке ранжирования; пустой список,
+                   если ленты нет или она устарела.
+    """
+    candidates = (
+        func.unnest(PrecomputedRecs.candidate_ids)
+        .table_valued('candidate_id', with_ordinality='position')
+        .render_derived()
+    )
+    seen = (
+        select(UserResponse.id)
+        .where(
+            and_(
+                UserResponse.request_user_id == user_id,
+                UserResponse.response_user_id == candidates.c.candidate_id
+            )
         )
-        return list(recs.all())
+        .exists()
+    )
+    async with get_session() as session:
+        result = await session.exec(
+            select(candidates.c.candidate_id)
+            .select_from(PrecomputedRecs)
+            .join(candidates, true())
+            .join(User, User.id == candidates.c.candidate_id)
+            .where(
+                and_(
+                    PrecomputedRecs.user_id == user_id,
+                    PrecomputedRecs.computed_at >= not_before,
+                    User.is_active,
+                    User.is_search,
+                    User.deleted.is_(False),
+                    ~seen
+                )
+            )
+            .order_by(candidates.c.position)
+        )
+        return list(result.all())
+
+
+def get_recs_feed_version(user: User) -> str:
+    """Версия ленты: меняется вместе с профилем или населённым пунктом
+    пользователя, и лента со старой версией больше не читается."""
+    return f'{user.locality_id}-{int(user.updated_at.timestamp())}'
+
+
+def _recs_feed_key(user_id: int, version: str) -> str:
+    return f'recs:{user_id}:{version}'
+
+
+async def store_recs_feed(user_id: int, version: str, ranked_ids: List[int]) -> None:
+    """Сохраняет ранжированную ленту пользователя в Redis.
+
+    Лента - sorted set, где оценка кандидата - его позиция, так что
+    страница по курсору читается одним ZRANGE. Ключ живёт
+    recs_feed_ttl_s, после чего лента пересчитывается заново.
+
+    Args:
+        user_id (int): ID пользователя.
+        version (str): Версия ленты из get_recs_feed_version.
+        ranked_ids (List[int]): ID кандидатов в порядке ранжирования.
+    """
+    key = _recs_feed_key(user_id, version)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        if ranked_ids:
+            pipe.zadd(key, {str(candidate_id): position
+                            for position, candidate_id in enumerate(ranked_ids)})
+            pipe.expire(key, settings.recs_feed_ttl_s)
+        await pipe.execute()
+
+
+async def get_recs_page(user_id: int, version: str, cursor: int, limit: int) -> List[int]:
+    """Страница сохранённой ленты, начиная с позиции cursor.
+
+    Returns:
+        List[int]: ID кандидатов; пустой список, если лента кончилась,
+                   истекла или сохранена для другой версии профиля.
+    """
+    candidate_ids = await r.zrange(_recs_feed_key(user_id, version),
+                                   cursor, cursor + limit - 1)
+    return [int(candidate_id) for candidate_id in candidate_ids]
 
 
 async def get_habitation() -> List[Habitation]:
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlmodel import select
+
+from config import settings
+from db import (
+    get_session,
+    BadHabit,
+    Interest,
+    EducationDirection,
+    Region,
+    EducationalInstitution,
+    Locality
+)
+
+
+class ReferenceIds:
+    """ID справочников по названиям в памяти процесса.
+
+    Регистрация передаёт населённый пункт, вуз, направление, привычки и
+    интересы названиями; с индексом они превращаются в ID без запросов
+    к базе. Индекс загружается при старте и перечитывается целиком по
+    reload справочников, а если названия нет - например, справочник
+    пополнили после загрузки - перечитывается сам, но не чаще раза в
+    refresh_interval_s, чтобы неверные названия не нагружали базу.
+    Промахи во время перечитывания ждут его, а не получают None.
+
+    Attributes:
+        refresh_interval_s (float): Минимальный интервал перечитывания
+                                    при промахе, с.
+    """
+
+    def __init__(self, refresh_interval_s: float):
+        self.refresh_interval_s = refresh_interval_s
+        self._loaded_at = float('-inf')
+        self._ids: Dict[str, Dict[Any, int]] = {}
+        self._reload: Optional[asyncio.Task] = None
+
+    async def load(self):
+        async with get_session() as session:
+            localities = await session.exec(
+                select(Region.title, Locality.name, Locality.id)
+                .join(Region, Region.id == Locality.region_id)
+            )
+            institutions = await session.exec(
+                select(EducationalInstitution.short_name, EducationalInstitution.id)
+            )
+            directions = await session.exec(
+                select(EducationDirection.title, EducationDirection.id)
+            )
+            bad_habits = await session.exec(select(BadHabit.title, BadHabit.id))
+            interests = await session.exec(select(Interest.title, Interest.id))
+
+            self._ids = {
+                'locality': {(region_title, name): id_
+                             for region_title, name, id_ in localities.all()},
+                'educational_institution': dict(institutions.all()),
+                'education_direction': dict(directions.all()),
+                'bad_habit': dict(bad_habits.all()),
+                'interest': dict(interests.all())
+            }
+        self._loaded_at = time.monotonic()
+
+    async def _lookup(self, table: str, keys: List[Any]) -> List[Optional[int]]:
+        ids = self._ids.get(table, {})
+        if any(key not in ids for key in keys):
+            in_flight = self._reload is not None and not self._reload.done()
+            if (not in_flight
+                    and time.monotonic() - self._loaded_at >= self.refresh_interval_s):
+                # Интервал отсчитывается от попытки, чтобы и неудачные
+                # перечитывания не повторялись на каждом промахе
+                self._loaded_at = time.monotonic()
+                self._reload = asyncio.create_task(self.load())
+                in_flight = True
+            if in_flight:
+                # Одновременные промахи ждут одно перечитывание; отмена
+                # одного запроса не отменяет его для остальных
+                await asyncio.shield(self._reload)
+                ids = self._ids.get(table, {})
+        return [ids.get(key) for key in keys]
+
+    async def locality_id(self, region_title: str, locality_name: str) -> Optional[int]:
+        return (await self._lookup('locality', [(region_title, locality_name)]))[0]
+
+    async def educational_institution_id(self, short_name: str) -> Optional[int]:
+        return (await self._lookup('educational_institution', [short_name]))[0]
+
+    async def education_direction_id(self, title: str) -> Optional[int]:
+        return (await self._lookup('education_direction', [title]))[0]
+
+    async def bad_habit_ids(self, titles: Iterable[str]) -> List[int]:
+        """ID известных привычек; неизвестные названия пропускаются."""
+        return [id_ for id_ in await self._lookup('bad_habit', list(titles))
+                if id_ is not None]
+
+    async def interest_ids(self, titles: Iterable[str]) -> List[int]:
+        """ID известных интересов; неизвестные названия пропускаются."""
+        return [id_ for id_ in await self._lookup('interest', list(titles))
+                if id_ is not None]
+
+
+reference_ids = ReferenceIds(settings.reference_refresh_interval_s)
@@ -0,0 +1,102 @@
+import hashlib
+import json
+from typing import Any, Dict, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from config import settings
+from db import (
+    get_regions,
+    get_localities_by_region,
+    get_bad_habits,
+    get_interests,
+    get_educ_dir
+)
+
+
+class Payload(NamedTuple):
+    """Готовый ответ справочника.
+
+    Attributes:
+        body (bytes): Сериализованный JSON.
+        etag (str): Сильный ETag, хэш body.
+    """
+    body: bytes
+    etag: str
+
+
+def _payload(content: Any) -> Payload:
+    # Та же сериализация, что у JSONResponse
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(',', ':')).encode('utf-8')
+    return Payload(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+class DictionarySnapshot:
+    """Снимок справочников в памяти для эндпоинтов регионов, городов,
+    вредных привычек, интересов и направлений образования.
+
+    Справочники почти не меняются, поэтому загружаются при старте и
+    хранятся уже сериализованными: ответ - готовые байты без запросов
+    к базе и без сериализации. ETag - хэш содержимого, так что он
+    одинаков во всех воркерах и после перезапуска, а клиент с
+    совпадающим If-None-Match получает 304. reload перечитывает базу и
+    заменяет снимок целиком; version растёт с каждой загрузкой.
+
+    Attributes:
+        max_age_s (int): Время кэширования ответа клиентом, с.
+    """
+
+    def __init__(self, max_age_s: int):
+        self.max_age_s = max_age_s
+        self.version = 0
+        self._payloads: Dict[str, Payload] = {}
+        self._no_cities = _payload({'localities': []})
+
+    async def reload(self):
+        regions = await get_regions()
+        localities = await get_localities_by_region()
+        bad_habits = await get_bad_habits()
+        interests = await get_interests()
+        ed_dirs = await get_educ_dir()
+
+        # Снимок заменяется одним присваиванием, запросы во время
+        # загрузки получают прежний
+        self._payloads = {
+            'regions': _payload({'regions': regions}),
+            'bad_habits': _payload({'bad_habits': bad_habits}),
+            'interests': _payload({'interest': interests}),
+            'ed_dirs': _payload({'ed_dirs': [
+                {'code': code, 'title': title}
+                for code, title in ed_dirs
+            ]}),
+            **{
+                f'cities:{region_title}': _payload({'localities': names})
+                for region_title, names in localities.items()
+            }
+        }
+        self.version += 1
+
+    def get(self, name: str, region_title: Optional[str] = None) -> Payload:
+        if name == 'cities':
+            return self._payloads.get(f'cities:{region_title}', self._no_cities)
+        return self._payloads[name]
+
+    def response(self, request: Request, name: str,
+                 region_title: Optional[str] = None) -> Response:
+        """Ответ справочника или 304, если у клиента актуальная версия."""
+        payload = self.get(name, region_title)
+        headers = {
+            'ETag': payload.etag,
+            'Cache-Control': f'public, max-age={self.max_age_s}'
+        }
+        # If-None-Match сравнивается слабо: W/"x" совпадает с "x"
+        tags = {tag.strip().removeprefix('W/')
+                for tag in request.headers.get('if-none-match', '').split(',')}
+        if '*' in tags or payload.etag in tags:
+            return Response(status_code=304, headers=headers)
+        return Response(payload.body, media_type='application/json',
+                        headers=headers)
+
+
+dictionaries = DictionarySnapshot(settings.dictionaries_max_age_s)
@@ -1,15 +1,20 @@
 import uvicorn
-import requests
+import asyncio
+import logging
 import json
-import random
-from fastapi import FastAPI, Request, HTTPException, Depends, status, WebSocket, WebSocketDisconnect
+import secrets
+from fastapi import FastAPI, Request, HTTPException, Depends, Header, Query, status, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from typing import Dict, List, AsyncGenerator
 
 from config import settings
+from dictionaries import dictionaries
+from ml_client import MLUnavailable, ml_client, ranking_features
+from retrieval import candidate_index
 from chat import router as chat_router
+from chat import moderator
 from auth import router as auth_router
 from auth import (
     authenticate_user,
@@ -28,7 +33,13 @@ from db import (
     get_educ_dir,
     update_user,
     check_password,
-    get_recommendations,
+    get_recs_for_user,
+    get_recs_feed_version,
+    store_recs_feed,
+    get_recs_page,
+    get_precomputed_recs,
+    get_candidate_profiles,
+    get_retrieval_query,
     cache_recomendations,
     get_habitation,
     create_habitation,
@@ -36,7 +47,8 @@ from db import (
     get_matches,
     get_all_matches,
     store_user_relation,
-    get_user_relation
+    get_user_relation,
+    reference_ids
 )
 
 from utils import (
@@ -53,11 +65,38 @@ from utils import (
     RecsResponse
 )
 
+logger = logging.getLogger(__name__)
+
+
+async def refresh_candidate_index():
+    """Периодически сверяет индекс кандидатов с базой: анкеты, вышедшие
+    из поиска вне приложения (например, ночная деактивация pg_cron),
+    удаляются, а изменённые признаки обновляются."""
+    while True:
+        await asyncio.sleep(settings.retrieval_refresh_interval_s)
+        try:
+            indexed = candidate_index.user_ids()
+            profiles = await get_candidate_profiles()
+            removed = await asyncio.to_thread(candidate_index.sync, profiles, indexed)
+            logger.info(f"Candidate index synced: {len(candidate_index)} users, {removed} removed")
+        except Exception as e:
+            logger.warning(f"Candidate index sync failed: {e}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
    await init_db()
+   await dictionaries.reload()
+   await reference_ids.load()
+   candidate_index.build(await get_candidate_profiles())
+   index_refresh = asyncio.create_task(refresh_candidate_index())
+   await ml_client.start()
+   await moderator.start()
    yield
+   index_refresh.cancel()
+   await asyncio.gather(index_refresh, return_exceptions=True)
+   await moderator.close()
+   await ml_client.close()
 
 
 app = FastAPI(
@@ -79,87 +118,113 @@ app.include_router(auth_router, prefix="/api")
 app.include_router(chat_router, prefix="/api")
 
 
+DICTIONARY_RESPONSES = {304: {"description": "Справочник не изменился"}}
+
+
 @logs
-@app.get("/api/get_regions", response_model=Dict[str, List[str]])
-async def get_all_regions():
-    regions = await get_regions()
-    return {"regions": regions}
+@app.get("/api/get_regions", response_model=Dict[str, List[str]],
+         responses=DICTIONARY_RESPONSES)
+async def get_all_regions(request: Request):
+    return dictionaries.response(request, "regions")
     
 
 @logs
-@app.get("/api/get_regions/{region_title}/cities", response_model=Dict[str, List[str]])
-async def get_cities_by_region(region_title: str):
-    cities = await get_cities_by_region_name(region_title)
-    return {"localities": cities}
+@app.get("/api/get_regions/{region_title}/cities", response_model=Dict[str, List[str]],
+         responses=DICTIONARY_RESPONSES)
+async def get_cities_by_region(request: Request, region_title: str):
+    return dictionaries.response(request, "cities", region_title)
 
 
 @logs
-@app.get("/api/get_bad_habits", response_model=Dict[str, List[str]])
-async def get_all_bad_habits():
-    bad_habits = await get_bad_habits()
-    return {"bad_habits": bad_habits}
+@app.get("/api/get_bad_habits", response_model=Dict[str, List[str]],
+         responses=DICTIONARY_RESPONSES)
+async def get_all_bad_habits(request: Request):
+    return dictionaries.response(request, "bad_habits")
 
 
 @logs
-@app.get("/api/get_interests", response_model=Dict[str, List[str]])
-async def get_all_interests():
-    interests = await get_interests()
-    return {"interest": interests}
+@app.get("/api/get_interests", response_model=Dict[str, List[str]],
+         responses=DICTIONARY_RESPONSES)
+async def get_all_interests(request: Request):
+    return dictionaries.response(request, "interests")
 
 
 @logs
-@app.get("/api/get_ed_dirs", response_model=Dict[str, List[Dict[str, str]]])
-async def get_all_ed_dir():
-    ed_dirs = await get_educ_dir()
-    return {"ed_dirs":
-            [
-                {
-                    "code": code,
-                    "title": title
-                }
-                for code, title in ed_dirs
-            ]
-    }
+@app.get("/api/get_ed_dirs", response_model=Dict[str, List[Dict[str, str]]],
+         responses=DICTIONARY_RESPONSES)
+async def get_all_ed_dir(request: Request):
+    return dictionaries.response(request, "ed_dirs")
 
 
 @logs
-@app.get("/api/get_recs/{token}", response_model=UserData)
-async def get_recs(current_user: UserData = Depends(get_current_active_user)):
-    def get_fields(entity, postfix='main'):
-        return {
-            f'ei_id_{postfix}': entity.ei_id,
-            f'age_{postfix}': entity.age,
-            f'education_direction_{postfix}': entity.education_direction,
-            f'year_created_at_{postfix}': entity.created_at.year,
-            f'budget_{postfix}': entity.budget if entity.budget else 0,
-            f'rating_{postfix}': entity.rating,
-            f'gender_{postfix}': entity.gender,
-            f'habit_ids_{postfix}': entity.bad_habitss,
-            f'interest_ids_{postfix}': entity.interests
-        }
-    
-    if True:    # cache check
-        recs = []
-        #TODO load cache
-    else:
-        user = await get_user_by_email(current_user.email)
-        recs = await get_recs_for_user(user.id)
-        ml_api_ranker_state = requests.get(f'{settings.ml_api}/check_model_ranking')
-        if recs and len(recs) > 1 and json.loads(ml_api_ranker_state.text)['ready']:
-            recs_order: list[float] = list()
-            for recommended_user in recs:
-                payload = RankingPairRequest(**get_fields(user), **get_fields(recs, postfix='candidate'))
-                response = requests.post(f'{settings.ml_api}/ranking_pair', data=payload.model_dump_json())
-                if response.status_code == 200:
-                    recs_order.append(response.json()['confidence'])
-                else:
-                    recs_order.append(0)
-        else:
-            random.shuffle(recs)
-
+@app.post("/api/admin/reload_dictionaries", response_model=Dict[str, int])
+async def reload_dictionaries(x_admin_token: str = Header(default="")):
+    """Перечитывает справочники из базы после их изменения."""
+    if not settings.admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={"code": "forbidden", "message": "Invalid admin token"}
+        )
+    await dictionaries.reload()
+    await reference_ids.load()
+    return {"version": dictionaries.version}
+
+
+async def rank_recs(user_id: int) -> List[int]:
+    """Лента пользователя: индекс отбирает retrieval_top_k самых
+    совместимых кандидатов, которым он ещё не отвечал, а модель
+    ранжирования упорядочивает только их. Если модель недоступна,
+    остаётся порядок индекса."""
+    profile, responded = await get_retrieval_query(user_id)
+    if profile is None:
+        return []
+    retrieved = candidate_index.query(profile, settings.retrieval_top_k, exclude=responded)
+    candidate_ids = [candidate_id for candidate_id, _ in retrieved]
+    main_features, rows = await get_recs_for_user(user_id, candidate_ids)
+
+    # Кого база не вернула, тот вышел из поиска после сборки индекса.
+    # Ошибочно удалённых вернёт периодическая сверка
+    rows_by_id = {row.id: row for row in rows}
+    for candidate_id in candidate_ids:
+        if candidate_id not in rows_by_id:
+            candidate_index.remove(candidate_id)
+    recs = [rows_by_id[candidate_id] for candidate_id in candidate_ids if candidate_id in rows_by_id]
+
+    recs_order: list[float] = list()
+    try:
+        if len(recs) > 1:
+            # Вся лента оценивается одним запросом к модели
+            recs_order = await ml_client.ranking_batch(
+                ranking_features(main_features),
+                [ranking_features(candidate) for candidate in recs]
+            )
+    except MLUnavailable as e:
+        logger.warning(f"Ranking skipped: {e}")
+
+    if recs_order:
         recs = [x for _, x in sorted(zip(recs_order, recs), key=lambda pair: pair[0], reverse=True)]
-        #TODO store cache       
-    return recs[0]
+    return [candidate.id for candidate in recs]
+
+
+@logs
+@app.get("/api/get_recs/{token}", response_model=RecsResponse)
+async def get_recs(
+    cursor: int = Query(default=0, ge=0),
+    limit: int = Query(default=settings.recs_page_size, ge=1, le=100),
+    current_user: UserData = Depends(get_current_active_user)
+):
+    user = await get_user_by_email(current_user.email)
+    version = get_recs_feed_version(user)
+    user_ids = await get_recs_page(user.id, version, cursor, limit)
+    if not user_ids:
+        # Лента кончилась, истекла или профиль изменился: берём заранее
+        # посчитанную precompute_recs.py, а если её нет - ранжируем сейчас
+        ranked_ids = await get_precomputed_recs(user.id, user.updated_at)
+        if not ranked_ids:
+            ranked_ids = await rank_recs(user.id)
+        await store_recs_feed(user.id, version, ranked_ids)
+        cursor, user_ids = 0, ranked_ids[:limit]
+    return RecsResponse(user_ids=user_ids, next_cursor=cursor + len(user_ids))
 
 
 @logs
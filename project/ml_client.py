@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from config import settings
+from utils import ModelReadiness, NSFWResponse, ToxicityResponse
+
+logger = logging.getLogger(__name__)
+
+# Оркестратор перегружен или перезапускается - запрос можно повторить
+RETRY_STATUSES = {502, 503, 504}
+
+
+def ranking_features(entity: Any) -> Dict[str, Any]:
+    """Признаки пользователя для /ranking_batch из строки запроса
+    get_recs_for_user или get_locality_ranking_features."""
+    return {
+        'user_id': entity.id,
+        'updated_at': entity.updated_at.isoformat(),
+        'ei_id': entity.ei_id or 0,
+        'age': entity.age,
+        'education_direction': entity.education_direction or 0,
+        'year_created_at': entity.created_at.year,
+        'budget': entity.budget if entity.budget else 0,
+        'rating': entity.rating,
+        'gender': entity.gender or 0,
+        'habit_ids': entity.habit_ids or [],
+        'interest_ids': entity.interest_ids or []
+    }
+
+
+class MLUnavailable(Exception):
+    """Оркестратор не ответил после всех повторов или вернул ошибку."""
+
+
+class MLClient:
+    """Общий асинхронный клиент оркестратора ML моделей.
+
+    Одна сессия aiohttp на всё приложение: соединения переиспользуются
+    между запросами, а не открываются заново на каждый вызов. Ошибки
+    соединения, таймауты и ответы 502/503/504 повторяются не больше
+    retries раз с экспоненциальной паузой; если оркестратор просит
+    подождать (Retry-After) дольше max_backoff_s, запрос сразу
+    завершается ошибкой MLUnavailable. Все эндпоинты оркестратора
+    только читают, поэтому повтор безопасен.
+
+    Attributes:
+        base_url (str): Адрес оркестратора.
+        connect_timeout_s (float): Таймаут установки соединения, с.
+        read_timeout_s (float): Таймаут ожидания ответа, с.
+        retries (int): Число повторов после первой попытки.
+        backoff_s (float): Пауза перед первым повтором, с.
+        max_backoff_s (float): Максимальная пауза между попытками, с.
+        pool_size (int): Максимальное число открытых соединений.
+    """
+
+    def __init__(self, base_url: str, connect_timeout_s: float,
+                 read_timeout_s: float, retries: int, backoff_s: float,
+                 max_backoff_s: float, pool_size: int):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout_s = connect_timeout_s
+        self.read_timeout_s = read_timeout_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=self.connect_timeout_s,
+                sock_read=self.read_timeout_s
+            )
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, method: str, path: str,
+                       payload: Optional[Dict[str, Any]] = None) -> Any:
+        if self._session is None:
+            raise MLUnavailable('ML client is not started')
+
+        for attempt in range(self.retries + 1):
+            delay = self.backoff_s * 2 ** attempt
+            try:
+                async with self._session.request(
+                    method, f'{self.base_url}{path}', json=payload
+                ) as response:
+                    if response.status not in RETRY_STATUSES:
+                        if response.status >= 400:
+                            raise MLUnavailable(f'{path}: HTTP {response.status}')
+                        return await response.json()
+                    error = f'HTTP {response.status}'
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        delay = max(delay, float(retry_after))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f'{type(e).__name__} - {e}'
+
+            if attempt == self.retries or delay > self.max_backoff_s:
+                break
+            logger.info(f'Retrying {path} in {delay:.2f}s: {error}')
+            await asyncio.sleep(delay)
+        raise MLUnavailable(f'{path}: {error}')
+
+    async def model_ready(self, model_name: str) -> bool:
+        data = await self._request('GET', f'/check_model_{model_name}')
+        return ModelReadiness.model_validate(data).ready
+
+    async def predict_toxicity(self, text: str) -> ToxicityResponse:
+        data = await self._request('POST', '/predict_toxicity', {'text': text})
+        return ToxicityResponse.model_validate(data)
+
+    async def predict_toxicity_batch(self, texts: List[str]) -> List[ToxicityResponse]:
+        data = await self._request('POST', '/predict_toxicity_batch',
+                                   {'texts': texts})
+        return [ToxicityResponse.model_validate(result)
+                for result in data['results']]
+
+    async def predict_nsfw(self, image: str) -> NSFWResponse:
+        data = await self._request('POST', '/predict_nsfw', {'image': image})
+        return NSFWResponse.model_validate(data)
+
+    async def ranking_batch(self, main: Dict[str, Any],
+                            candidates: List[Dict[str, Any]]) -> List[float]:
+        """Оценки совпадения main с каждым кандидатом в порядке candidates."""
+        data = await self._request('POST', '/ranking_batch',
+                                   {'main': main, 'candidates': candidates})
+        return data['coincidences']
+
+
+ml_client = MLClient(
+    settings.ml_api,
+    connect_timeout_s=settings.ml_connect_timeout_s,
+    read_timeout_s=settings.ml_read_timeout_s,
+    retries=settings.ml_retries,
+    backoff_s=settings.ml_backoff_s,
+    max_backoff_s=settings.ml_max_backoff_s,
+    pool_size=settings.ml_pool_size
+)
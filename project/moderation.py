@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Set
+
+from ml_client import MLClient, MLUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+class ChatMessage(NamedTuple):
+    """Доставленное сообщение чата, ожидающее проверки на токсичность.
+
+    Attributes:
+        message_id (int): ID сообщения, по нему клиенты скрывают его.
+        sender_id (int): ID отправителя.
+        receiver_id (int): ID получателя.
+        text (str): Текст сообщения.
+    """
+    message_id: int
+    sender_id: int
+    receiver_id: int
+    text: str
+
+
+class ChatModerator:
+    """Фоновая проверка сообщений чата на токсичность.
+
+    Сообщения доставляются сразу, а проверяются после: submit только
+    кладёт сообщение в очередь, воркер собирает из неё пакеты и
+    отправляет их в /predict_toxicity_batch оркестратора через общий
+    клиент, не больше concurrency пакетов одновременно. Для сообщений с non_toxicity ниже
+    порога вызывается on_flagged. Если очередь полна или оркестратор
+    недоступен, сообщения остаются без проверки: чат важнее модерации.
+
+    Attributes:
+        client (MLClient): Клиент оркестратора.
+        on_flagged (Callable[[ChatMessage], Awaitable[None]]): Обработчик
+            токсичного сообщения.
+        max_batch_size (int): Максимальный размер пакета.
+        max_wait_ms (float): Максимальное ожидание добора пакета, мс.
+        max_queue_size (int): Максимальное число ожидающих сообщений.
+        concurrency (int): Число одновременных запросов к оркестратору.
+        threshold (float): Порог non_toxicity, ниже которого сообщение
+            считается токсичным.
+    """
+
+    def __init__(self, client: MLClient,
+                 on_flagged: Callable[[ChatMessage], Awaitable[None]],
+                 max_batch_size: int, max_wait_ms: float, max_queue_size: int,
+                 concurrency: int, threshold: float):
+        self.client = client
+        self.on_flagged = on_flagged
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.concurrency = concurrency
+        self.threshold = threshold
+        self.stats = {'checked': 0, 'flagged': 0, 'skipped': 0}
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._worker = asyncio.create_task(self._collect())
+
+    async def close(self):
+        # Непроверенные сообщения уже доставлены, ждать медленных ответов
+        # оркестратора при остановке незачем
+        tasks = [*filter(None, [self._worker]), *self._pending]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+
+    def submit(self, message: ChatMessage) -> bool:
+        """Ставит сообщение в очередь на проверку, не дожидаясь её.
+
+        Returns:
+            bool: False, если модерация не запущена или очередь полна.
+        """
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.stats['skipped'] += 1
+            return False
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            # Пока все запросы заняты, сообщения копятся в очереди,
+            # и следующий пакет уходит полным
+            await self._slots.acquire()
+            task = asyncio.create_task(self._check(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _score(self, texts: List[str]) -> List[float]:
+        # Оркестратор принимает тексты до 1000 символов
+        results = await self.client.predict_toxicity_batch(
+            [text[:1000] for text in texts]
+        )
+        return [result.non_toxicity for result in results]
+
+    async def _check(self, batch: List[ChatMessage]):
+        try:
+            scores = await self._score([message.text for message in batch])
+        except MLUnavailable as e:
+            self.stats['skipped'] += len(batch)
+            logger.warning(f'Chat moderation skipped {len(batch)} messages: {e}')
+            return
+        except Exception as e:
+            # Неожиданный ответ оркестратора: задачу никто не ждёт, поэтому
+            # ошибка только логируется
+            self.stats['skipped'] += len(batch)
+            logger.error(f'Chat moderation failed for {len(batch)} messages: '
+                         f'{type(e).__name__} - {e}')
+            return
+        finally:
+            self._slots.release()
+
+        self.stats['checked'] += len(batch)
+        for message, non_toxicity in zip(batch, scores):
+            if non_toxicity < self.threshold:
+                self.stats['flagged'] += 1
+                try:
+                    await self.on_flagged(message)
+                except Exception as e:
+                    logger.warning(f'Failed to retract message '
+                                   f'{message.message_id}: {e}')
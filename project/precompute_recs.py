@@ -0,0 +1,143 @@
+"""
+Офлайн расчёт лент рекомендаций по населённым пунктам.
+
+Для каждого населённого пункта одним запросом берёт признаки всех анкет
+в поиске, отбирает каждому пользователю retrieval_top_k кандидатов
+индексом совместимости, оценивает их моделью ранжирования пакетом и
+сохраняет лучшие top_n в precomputed_recs, откуда их читает get_recs.
+Ленты, посчитанные не раньше max_age_hours назад и после последнего
+изменения профиля, пропускаются, так что прерванный запуск при
+повторе продолжается с того же места.
+
+Запускается по расписанию после ночной деактивации неактивных
+пользователей (pg_cron, 03:00), например из cron контейнера бэкенда:
+
+    30 3 * * * cd /app && python precompute_recs.py
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+from typing import Any, Dict, List
+
+from config import settings
+from db import (
+    get_search_localities,
+    get_locality_ranking_features,
+    get_locality_responses,
+    get_fresh_precomputed_ids,
+    store_precomputed_recs
+)
+from ml_client import MLUnavailable, ml_client, ranking_features
+from retrieval import CandidateIndex, CandidateProfile
+from utils import setup_logger
+
+logger = logging.getLogger(__name__)
+
+
+def _profile(user: Any, locality_id: int) -> CandidateProfile:
+    return CandidateProfile(
+        user_id=user.id,
+        locality_id=locality_id,
+        age=user.age,
+        budget=user.budget,
+        gender=user.gender,
+        habit_ids=user.habit_ids or [],
+        interest_ids=user.interest_ids or []
+    )
+
+
+async def precompute_locality(locality_id: int, slots: asyncio.Semaphore,
+                              args: argparse.Namespace) -> Dict[str, int]:
+    """Считает ленты пользователей населённого пункта, ещё не посчитанные
+    в пределах max_age_hours, и сохраняет их пачками по write_batch.
+
+    Returns:
+        Dict[str, int]: Число посчитанных, пропущенных как свежие и
+                        не посчитанных из-за недоступности модели лент.
+    """
+    stats = {'computed': 0, 'fresh': 0, 'failed': 0}
+    fresh = await get_fresh_precomputed_ids(
+        locality_id, datetime.timedelta(hours=args.max_age_hours)
+    )
+    users = await get_locality_ranking_features(locality_id)
+    pending = [user for user in users if user.id not in fresh]
+    stats['fresh'] = len(users) - len(pending)
+    if not pending:
+        return stats
+
+    responses = await get_locality_responses(locality_id)
+    users_by_id = {user.id: user for user in users}
+    index = CandidateIndex(settings.retrieval_vocabulary_size)
+    index.build(_profile(user, locality_id) for user in users)
+
+    async def rank(user: Any) -> List[int]:
+        retrieved = index.query(_profile(user, locality_id), args.top_k,
+                                exclude=responses.get(user.id))
+        if not retrieved:
+            return []
+        candidate_ids = [candidate_id for candidate_id, _ in retrieved]
+        async with slots:
+            scores = await ml_client.ranking_batch(
+                ranking_features(user),
+                [ranking_features(users_by_id[candidate_id])
+                 for candidate_id in candidate_ids]
+            )
+        ranked = sorted(zip(scores, candidate_ids),
+                        key=lambda pair: pair[0], reverse=True)
+        return [candidate_id for _, candidate_id in ranked[:args.top_n]]
+
+    for start in range(0, len(pending), args.write_batch):
+        chunk = pending[start:start + args.write_batch]
+        results = await asyncio.gather(*(rank(user) for user in chunk),
+                                       return_exceptions=True)
+        feeds = {}
+        for user, result in zip(chunk, results):
+            if isinstance(result, MLUnavailable):
+                # Ленту посчитает следующий запуск
+                stats['failed'] += 1
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                feeds[user.id] = result
+        await store_precomputed_recs(feeds)
+        stats['computed'] += len(feeds)
+    return stats
+
+
+async def main(args: argparse.Namespace):
+    await ml_client.start()
+    try:
+        if not await ml_client.model_ready('ranking'):
+            logger.error('Ranking model is not ready, nothing precomputed')
+            return
+        localities = args.localities or await get_search_localities()
+        slots = asyncio.Semaphore(args.parallelism)
+        for locality_id in localities:
+            stats = await precompute_locality(locality_id, slots, args)
+            logger.info(f'Locality {locality_id}: {stats}')
+    finally:
+        await ml_client.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--localities', nargs='+', type=int,
+                        help='ID населённых пунктов, по умолчанию все')
+    parser.add_argument('--top-k', type=int, default=settings.retrieval_top_k,
+                        help='Кандидатов на оценку моделью')
+    parser.add_argument('--top-n', type=int, default=settings.precompute_top_n,
+                        help='Кандидатов в сохраняемой ленте')
+    parser.add_argument('--parallelism', type=int,
+                        default=settings.precompute_parallelism,
+                        help='Одновременных запросов к оркестратору')
+    parser.add_argument('--write-batch', type=int,
+                        default=settings.precompute_write_batch,
+                        help='Лент в одной записи в базу')
+    parser.add_argument('--max-age-hours', type=float,
+                        default=settings.precompute_max_age_hours,
+                        help='Ленты моложе не пересчитываются')
+    args = parser.parse_args()
+
+    setup_logger()
+    asyncio.run(main(args))
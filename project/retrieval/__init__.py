@@ -0,0 +1,13 @@
+from config import settings
+
+from .index import CandidateIndex, CandidateProfile
+
+
+candidate_index = CandidateIndex(settings.retrieval_vocabulary_size)
+
+__all__ = [
+    # index
+    'CandidateIndex',
+    'CandidateProfile',
+    'candidate_index'
+]
@@ -0,0 +1,317 @@
+import math
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+
+# Веса составляющих совместимости, в сумме 1
+WEIGHTS = {
+    'interests': 0.35,
+    'habits': 0.25,
+    'age': 0.15,
+    'budget': 0.15,
+    'gender': 0.10
+}
+AGE_WINDOW = 10         # разница в возрасте, при которой сходство равно 0
+BUDGET_WINDOW = 2.0     # то же для разницы log2 бюджетов (в 4 раза)
+
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Число единичных битов в строках матрицы uint64 (N, W)."""
+    if hasattr(np, 'bitwise_count'):
+        counts = np.bitwise_count(words)
+    else:
+        counts = _POPCOUNT8[words.view(np.uint8)].reshape(len(words), -1)
+    return counts.sum(axis=1, dtype=np.int16)
+
+
+def _log_budget(budget: Optional[int]) -> float:
+    return math.log2(max(budget or 0, 1))
+
+
+class CandidateProfile(NamedTuple):
+    """Признаки пользователя, по которым отбираются кандидаты.
+
+    Attributes:
+        user_id (int): ID пользователя.
+        locality_id (int): ID населённого пункта, поиск идёт только внутри него.
+        age (int): Возраст.
+        budget (Optional[int]): Бюджет.
+        gender (Optional[int]): Пол (0 - женский, 1 - мужской).
+        habit_ids (List[int]): ID вредных привычек.
+        interest_ids (List[int]): ID интересов.
+    """
+    user_id: int
+    locality_id: int
+    age: int
+    budget: Optional[int]
+    gender: Optional[int]
+    habit_ids: List[int]
+    interest_ids: List[int]
+
+
+class _Shard:
+    """Пользователи одного населённого пункта в плотных колонках.
+
+    Удалённую строку занимает последняя, так что первые size строк
+    всегда актуальны и оцениваются срезами, без выборки по индексам.
+    """
+
+    COLUMNS = ('user_ids', 'interests', 'interest_counts', 'habits',
+               'habit_counts', 'age', 'log_budget', 'gender')
+
+    def __init__(self, words: int, capacity: int = 64):
+        self.size = 0
+        self.user_ids = np.zeros(capacity, dtype=np.int64)
+        self.interests = np.zeros((capacity, words), dtype=np.uint64)
+        self.interest_counts = np.zeros(capacity, dtype=np.int16)
+        self.habits = np.zeros((capacity, words), dtype=np.uint64)
+        self.habit_counts = np.zeros(capacity, dtype=np.int16)
+        self.age = np.zeros(capacity, dtype=np.float32)
+        self.log_budget = np.zeros(capacity, dtype=np.float32)
+        # -1 - пол не указан
+        self.gender = np.zeros(capacity, dtype=np.int8)
+
+    def _grow(self):
+        for name in self.COLUMNS:
+            array = getattr(self, name)
+            grown = np.zeros((2 * len(array), *array.shape[1:]),
+                             dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def set(self, row: int, user_id: int, interests: np.ndarray,
+            habits: np.ndarray, age: int, log_budget: float, gender: int):
+        self.user_ids[row] = user_id
+        self.interests[row] = interests
+        self.interest_counts[row] = _popcount(interests[None])[0]
+        self.habits[row] = habits
+        self.habit_counts[row] = _popcount(habits[None])[0]
+        self.age[row] = age
+        self.log_budget[row] = log_budget
+        self.gender[row] = gender
+
+    def widen(self, words: int):
+        """Расширяет битовые множества до words слов, новые биты нулевые."""
+        for name in ('interests', 'habits'):
+            array = getattr(self, name)
+            widened = np.zeros((len(array), words), dtype=np.uint64)
+            widened[:, :array.shape[1]] = array
+            setattr(self, name, widened)
+
+    def append(self) -> int:
+        if self.size == len(self.user_ids):
+            self._grow()
+        self.size += 1
+        return self.size - 1
+
+    def pop(self, row: int) -> Optional[int]:
+        """Удаляет строку, переставляя на её место последнюю.
+
+        Returns:
+            Optional[int]: ID пользователя, чья строка переехала в row.
+        """
+        self.size -= 1
+        last = self.size
+        if row == last:
+            return None
+        for name in self.COLUMNS:
+            array = getattr(self, name)
+            array[row] = array[last]
+        return int(self.user_ids[row])
+
+
+class CandidateIndex:
+    """Отбор самых совместимых кандидатов перед ранжированием моделью.
+
+    Интересы и вредные привычки хранятся битовыми множествами в колонках
+    по населённым пунктам, поэтому оценка совместимости со всеми
+    пользователями города - несколько векторных операций с popcount,
+    а top-k выбирается частичной сортировкой. Поиск точный: на десятках
+    тысяч пользователей полный векторный перебор быстрее MinHash/LSH
+    с приемлемой полнотой (см. benchmark/retrieval_benchmark.py).
+
+    Справочники интересов и привычек могут пополняться, поэтому ID
+    больше vocabulary_size не ошибка: битовые множества всех шардов
+    расширяются до нужной длины.
+
+    Attributes:
+        vocabulary_size (int): Максимальный ID интереса или привычки,
+                               под который выделены битовые множества.
+    """
+
+    def __init__(self, vocabulary_size: int = 64):
+        self.vocabulary_size = vocabulary_size
+        self.words = (vocabulary_size + 63) // 64
+        self._shards: Dict[int, _Shard] = {}
+        # user_id -> (locality_id, строка шарда)
+        self._rows: Dict[int, Tuple[int, int]] = {}
+        # Вставки при регистрации идут из обработчиков запросов, а сборка
+        # при старте - из потока, поэтому изменения под блокировкой
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._rows
+
+    def user_ids(self) -> Set[int]:
+        with self._lock:
+            return set(self._rows)
+
+    def _reserve(self, ids: Iterable[int]):
+        """Расширяет битовые множества под максимальный из ids. Вызывается
+        под блокировкой."""
+        max_id = max(ids, default=0)
+        if max_id <= self.vocabulary_size:
+            return
+        words = (max_id + 63) // 64
+        if words > self.words:
+            for shard in self._shards.values():
+                shard.widen(words)
+            self.words = words
+        self.vocabulary_size = 64 * words
+
+    def _bits(self, ids: Iterable[int]) -> np.ndarray:
+        words = np.zeros(self.words, dtype=np.uint64)
+        for id_ in ids:
+            if id_ < 1:
+                raise ValueError(f'ID {id_} must be positive')
+            words[(id_ - 1) // 64] |= np.uint64(1 << ((id_ - 1) % 64))
+        return words
+
+    def add(self, profile: CandidateProfile):
+        """Добавляет пользователя или обновляет его признаки."""
+        gender = -1 if profile.gender is None else profile.gender
+
+        with self._lock:
+            self._reserve([*profile.interest_ids, *profile.habit_ids])
+            interests = self._bits(profile.interest_ids)
+            habits = self._bits(profile.habit_ids)
+            location = self._rows.get(profile.user_id)
+            if location is not None and location[0] != profile.locality_id:
+                self._remove(profile.user_id)
+                location = None
+            shard = self._shards.get(profile.locality_id)
+            if shard is None:
+                shard = self._shards[profile.locality_id] = _Shard(self.words)
+            row = shard.append() if location is None else location[1]
+            shard.set(row, profile.user_id, interests, habits, profile.age,
+                      _log_budget(profile.budget), gender)
+            self._rows[profile.user_id] = (profile.locality_id, row)
+
+    def build(self, profiles: Iterable[CandidateProfile]):
+        for profile in profiles:
+            self.add(profile)
+
+    def sync(self, profiles: Iterable[CandidateProfile],
+             indexed: Set[int]) -> int:
+        """Сверяет индекс со свежей выборкой анкет в поиске: обновляет
+        признаки profiles и убирает из indexed тех, кого в выборке нет.
+
+        Args:
+            profiles (Iterable[CandidateProfile]): Все анкеты в поиске.
+            indexed (Set[int]): ID в индексе до запроса выборки. Добавленные
+                                после него, например при регистрации, в
+                                выборку могли не попасть и не удаляются.
+
+        Returns:
+            int: Число удалённых пользователей.
+        """
+        current = set()
+        for profile in profiles:
+            self.add(profile)
+            current.add(profile.user_id)
+        return sum(self.remove(user_id) for user_id in indexed - current)
+
+    def remove(self, user_id: int) -> bool:
+        """Убирает пользователя из выдачи, например при скрытии анкеты."""
+        with self._lock:
+            return self._remove(user_id)
+
+    def _remove(self, user_id: int) -> bool:
+        location = self._rows.pop(user_id, None)
+        if location is None:
+            return False
+        locality_id, row = location
+        moved = self._shards[locality_id].pop(row)
+        if moved is not None:
+            self._rows[moved] = (locality_id, row)
+        return True
+
+    def _scores(self, shard: _Shard, profile: CandidateProfile,
+                rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Оценки совместимости profile со строками rows шарда, по
+        умолчанию - со всеми строками."""
+        rows = slice(0, shard.size) if rows is None else rows
+        gender = -1 if profile.gender is None else profile.gender
+
+        def jaccard(sets: np.ndarray, counts: np.ndarray, ids: List[int],
+                    empty: float) -> np.ndarray:
+            query = self._bits(ids)
+            intersection = _popcount(sets[rows] & query)
+            union = counts[rows] + _popcount(query[None])[0] - intersection
+            return np.where(union > 0,
+                            intersection / np.maximum(union, 1), empty)
+
+        age_similarity = 1 - np.minimum(
+            np.abs(shard.age[rows] - profile.age) / AGE_WINDOW, 1
+        )
+        budget_similarity = 1 - np.minimum(
+            np.abs(shard.log_budget[rows] - _log_budget(profile.budget))
+            / BUDGET_WINDOW, 1
+        )
+        genders = shard.gender[rows]
+        gender_similarity = np.where(
+            (genders < 0) | (gender < 0), 0.5, genders == gender
+        )
+        # Пользователи без интересов не похожи ни на кого, а без вредных
+        # привычек - полностью совпадают друг с другом
+        return (WEIGHTS['interests'] * jaccard(
+                    shard.interests, shard.interest_counts,
+                    profile.interest_ids, 0.0)
+                + WEIGHTS['habits'] * jaccard(
+                    shard.habits, shard.habit_counts, profile.habit_ids, 1.0)
+                + WEIGHTS['age'] * age_similarity
+                + WEIGHTS['budget'] * budget_similarity
+                + WEIGHTS['gender'] * gender_similarity)
+
+    def query(self, profile: CandidateProfile, k: int,
+              exclude: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Top-k самых совместимых с profile пользователей его населённого
+        пункта, кроме него самого и exclude.
+
+        Args:
+            profile (CandidateProfile): Пользователь, для которого ищутся
+                                        кандидаты.
+            k (int): Число кандидатов.
+            exclude (Optional[Set[int]]): ID, которые не нужно возвращать,
+                                          например уже просмотренные.
+
+        Returns:
+            List[Tuple[int, float]]: ID кандидатов и их оценка совместимости
+                                     по убыванию оценки.
+        """
+        with self._lock:
+            shard = self._shards.get(profile.locality_id)
+            if shard is None or k <= 0:
+                return []
+            self._reserve([*profile.interest_ids, *profile.habit_ids])
+            scores = self._scores(shard, profile)
+            for user_id in {profile.user_id, *(exclude or ())}:
+                location = self._rows.get(user_id)
+                if location is not None and location[0] == profile.locality_id:
+                    scores[location[1]] = -np.inf
+            user_ids = shard.user_ids[:shard.size].copy()
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(user_ids[i]), float(scores[i])) for i in top
+                if scores[i] > -np.inf]
@@ -1,5 +1,11 @@
 from .logger import setup_logger, logs
-from .image_save import save_image
+from .image_save import (
+    save_image,
+    image_path,
+    stage_image,
+    publish_images,
+    discard_images
+)
 from .schemas import (
     ModelReadiness,
     TextRequest,
@@ -22,6 +28,10 @@ __all__ = [
     'setup_logger',
     # image_save
     'save_image',
+    'image_path',
+    'stage_image',
+    'publish_images',
+    'discard_images',
     # schemas
     'ModelReadiness',
     'TextRequest',
@@ -3,19 +3,27 @@ from pathlib import Path
 from io import BytesIO
 from PIL import Image
 import asyncio
+import os
+import uuid
 import aiofiles
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from config import settings
 
 
-async def _process_and_save_image(file_path: Path, base64_str: str):
+def _encode_jpeg(base64_str: str) -> bytes:
     image_data = base64.b64decode(base64_str.split(",")[-1])
     image = Image.open(BytesIO(image_data)).convert("RGB")
 
     buffer = BytesIO()
     image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+async def _process_and_save_image(file_path: Path, base64_str: str):
+    # Декодирование и сжатие - в потоке, чтобы не держать event loop
+    image_bytes = await asyncio.to_thread(_encode_jpeg, base64_str)
     async with aiofiles.open(file_path, 'wb') as image_file:
-        await image_file.write(buffer.getvalue())
+        await image_file.write(image_bytes)
 
 
 async def save_image(user_id: int,
@@ -25,17 +33,44 @@ async def save_image(user_id: int,
     user_dir.mkdir(parents=True, exist_ok=True)
 
     existing_files = list(user_dir.glob(f"{user_id}_{category}_*.jpg"))
-    if len(existing_numbers) >= 3:
-        return
-    
     existing_numbers = [
             int(f.stem.split("_")[-1]) 
             for f in existing_files
             if f.stem.split("_")[-1].isdigit()
     ]
+    if len(existing_numbers) >= 3:
+        return
 
     next_number = max(existing_numbers, default = 0) + 1
     filename = f"{user_id}_{category}_{next_number}.jpg"
     file_path = user_dir / filename
-    await asyncio.to_thread(_process_and_save_image, file_path, base64_str)
+    await _process_and_save_image(file_path, base64_str)
     return str(file_path)
+
+
+def image_path(user_id: int,
+               category: Literal['profile', 'habitation'],
+               number: int) -> Path:
+    return Path(settings.data_path) / str(user_id) / f"{user_id}_{category}_{number}.jpg"
+
+
+async def stage_image(base64_str: str) -> Path:
+    """Декодирует фото и пишет его во временный файл, пока ID владельца
+    ещё неизвестен, например до транзакции регистрации."""
+    staging_dir = Path(settings.data_path) / "_staging"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    file_path = staging_dir / f"{uuid.uuid4().hex}.jpg"
+    await _process_and_save_image(file_path, base64_str)
+    return file_path
+
+
+def publish_images(staged: List[Path], targets: List[Path]):
+    """Переносит подготовленные stage_image файлы на постоянные места."""
+    for staged_path, target in zip(staged, targets):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged_path, target)
+
+
+def discard_images(staged: List[Path]):
+    for staged_path in staged:
+        staged_path.unlink(missing_ok=True)
@@ -188,3 +188,15 @@ class UserAuth(UserData):
         hashed_password (str): Хэшированный пароль пользователя.
     """
     hashed_password: str
+
+
+class RecsResponse(BaseModel):
+    """Страница ленты рекомендаций.
+
+    Attributes:
+        user_ids (list[int]): ID кандидатов в порядке ранжирования.
+        next_cursor (int): Курсор следующей страницы. Если лента
+                           кончилась, следующий запрос пересчитает её.
+    """
+    user_ids: list[int]
+    next_cursor: int
@@ -0,0 +1,112 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+
+from batching import MicroBatcher  # noqa: E402
+
+
+def make_batcher(infer_batch, **kwargs):
+    params = dict(max_batch_size=4, max_wait_ms=50, max_queue_size=100)
+    params.update(kwargs)
+    return MicroBatcher(infer_batch, **params)
+
+
+def test_batcher_flushes_full_batch():
+    async def scenario():
+        batches = []
+
+        async def infer_batch(items):
+            batches.append(items)
+            return [item * 10 for item in items]
+
+        # Батч набирается раньше, чем истекает ожидание
+        batcher = make_batcher(infer_batch, max_wait_ms=10_000)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(item) for item in range(8))), 1
+        )
+        await batcher.close()
+
+        assert results == [item * 10 for item in range(8)]
+        assert batches == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+    asyncio.run(scenario())
+
+
+def test_batcher_flushes_partial_batch_on_timeout():
+    async def scenario():
+        batches = []
+
+        async def infer_batch(items):
+            batches.append(items)
+            return [str(item) for item in items]
+
+        batcher = make_batcher(infer_batch, max_wait_ms=20)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        elapsed = loop.time() - started
+        await batcher.close()
+
+        assert results == ["1", "2"]
+        assert batches == [[1, 2]]
+        assert 0.02 <= elapsed < 0.5
+
+    asyncio.run(scenario())
+
+
+def test_batcher_maps_results_to_callers():
+    async def scenario():
+        async def infer_batch(items):
+            await asyncio.sleep(0.01)
+            return [{"input": item} for item in items]
+
+        batcher = make_batcher(infer_batch, max_batch_size=3)
+        items = ["a", "b", "c", "d", "e"]
+        results = await asyncio.gather(*map(batcher.submit, items))
+        await batcher.close()
+
+        assert [result["input"] for result in results] == items
+
+    asyncio.run(scenario())
+
+
+def test_batcher_propagates_error_to_every_waiter():
+    async def scenario():
+        calls = []
+
+        async def infer_batch(items):
+            calls.append(items)
+            raise ValueError("model failed")
+
+        batcher = make_batcher(infer_batch)
+        results = await asyncio.gather(
+            *(batcher.submit(item) for item in range(3)),
+            return_exceptions=True
+        )
+        await batcher.close()
+
+        assert len(calls) == 1
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_batcher_fails_on_missing_outputs():
+    async def scenario():
+        async def infer_batch(items):
+            return items[:-1]
+
+        batcher = make_batcher(infer_batch)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(item) for item in range(3)),
+                           return_exceptions=True),
+            1
+        )
+        await batcher.close()
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(scenario())
+
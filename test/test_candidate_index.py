@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+# Пакет retrieval читает настройки бэкенда, а модуль индекса от них не зависит
+sys.path.append(str(Path(__file__).parents[1] / "project" / "retrieval"))
+
+from index import CandidateIndex, CandidateProfile  # noqa: E402
+
+
+def profile(user_id, locality_id=1, habit_ids=(), interest_ids=()):
+    return CandidateProfile(
+        user_id=user_id, locality_id=locality_id, age=20, budget=10000,
+        gender=0, habit_ids=list(habit_ids), interest_ids=list(interest_ids)
+    )
+
+
+def test_index_ranks_by_shared_interests():
+    index = CandidateIndex(vocabulary_size=64)
+    index.build([
+        profile(1, interest_ids=[1, 2, 3]),
+        profile(2, interest_ids=[1, 2, 3]),
+        profile(3, interest_ids=[1]),
+        profile(4, interest_ids=[10]),
+        profile(5, locality_id=2, interest_ids=[1, 2, 3])
+    ])
+
+    retrieved = [user_id for user_id, _ in index.query(profile(1, interest_ids=[1, 2, 3]), 10)]
+    assert retrieved == [2, 3, 4]
+    assert [user_id for user_id, _ in index.query(profile(1, interest_ids=[1, 2, 3]), 10, exclude={2})] == [3, 4]
+
+
+def test_index_grows_vocabulary_for_new_ids():
+    index = CandidateIndex(vocabulary_size=64)
+    index.add(profile(1, interest_ids=[1]))
+    index.add(profile(2, interest_ids=[1, 100], habit_ids=[65]))
+    index.add(profile(3, interest_ids=[2]))
+
+    assert index.vocabulary_size >= 100
+    retrieved = index.query(profile(4, interest_ids=[100], habit_ids=[65]), 3)
+    assert retrieved[0][0] == 2
+    assert len(retrieved) == 3
+
+
+def test_sync_removes_users_out_of_search():
+    index = CandidateIndex()
+    index.build([profile(1), profile(2), profile(3)])
+    indexed = index.user_ids()
+    # Зарегистрирован после выборки из базы
+    index.add(profile(4))
+
+    removed = index.sync([profile(1), profile(3, interest_ids=[5])], indexed)
+
+    assert removed == 1
+    assert index.user_ids() == {1, 3, 4}
+    assert index.query(profile(9, interest_ids=[5]), 1)[0][0] == 3
+
+
+def test_remove_keeps_other_rows_addressable():
+    index = CandidateIndex()
+    index.build([profile(user_id) for user_id in range(1, 6)])
+
+    assert index.remove(2)
+    assert not index.remove(2)
+    assert 2 not in index
+    assert {user_id for user_id, _ in index.query(profile(1), 10)} == {3, 4, 5}
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import socket
+import sys
+from pathlib import Path
+
+from aiohttp import web
+
+# В начало пути: у оркестратора тоже есть модуль config
+sys.path.insert(0, str(Path(__file__).parents[1] / "project"))
+
+# Модуль chat импортирует db, которому при импорте нужны адреса Postgres
+# и Redis; подключений в тестах нет
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("REDIS", "127.0.0.1:6379")
+
+from chat import ConnectionManager  # noqa: E402
+from ml_client import MLClient  # noqa: E402
+from moderation import ChatMessage, ChatModerator  # noqa: E402
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_json(self, frame):
+        self.frames.append(frame)
+
+
+async def start_orchestrator(status: int = 200, delay_s: float = 0):
+    """Заглушка /predict_toxicity_batch: токсичны тексты со словом toxic."""
+    calls = []
+
+    async def predict_toxicity_batch(request):
+        texts = (await request.json())["texts"]
+        calls.append(texts)
+        await asyncio.sleep(delay_s)
+        if status != 200:
+            return web.Response(status=status)
+        if "broken" in texts:
+            return web.json_response({"error": "unexpected"})
+        return web.json_response({"results": [
+            {"non_toxicity": 0.1 if "toxic" in text else 0.9, "insult": 0.0,
+             "obscenity": 0.0, "threat": 0.0, "dangerous": 0.0}
+            for text in texts
+        ]})
+
+    app = web.Application()
+    app.router.add_post("/predict_toxicity_batch", predict_toxicity_batch)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    client = MLClient(f"http://127.0.0.1:{port}", connect_timeout_s=1.0,
+                      read_timeout_s=max(1.0, 2 * delay_s), retries=0, backoff_s=0.01,
+                      max_backoff_s=0.1, pool_size=10)
+    await client.start()
+
+    async def stop():
+        await client.close()
+        await runner.cleanup()
+    return client, calls, stop
+
+
+def make_moderator(client, on_flagged, **kwargs):
+    params = dict(max_batch_size=16, max_wait_ms=50, max_queue_size=100,
+                  concurrency=2, threshold=0.6)
+    params.update(kwargs)
+    return ChatModerator(client, on_flagged, **params)
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def message(message_id: int, text: str) -> ChatMessage:
+    return ChatMessage(message_id, sender_id=1, receiver_id=2, text=text)
+
+
+def test_moderator_batches_queued_messages():
+    async def scenario():
+        client, calls, stop = await start_orchestrator()
+        flagged = []
+
+        async def on_flagged(chat_message):
+            flagged.append(chat_message)
+
+        moderator = make_moderator(client, on_flagged)
+        assert not moderator.submit(message(0, "не запущен"))
+        await moderator.start()
+        for message_id in range(1, 6):
+            assert moderator.submit(message(message_id, f"привет {message_id}"))
+        await wait_for(lambda: moderator.stats["checked"] == 5)
+        await moderator.close()
+        await stop()
+
+        assert calls == [[f"привет {message_id}" for message_id in range(1, 6)]]
+        assert flagged == []
+
+    asyncio.run(scenario())
+
+
+def test_moderator_retracts_toxic_message():
+    async def scenario():
+        client, calls, stop = await start_orchestrator()
+        manager = ConnectionManager()
+        sender, receiver = FakeWebSocket(), FakeWebSocket()
+        manager.active_connections[(1, 2)] = {1: sender, 2: receiver}
+
+        moderator = make_moderator(client, manager.retract_message)
+        await moderator.start()
+        moderator.submit(message(7, "hello"))
+        moderator.submit(message(8, "you are toxic"))
+        await wait_for(lambda: moderator.stats["checked"] == 2)
+        await moderator.close()
+        await stop()
+
+        retract = {"type": "retract", "id": 8, "reason": "toxicity"}
+        assert sender.frames == receiver.frames == [retract]
+        assert moderator.stats["flagged"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_moderator_skips_messages_when_ml_unavailable():
+    async def scenario():
+        client, calls, stop = await start_orchestrator(status=503)
+        flagged = []
+
+        async def on_flagged(chat_message):
+            flagged.append(chat_message)
+
+        moderator = make_moderator(client, on_flagged, max_batch_size=2)
+        await moderator.start()
+        for message_id in range(3):
+            assert moderator.submit(message(message_id, "toxic"))
+        await wait_for(lambda: moderator.stats["skipped"] == 3)
+
+        # Воркер продолжает работу после ошибки оркестратора
+        moderator.submit(message(3, "toxic"))
+        await wait_for(lambda: moderator.stats["skipped"] == 4)
+        await moderator.close()
+        await stop()
+
+        assert flagged == []
+        assert moderator.stats["checked"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_moderator_close_does_not_wait_for_slow_checks():
+    async def scenario():
+        client, calls, stop = await start_orchestrator(delay_s=2)
+
+        async def on_flagged(chat_message):
+            pass
+
+        moderator = make_moderator(client, on_flagged)
+        await moderator.start()
+        moderator.submit(message(1, "привет"))
+        await wait_for(lambda: calls)
+
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        await moderator.close()
+        assert loop.time() - start_time < 1
+        await stop()
+
+    asyncio.run(scenario())
+
+
+def test_moderator_survives_malformed_response():
+    async def scenario():
+        client, calls, stop = await start_orchestrator()
+        flagged = []
+
+        async def on_flagged(chat_message):
+            flagged.append(chat_message)
+
+        moderator = make_moderator(client, on_flagged, max_batch_size=1)
+        await moderator.start()
+        moderator.submit(message(1, "broken"))
+        await wait_for(lambda: moderator.stats["skipped"] == 1)
+
+        moderator.submit(message(2, "you are toxic"))
+        await wait_for(lambda: moderator.stats["flagged"] == 1)
+        await moderator.close()
+        await stop()
+
+        assert [chat_message.message_id for chat_message in flagged] == [2]
+
+    asyncio.run(scenario())
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+from starlette.requests import Request
+
+# В начало пути: у оркестратора тоже есть модуль config
+sys.path.insert(0, str(Path(__file__).parents[1] / "project"))
+
+# Модуль dictionaries импортирует db, которому при импорте нужны адреса
+# Postgres и Redis; подключений в тестах нет
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("REDIS", "127.0.0.1:6379")
+
+import dictionaries  # noqa: E402
+
+
+def request(if_none_match: str = "") -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+async def const(value):
+    return value
+
+
+def load_snapshot(monkeypatch, regions):
+    monkeypatch.setattr(dictionaries, "get_regions", lambda: const(list(regions)))
+    monkeypatch.setattr(dictionaries, "get_localities_by_region",
+                        lambda: const({"Ростовская область": ["Ростов-на-Дону"]}))
+    monkeypatch.setattr(dictionaries, "get_bad_habits", lambda: const(["Курение"]))
+    monkeypatch.setattr(dictionaries, "get_interests", lambda: const(["Спорт"]))
+    monkeypatch.setattr(dictionaries, "get_educ_dir",
+                        lambda: const([("09.03.04", "Программная инженерия")]))
+    snapshot = dictionaries.DictionarySnapshot(max_age_s=60)
+    asyncio.run(snapshot.reload())
+    return snapshot
+
+
+def test_snapshot_serves_body_with_stable_etag(monkeypatch):
+    first = load_snapshot(monkeypatch, ["Ростовская область"])
+    second = load_snapshot(monkeypatch, ["Ростовская область"])
+
+    response = first.response(request(), "regions")
+    assert response.status_code == 200
+    assert json.loads(response.body) == {"regions": ["Ростовская область"]}
+    assert response.headers["cache-control"] == "public, max-age=60"
+    # ETag зависит только от содержимого: одинаков в разных воркерах
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    assert second.response(request(), "regions").headers["etag"] == etag
+
+    cities = first.response(request(), "cities", "Ростовская область")
+    assert json.loads(cities.body) == {"localities": ["Ростов-на-Дону"]}
+    unknown = first.response(request(), "cities", "Неизвестный регион")
+    assert json.loads(unknown.body) == {"localities": []}
+
+
+def test_snapshot_answers_304_for_matching_etag(monkeypatch):
+    snapshot = load_snapshot(monkeypatch, ["Ростовская область"])
+    etag = snapshot.get("regions").etag
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = snapshot.response(request(if_none_match), "regions")
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == etag
+
+    assert snapshot.response(request('"other"'), "regions").status_code == 200
+
+
+def test_snapshot_etag_changes_after_reload(monkeypatch):
+    snapshot = load_snapshot(monkeypatch, ["Ростовская область"])
+    old_etag = snapshot.get("regions").etag
+    old_interests = snapshot.get("interests").etag
+
+    monkeypatch.setattr(dictionaries, "get_regions",
+                        lambda: const(["Ростовская область", "Краснодарский край"]))
+    asyncio.run(snapshot.reload())
+
+    assert snapshot.version == 2
+    assert snapshot.get("regions").etag != old_etag
+    assert snapshot.get("interests").etag == old_interests
+    response = snapshot.response(request(old_etag), "regions")
+    assert response.status_code == 200
+    assert json.loads(response.body)["regions"][-1] == "Краснодарский край"
@@ -0,0 +1,99 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+
+from health import MODEL_NAMES, HealthMonitor  # noqa: E402
+
+
+class FakeTransport:
+    def __init__(self):
+        self.ready = {model_name: True for model_name in MODEL_NAMES.values()}
+
+    async def is_model_ready(self, model_name):
+        if model_name == "broken":
+            raise ConnectionError("Triton is down")
+        return self.ready[model_name]
+
+
+async def ready_monitor(transport):
+    monitor = HealthMonitor(MODEL_NAMES, interval_s=60)
+    await monitor.refresh(transport)
+    for alias in MODEL_NAMES:
+        monitor.mark_warm(alias)
+    return monitor
+
+
+def test_model_ready_only_after_warmup():
+    async def scenario():
+        transport = FakeTransport()
+        monitor = HealthMonitor(MODEL_NAMES, interval_s=60)
+        await monitor.refresh(transport)
+        assert monitor.triton_readiness == {alias: True for alias in MODEL_NAMES}
+        assert not monitor.ready
+
+        monitor.mark_warm("toxicity")
+        assert monitor.readiness["toxicity"]
+        assert not monitor.readiness["nsfw"]
+
+        failing = HealthMonitor({"toxicity": "broken"}, interval_s=60)
+        await failing.refresh(transport)
+        assert failing.triton_readiness == {"toxicity": False}
+
+    asyncio.run(scenario())
+
+
+def test_unchanged_for_matching_etag():
+    async def scenario():
+        transport = FakeTransport()
+        monitor = await ready_monitor(transport)
+        etag = monitor.etag
+        assert etag.startswith('"') and etag.endswith('"')
+
+        assert await monitor.unchanged(etag, wait=0)
+        assert not await monitor.unchanged('"other"', wait=0)
+        assert not await monitor.unchanged(None, wait=0)
+
+        # Повторный опрос без изменений ETag не меняет
+        await monitor.refresh(transport)
+        assert monitor.etag == etag
+
+    asyncio.run(scenario())
+
+
+def test_long_poll_returns_when_state_changes():
+    async def scenario():
+        transport = FakeTransport()
+        monitor = await ready_monitor(transport)
+        etag = monitor.etag
+
+        async def unload_model():
+            await asyncio.sleep(0.05)
+            transport.ready["nsfw_detector"] = False
+            await monitor.refresh(transport)
+
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        unchanged, _ = await asyncio.gather(monitor.unchanged(etag, wait=5),
+                                            unload_model())
+
+        assert not unchanged
+        assert loop.time() - start_time < 1
+        assert monitor.etag != etag
+        assert monitor.snapshot()["models"]["nsfw"] is False
+        assert not monitor.snapshot()["ready"]
+
+    asyncio.run(scenario())
+
+
+def test_long_poll_times_out_unchanged():
+    async def scenario():
+        monitor = await ready_monitor(FakeTransport())
+
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        assert await monitor.unchanged(monitor.etag, wait=0.05)
+        assert loop.time() - start_time >= 0.05
+
+    asyncio.run(scenario())
@@ -0,0 +1,81 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+
+from limiter import AdaptiveLimiter, Overloaded  # noqa: E402
+
+
+def make_limiter(**kwargs):
+    params = dict(initial_limit=2, min_limit=1, max_limit=100,
+                  max_queue_size=1, queue_timeout_s=0.05)
+    params.update(kwargs)
+    return AdaptiveLimiter("model", **params)
+
+
+def test_limiter_queues_then_rejects():
+    async def scenario():
+        limiter = make_limiter()
+        release = asyncio.Event()
+
+        async def call():
+            async with limiter.slot():
+                await release.wait()
+
+        running = [asyncio.create_task(call()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert (limiter.in_flight, limiter.stats()["queued"]) == (2, 1)
+
+        with pytest.raises(Overloaded) as error:
+            await call()
+        assert error.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(*running)
+        assert limiter.in_flight == 0
+        assert limiter.rejected == {"queue_full": 1, "queue_timeout": 0}
+
+    asyncio.run(scenario())
+
+
+def test_limiter_times_out_in_queue():
+    async def scenario():
+        limiter = make_limiter(initial_limit=1)
+
+        async def call(delay):
+            async with limiter.slot():
+                await asyncio.sleep(delay)
+
+        slow = asyncio.create_task(call(0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await call(0)
+        await slow
+        assert limiter.rejected["queue_timeout"] == 1
+        assert limiter.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_adapts_to_latency():
+    async def scenario():
+        limiter = make_limiter(initial_limit=10, max_queue_size=100,
+                               queue_timeout_s=1.0)
+
+        async def call(delay):
+            async with limiter.slot():
+                await asyncio.sleep(delay)
+
+        for _ in range(5):
+            await asyncio.gather(*(call(0.01) for _ in range(10)))
+        grown = limiter.limit
+        assert grown > 10
+
+        # Резкое замедление модели уменьшает лимит
+        await asyncio.gather(*(call(0.05) for _ in range(30)))
+        assert limiter.limit < grown * 0.75
+
+    asyncio.run(scenario())
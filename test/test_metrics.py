@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+
+from metrics import (CallbackMetric, Counter, Gauge, Histogram,  # noqa: E402
+                     Registry)
+
+
+def test_counter_and_gauge_exposition():
+    registry = Registry()
+    requests = registry.register(Counter(
+        "requests", "Finished requests", ("path", "status")
+    ))
+    in_flight = registry.register(Gauge("in_flight", "Requests in work"))
+
+    requests.labels("/predict", "200").inc()
+    requests.labels("/predict", "200").inc(2)
+    requests.labels('/a"b\\c\nd', "503").inc()
+    in_flight.labels().inc()
+    in_flight.labels().set(3.5)
+    in_flight.labels().dec()
+
+    assert registry.render() == (
+        "# HELP requests Finished requests\n"
+        "# TYPE requests counter\n"
+        'requests_total{path="/predict",status="200"} 3\n'
+        'requests_total{path="/a\\"b\\\\c\\nd",status="503"} 1\n'
+        "# HELP in_flight Requests in work\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 2.5\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.register(Histogram(
+        "latency_seconds", "Request latency", ("model",),
+        buckets=(1.0, 0.1)
+    ))
+
+    series = latency.labels("nsfw")
+    for value in (0.05, 0.1, 0.5, 2.0):
+        series.observe(value)
+
+    assert registry.render() == (
+        "# HELP latency_seconds Request latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{model="nsfw",le="0.1"} 2\n'
+        'latency_seconds_bucket{model="nsfw",le="1.0"} 3\n'
+        'latency_seconds_bucket{model="nsfw",le="+Inf"} 4\n'
+        'latency_seconds_sum{model="nsfw"} 2.65\n'
+        'latency_seconds_count{model="nsfw"} 4\n'
+    )
+
+
+def test_histogram_timer_observes_once():
+    histogram = Histogram("stage_seconds", "Stage time")
+    with histogram.labels().time():
+        pass
+
+    lines = histogram.render().splitlines()
+    assert 'stage_seconds_bucket{le="+Inf"} 1' in lines
+    assert "stage_seconds_count 1" in lines
+
+
+def test_callback_metric_and_label_checks():
+    hits = CallbackMetric(
+        "cache_hits_total", "Cache hits", ("cache",),
+        lambda: {("toxicity",): 7, ("nsfw",): 0}, type_name="counter"
+    )
+    assert hits.render() == (
+        "# HELP cache_hits_total Cache hits\n"
+        "# TYPE cache_hits_total counter\n"
+        'cache_hits_total{cache="toxicity"} 7\n'
+        'cache_hits_total{cache="nsfw"} 0\n'
+    )
+    with pytest.raises(TypeError):
+        hits.labels("toxicity")
+
+    counter = Counter("errors", "Failed calls", ("model",))
+    with pytest.raises(ValueError):
+        counter.labels("nsfw", "extra")
+    assert counter.labels("nsfw") is counter.labels("nsfw")
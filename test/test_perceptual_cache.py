@@ -0,0 +1,72 @@
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+
+from cache import PerceptualCache  # noqa: E402
+from preprocessing import dhash  # noqa: E402
+
+
+def make_image(seed: int) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    return Image.fromarray(blocks).resize((256, 256), Image.BILINEAR)
+
+
+def reencode(image: Image.Image) -> Image.Image:
+    buffer = io.BytesIO()
+    image.resize((200, 200)).save(buffer, format="JPEG", quality=60)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def distance(first: int, second: int) -> int:
+    return bin(first ^ second).count("1")
+
+
+def test_near_duplicate_image_hits():
+    cache = PerceptualCache(max_size=10, max_distance=4)
+    original = dhash(make_image(0))
+    duplicate = dhash(reencode(make_image(0)))
+    assert distance(original, duplicate) <= 4
+
+    cache.set(original, {"nsfw": 0.9})
+    assert cache.get(duplicate) == {"nsfw": 0.9}
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_distinct_image_misses():
+    cache = PerceptualCache(max_size=10, max_distance=4)
+    first, second = dhash(make_image(0)), dhash(make_image(1))
+    assert distance(first, second) > 4
+
+    cache.set(first, {"nsfw": 0.9})
+    assert cache.get(second) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_lookup_through_chunk_index():
+    cache = PerceptualCache(max_size=10, max_distance=3)
+    stored = 0x0123456789ABCDEF
+    cache.set(stored, "verdict")
+
+    # По одному отличающемуся биту в трёх фрагментах из четырёх: точного
+    # ключа нет, кандидат находится по совпавшему фрагменту
+    near = stored ^ (1 << 0) ^ (1 << 20) ^ (1 << 40)
+    assert cache.get(near) == "verdict"
+    assert cache.get(stored ^ 0b1111) is None
+
+
+def test_eviction_removes_index_entries():
+    cache = PerceptualCache(max_size=2, max_distance=1)
+    for phash in (1 << 10, 1 << 30, 1 << 50):
+        cache.set(phash, phash)
+
+    assert len(cache) == 2
+    assert cache.get(1 << 10) is None
+    assert cache.get((1 << 50) ^ 1) == 1 << 50
+    assert all(1 << 10 not in bucket
+               for index in cache._index for bucket in index.values())
@@ -0,0 +1,144 @@
+import datetime
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+# В начало пути: у оркестратора тоже есть модуль config
+sys.path.insert(0, str(Path(__file__).parents[1] / "project"))
+
+# ml_client при импорте собирает настройки бэкенда, в том числе адреса
+# Postgres и Redis; подключений в тестах нет
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("REDIS", "127.0.0.1:6379")
+
+from features import (UserRowCache, decoder2vector,  # noqa: E402
+                      ranking_inputs)
+from ml_client import ranking_features  # noqa: E402
+from schemas import UserRankingFeatures  # noqa: E402
+
+
+MIN_MAX_VALUES = {
+    "age_min": 18, "age_max": 35,
+    "year_created_at_min": 2021, "year_created_at_max": 2025,
+    "budget_min": 1000, "budget_max": 100000,
+    "rating_min": 0.0, "rating_max": 5.0
+}
+
+
+def make_user(age, gender, habit_ids, interest_ids, user_id=None,
+              updated_at=None):
+    return {
+        "user_id": user_id,
+        "updated_at": updated_at,
+        "ei_id": 3,
+        "age": age,
+        "education_direction": 12,
+        "year_created_at": 2024,
+        "budget": 30000,
+        "rating": 4.5,
+        "gender": gender,
+        "habit_ids": habit_ids,
+        "interest_ids": interest_ids
+    }
+
+
+@pytest.fixture
+def batch():
+    main = make_user(20, 1, [1, 2], [5])
+    candidates = [
+        make_user(22, 0, [], [5, 50]),
+        make_user(35, 1, [2], []),
+        make_user(18, 0, [3, 4, 7], [1])
+    ]
+    return main, candidates
+
+
+def test_shapes_and_dtypes(batch):
+    tensors = ranking_inputs(*batch, MIN_MAX_VALUES)
+
+    assert tensors["num_input"].shape == (3, 10)
+    assert tensors["num_input"].dtype == np.float32
+    assert tensors["cat_input"].shape == (3, 4)
+    assert tensors["cat_input"].dtype == np.int64
+    assert tensors["habits_input"].shape == (3, 2, 50)
+    assert tensors["interest_input"].shape == (3, 2, 50)
+
+
+def test_rows_match_pairwise_layout(batch):
+    main, candidates = batch
+    tensors = ranking_inputs(main, candidates, MIN_MAX_VALUES)
+
+    for i, candidate in enumerate(candidates):
+        assert tensors["num_input"][i, 4] == pytest.approx(
+            (candidate["age"] - 18) / (35 - 18)
+        )
+        assert tensors["num_input"][i, 8] == main["gender"]
+        assert tensors["num_input"][i, 9] == candidate["gender"]
+        np.testing.assert_array_equal(
+            tensors["habits_input"][i],
+            np.concatenate([decoder2vector(main["habit_ids"]),
+                            decoder2vector(candidate["habit_ids"])])
+        )
+        np.testing.assert_array_equal(
+            tensors["interest_input"][i, 1],
+            decoder2vector(candidate["interest_ids"])[0]
+        )
+
+
+def test_row_cache_matches_uncached(batch):
+    main, candidates = batch
+    for i, user in enumerate([main, *candidates]):
+        user["user_id"], user["updated_at"] = i, "v1"
+    cache = UserRowCache(max_size=10)
+    expected = ranking_inputs(main, candidates, MIN_MAX_VALUES)
+
+    for _ in range(2):
+        tensors = ranking_inputs(main, candidates, MIN_MAX_VALUES, cache)
+        for key, array in expected.items():
+            assert tensors[key].dtype == array.dtype
+            np.testing.assert_array_equal(tensors[key], array)
+    assert cache.stats() == {"memory_hits": 4, "misses": 4, "size": 4}
+
+
+def test_row_cache_versions_and_bounds():
+    cache = UserRowCache(max_size=2)
+    user = make_user(20, 1, [1], [2], user_id=1, updated_at="v1")
+    cache.rows([user], MIN_MAX_VALUES)
+
+    changed = make_user(30, 1, [1], [2], user_id=1, updated_at="v2")
+    rows = cache.rows([changed], MIN_MAX_VALUES)
+    assert rows["numerical"][0, 0] == pytest.approx((30 - 18) / (35 - 18))
+    assert cache.misses == 2
+
+    others = [make_user(25, 0, [], [], user_id=i, updated_at="v1")
+              for i in (2, 3)]
+    cache.rows(others, MIN_MAX_VALUES)
+    assert len(cache) == 2
+    assert cache.invalidate(3) and not cache.invalidate(1)
+
+    anonymous = make_user(25, 0, [], [])
+    cache.rows([anonymous], MIN_MAX_VALUES)
+    assert len(cache) == 1
+
+
+def test_backend_features_default_missing_fields():
+    # Строка get_recs_for_user с незаполненными nullable колонками
+    row = SimpleNamespace(
+        id=7, updated_at=datetime.datetime(2025, 3, 1, 12, 0),
+        ei_id=None, age=21, education_direction=None,
+        created_at=datetime.datetime(2024, 9, 1), budget=None, rating=0.0,
+        gender=None, habit_ids=None, interest_ids=None
+    )
+    features = ranking_features(row)
+
+    assert (features["gender"], features["budget"], features["ei_id"]) == (0, 0, 0)
+    assert features["habit_ids"] == features["interest_ids"] == []
+    # Оркестратор принимает такую строку в /ranking_batch
+    user = UserRankingFeatures.model_validate(features).model_dump()
+    tensors = ranking_inputs(user, [user], MIN_MAX_VALUES)
+    assert tensors["num_input"][0, 9] == 0
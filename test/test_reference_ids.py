@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# В начало пути: у оркестратора тоже есть модуль config
+sys.path.insert(0, str(Path(__file__).parents[1] / "project"))
+
+# Пакет db при импорте читает адреса Postgres и Redis; подключений в
+# тестах нет
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("REDIS", "127.0.0.1:6379")
+
+from db.reference import ReferenceIds  # noqa: E402
+
+
+class SlowReferenceIds(ReferenceIds):
+    """Справочники без базы: каждая загрузка занимает время и находит
+    интерес, добавленный после первой."""
+
+    def __init__(self, refresh_interval_s: float):
+        super().__init__(refresh_interval_s)
+        self.loads = 0
+
+    async def load(self):
+        self.loads += 1
+        await asyncio.sleep(0.05)
+        interests = {"Спорт": 1}
+        if self.loads > 1:
+            interests["Шахматы"] = 2
+        self._ids = {"interest": interests, "bad_habit": {}}
+        self._loaded_at = time.monotonic()
+
+
+def test_concurrent_misses_share_one_reload():
+    async def scenario():
+        reference = SlowReferenceIds(refresh_interval_s=0)
+        await reference.load()
+
+        results = await asyncio.gather(
+            *(reference.interest_ids(["Шахматы"]) for _ in range(10))
+        )
+        assert results == [[2]] * 10
+        assert reference.loads == 2
+
+    asyncio.run(scenario())
+
+
+def test_misses_reload_at_most_once_per_interval():
+    async def scenario():
+        reference = SlowReferenceIds(refresh_interval_s=60)
+
+        # Первый промах загружает справочники, следующие в пределах
+        # интервала базу не трогают
+        assert await reference.interest_ids(["Спорт", "Неизвестный"]) == [1]
+        assert await reference.interest_ids(["Шахматы"]) == []
+        assert reference.loads == 1
+
+    asyncio.run(scenario())
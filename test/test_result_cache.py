@@ -0,0 +1,67 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+
+from cache import LRUCache, ResultCache  # noqa: E402
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl_s=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_lru_expires_entries():
+    cache = LRUCache(max_size=10, ttl_s=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_result_cache_counts_hits_and_misses():
+    async def scenario():
+        cache = ResultCache("toxicity", "v1", max_size=10, ttl_s=60)
+        key = cache.key("привет")
+        assert key == cache.key("привет") != cache.key("пока")
+        assert key != ResultCache("toxicity", "v2", 10, 60).key("привет")
+
+        assert await cache.get(key) is None
+        await cache.set(key, {"non_toxicity": 0.9})
+        assert await cache.get(key) == {"non_toxicity": 0.9}
+        assert await cache.get(key) == {"non_toxicity": 0.9}
+
+        assert cache.stats() == {"memory_hits": 2, "redis_hits": 0,
+                                 "misses": 1, "size": 1}
+        await cache.close()
+
+    asyncio.run(scenario())
+
+
+def test_result_cache_treats_redis_errors_as_misses():
+    async def scenario():
+        # На порту 1 никто не слушает: каждое обращение к Redis - ошибка
+        cache = ResultCache("toxicity", "v1", max_size=10, ttl_s=60,
+                            redis_url="redis://127.0.0.1:1/0")
+        key = cache.key("текст")
+
+        assert await cache.get(key) is None
+        await cache.set(key, {"non_toxicity": 0.1})
+        assert await cache.get(key) == {"non_toxicity": 0.1}
+
+        assert cache.stats() == {"memory_hits": 1, "redis_hits": 0,
+                                 "misses": 1, "size": 1}
+        await cache.close()
+
+    asyncio.run(scenario())
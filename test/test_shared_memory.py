@@ -0,0 +1,137 @@
+import asyncio
+import os
+import socket
+import sys
+from pathlib import Path
+
+import grpc
+import numpy as np
+import pytest
+import uvicorn
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"
+                    / "benchmark"))
+
+from fake_triton import (FakeGRPCService, FakeTriton,  # noqa: E402
+                         create_http_app)
+from shared_memory import SharedMemoryPool, SharedMemoryResult  # noqa: E402
+from transport import GRPCTransport, HTTPTransport  # noqa: E402
+from tritonclient.grpc import service_pb2_grpc  # noqa: E402
+
+BATCH, CHANNELS, SIZE = 2, 3, 8
+
+
+class DeterministicTriton(FakeTriton):
+    """Заглушка с предсказуемым выходом, чтобы сверить его с прочитанным
+    из разделяемой памяти."""
+
+    async def infer(self, model_name, batch_size):
+        return np.arange(batch_size * 2, dtype=np.float32).reshape(-1, 2)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fake_region_bytes(key: str, byte_size: int) -> bytes:
+    with open(f"/dev/shm{key}", "rb") as region:
+        return region.read(byte_size)
+
+
+async def start_grpc(fake):
+    server = grpc.aio.server()
+    service_pb2_grpc.add_GRPCInferenceServiceServicer_to_server(
+        FakeGRPCService(fake), server
+    )
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+    transport = GRPCTransport(f"127.0.0.1:{port}", timeout=5, pool_size=1,
+                              keepalive_ms=300000)
+
+    async def stop():
+        await server.stop(grace=None)
+    return transport, stop
+
+
+async def start_http(fake):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_http_app(fake), host="127.0.0.1", port=port,
+        log_level="warning"
+    ))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    transport = HTTPTransport(f"127.0.0.1:{port}", timeout=5, pool_size=1)
+
+    async def stop():
+        server.should_exit = True
+        await task
+    return transport, stop
+
+
+@pytest.mark.parametrize("start", [start_grpc, start_http],
+                         ids=["grpc", "http"])
+def test_shared_memory_round_trip_and_cleanup(start):
+    async def scenario():
+        fake = DeterministicTriton(latency_ms=0, per_item_ms=0)
+        transport, stop = await start(fake)
+        item_size = np.dtype(np.float32).itemsize
+        pool = SharedMemoryPool(
+            "nsfw_detector",
+            input_byte_size=BATCH * CHANNELS * SIZE * SIZE * item_size,
+            outputs={"output": BATCH * 2 * item_size},
+            size=2
+        )
+        regions = [region for slot in pool.slots for region in slot.regions]
+        try:
+            await pool.register(transport)
+            assert set(fake.regions) == {region.name for region in regions}
+
+            image = np.random.default_rng(0).random(
+                (BATCH, CHANNELS, SIZE, SIZE), dtype=np.float32
+            )
+            result = await transport.infer("nsfw_detector", {"image": image},
+                                           pool)
+            assert isinstance(result, SharedMemoryResult)
+            np.testing.assert_array_equal(
+                result.as_numpy("output"),
+                np.arange(BATCH * 2, dtype=np.float32).reshape(-1, 2)
+            )
+            # Входы лежат во входном регионе занятого слота
+            written = np.frombuffer(
+                fake_region_bytes(pool.slots[0].input.key, image.nbytes),
+                dtype=np.float32
+            ).reshape(image.shape)
+            np.testing.assert_array_equal(written, image)
+
+            await pool.close(transport)
+            assert fake.regions == {}
+            assert not any(os.path.exists(f"/dev/shm{region.key}")
+                           for region in regions)
+        finally:
+            await transport.close()
+            await stop()
+
+    asyncio.run(scenario())
+
+
+def test_shared_memory_close_destroys_regions_without_triton():
+    async def scenario():
+        fake = FakeTriton(latency_ms=0, per_item_ms=0)
+        transport, stop = await start_grpc(fake)
+        pool = SharedMemoryPool("nsfw_detector", input_byte_size=64,
+                                outputs={"output": 16}, size=1)
+        regions = pool.slots[0].regions
+        await pool.register(transport)
+        await stop()
+
+        await pool.close(transport)
+        await transport.close()
+        assert not any(os.path.exists(f"/dev/shm{region.key}")
+                       for region in regions)
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "model_orchestrator"))
+
+from cache import SingleFlight  # noqa: E402
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self):
+        self.value += 1
+
+
+def test_single_flight_runs_one_backend_call():
+    async def scenario():
+        deduplicated = Counter()
+        flight = SingleFlight(deduplicated)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"non_toxicity": 0.9}
+
+        results = await asyncio.gather(
+            *(flight.do("key", compute) for _ in range(10))
+        )
+        assert len(calls) == 1
+        assert results == [{"non_toxicity": 0.9}] * 10
+        assert deduplicated.value == 9
+        assert len(flight) == 0
+
+        # Завершившееся вычисление не переиспользуется
+        await flight.do("key", compute)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_keeps_different_keys_apart():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def compute(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        results = await asyncio.gather(
+            flight.do("a", lambda: compute("a")),
+            flight.do("b", lambda: compute("b"))
+        )
+        assert results == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_propagates_error_without_caching_it():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("backend failed")
+
+        results = await asyncio.gather(
+            *(flight.do("key", failing) for _ in range(5)),
+            return_exceptions=True
+        )
+        assert len(calls) == 1
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(flight) == 0
+
+        async def succeeding():
+            calls.append(1)
+            return "ok"
+
+        assert await flight.do("key", succeeding) == "ok"
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_survives_cancelled_waiter():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", compute))
+        second = asyncio.create_task(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == "done"
+        assert first.cancelled()
+
+    asyncio.run(scenario())